@@ -1,3 +1,4 @@
+from datetime import timedelta
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
@@ -5,10 +6,18 @@ from fastapi.params import Query
 from sqlalchemy import select, func
 from sqlalchemy.orm import joinedload
 
-from admin_app.schemes import AdminUserResponse, AdminReviewResponse
+from admin_app.schemes import AdminUserResponse, AdminReviewResponse, AdminModerationJobResponse, \
+    AdminJobRunResponse, AdminJobRunSummaryResponse
 from auth_app.deps import get_admin_user
-from db.services.main_services import UserService, ReviewService
-from db.models import UserModel, ListingModel, ReviewModel
+from db.services.main_services import UserService, ReviewService, ModerationJobService, JobRunService, \
+    ListingService, ModerationVerdictService
+from db.models import UserModel, ListingModel, ReviewModel, ModerationJobModel, MODERATION_JOB_DEAD
+from listing_app.schemes import MODERATION_STATUS_ID
+from services.metrics import metrics
+from services.moderation_cache import CONTENT_CHECK, content_fingerprint
+from services.pre_moderation import forget_rejected_images
+from services.worker_moderate_listings import listing_image_paths
+from utils import datetime_now
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -131,3 +140,69 @@ async def get_reviews_for_admin(
         )
         for r in reviews
     ]
+
+
+@router.get("/moderation-jobs", response_model=List[AdminModerationJobResponse])
+async def get_moderation_jobs(
+    status: Optional[str] = Query(MODERATION_JOB_DEAD),
+    _: UserModel = Depends(get_admin_user)
+):
+    query = select(ModerationJobModel).order_by(ModerationJobModel.created_at)
+    if status:
+        query = query.where(ModerationJobModel.status == status)
+
+    jobs = await ModerationJobService.execute(query)
+    return [AdminModerationJobResponse.model_validate(job, from_attributes=True) for job in jobs]
+
+
+@router.post("/moderation-jobs/{listing_id}/retry")
+async def retry_moderation_job(listing_id: int, admin: UserModel = Depends(get_admin_user)):
+    if not await ModerationJobService.retry_dead(listing_id):
+        raise HTTPException(status_code=404, detail="Dead moderation job not found")
+    return {"status": "ok", "message": f"Listing {listing_id} returned to moderation queue"}
+
+
+@router.post("/listings/{listing_id}/unblock-images")
+async def unblock_listing_images(listing_id: int, admin: UserModel = Depends(get_admin_user)):
+    listing = (await ListingService.select_for_moderation([listing_id])).get(listing_id)
+    if not listing:
+        raise HTTPException(status_code=404, detail="Listing not found")
+
+    image_paths = listing_image_paths(listing)
+    removed = await forget_rejected_images(image_paths)
+    # Локальна відмова через ці фото збережена як вердикт вмісту: без його видалення
+    # повторна модерація того самого вмісту відхилила б оголошення знову
+    await ModerationVerdictService.forget(
+        CONTENT_CHECK, await content_fingerprint(listing.name, listing.description, image_paths)
+    )
+    if listing.listing_status_id == MODERATION_STATUS_ID:
+        await ModerationJobService.enqueue(
+            listing.id,
+            listing.owner_id,
+            ModerationJobService.priority_for(is_new=False, owner_verified=listing.owner.is_verified)
+        )
+    return {"status": "ok", "message": f"Removed {removed} rejected image hashes for listing {listing_id}"}
+
+
+@router.get("/job-runs", response_model=List[AdminJobRunResponse])
+async def get_job_runs(
+    job: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    _: UserModel = Depends(get_admin_user)
+):
+    runs = await JobRunService.select_recent(job, limit)
+    return [AdminJobRunResponse.model_validate(run, from_attributes=True) for run in runs]
+
+
+@router.get("/job-runs/summary", response_model=List[AdminJobRunSummaryResponse])
+async def get_job_runs_summary(
+    hours: int = Query(24, ge=1, le=24 * 14),
+    _: UserModel = Depends(get_admin_user)
+):
+    rows = await JobRunService.summary(datetime_now() - timedelta(hours=hours))
+    return [AdminJobRunSummaryResponse.model_validate(row, from_attributes=True) for row in rows]
+
+
+@router.get("/metrics")
+async def get_metrics(_: UserModel = Depends(get_admin_user)):
+    return metrics.snapshot()
@@ -28,4 +28,44 @@ class AdminReviewResponse(BaseModel):
     review_status: Optional[str]
     tags: List[str]
     owner_first_name: Optional[str]
-    owner_last_name: Optional[str]
\ No newline at end of file
+    owner_last_name: Optional[str]
+
+
+class AdminModerationJobResponse(BaseModel):
+    id: int
+    listing_id: int
+    owner_id: Optional[int]
+    status: str
+    priority: int
+    attempts: int
+    available_at: datetime
+    queued_at: datetime
+    last_error: Optional[str]
+    created_at: datetime
+
+
+class AdminJobRunResponse(BaseModel):
+    id: int
+    job: str
+    instance_id: str
+    status: str
+    started_at: datetime
+    finished_at: datetime
+    duration: float
+    items_seen: int
+    items_processed: int
+    items_failed: int
+    error: Optional[str]
+
+
+class AdminJobRunSummaryResponse(BaseModel):
+    job: str
+    runs: int
+    failed_runs: int
+    last_started_at: datetime
+    avg_duration: float
+    p95_duration: float
+    max_duration: float
+    items_seen: int
+    items_processed: int
+    items_failed: int
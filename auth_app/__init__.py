@@ -1,2 +1,2 @@
 from .routes import router
-from .deps import get_current_active_user
+from .deps import get_current_active_user, get_optional_user
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
@@ -15,6 +16,11 @@ from .schemes import TokenPayload
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="/api/auth/login"
 )
+# Для маршрутів, доступних і без входу: без заголовка Authorization користувач None
+optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl="/api/auth/login",
+    auto_error=False
+)
 
 
 async def get_current_active_user(token: str = Depends(oauth2_scheme)) -> UserModel:
@@ -62,6 +68,12 @@ async def get_current_active_user(token: str = Depends(oauth2_scheme)) -> UserMo
     return user
 
 
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[UserModel]:
+    if not token:
+        return None
+    return await get_current_active_user(token)
+
+
 def get_admin_user(current_user: UserModel = Depends(get_current_active_user)) -> UserModel:
     if current_user.role != 2:  # або інше значення, яке відповідає адміну
         raise HTTPException(
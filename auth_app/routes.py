@@ -12,7 +12,7 @@ from starlette.status import HTTP_404_NOT_FOUND
 
 from db import UserModel
 from db.services import UserService
-from services.gpt_services import passport_documents_verification
+from services.gpt_services import passport_documents_verification, GptRunError
 from .deps import get_current_active_user, get_admin_user
 from .schemes import TokenResponse, SignupPayload, UserResponse, UserPayload, UserDetailResponse, ChangePasswordPayload
 from .utils import create_user_session, build_user_response, hash_password, verify_password
@@ -238,7 +238,13 @@ async def upload_user_passport(
         shutil.copyfileobj(file.file, buffer)
 
     # Passport verification
-    passport_data = await passport_documents_verification([str(file_path)])
+    try:
+        passport_data = await passport_documents_verification([str(file_path)])
+    except GptRunError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервіс верифікації тимчасово недоступний, спробуйте пізніше"
+        )
     if not passport_data.valid_data \
             or not passport_data.patronymic \
             or not passport_data.first_name \
@@ -1,4 +1,5 @@
 import os
+from typing import Literal, Optional
 
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -18,14 +19,124 @@ class Settings(BaseSettings):
 
     ORGANISATION_ID: str
     API_KEY: SecretStr
+    # Інша адреса API, наприклад локальний tests/fake_openai.py для навантажувального тестування
+    OPENAI_BASE_URL: Optional[str] = None
     VERIFICATION_ASSISTANT_ID: str
     MODERATOR_ASSISTANT_ID: str
     OWNERSHIP_VERIFICATION_ASSISTANT_ID: str
 
+    # "assistants" — треди і run в Assistants API, "chat" — один запит Chat Completions зі строгою JSON-схемою
+    GPT_BACKEND: Literal["assistants", "chat"] = "assistants"
+    # Модель для режиму "chat"; якщо не задана — модель відповідного асистента
+    GPT_CHAT_MODEL: Optional[str] = None
+
+    GPT_RUN_TIMEOUT: int = 120
+    GPT_RUN_POLL_INITIAL_DELAY: float = 0.2
+    GPT_RUN_POLL_MAX_DELAY: float = 2.0
+
+    GPT_IMAGE_MAX_SIDE: int = 1024
+    # Скани документів зменшуються менше: дрібний текст на них має лишатися читабельним
+    GPT_DOCUMENT_IMAGE_MAX_SIDE: int = 2048
+    GPT_IMAGE_JPEG_QUALITY: int = 85
+    GPT_IMAGE_CACHE_DIR: str = "static/gpt_cache"
+    # Підготовлені фото, якими не користувались довше за цей строк, видаляються з GPT_IMAGE_CACHE_DIR, с
+    GPT_IMAGE_CACHE_TTL: int = 7 * 24 * 3600
+    GPT_FILE_CACHE_TTL: int = 7 * 24 * 3600
+
+    # Скільки оголошень воркер модерації бере з черги і перевіряє одночасно
+    MODERATION_CONCURRENCY: int = 4
+    MODERATION_MAX_ATTEMPTS: int = 5
+    MODERATION_RETRY_BASE_DELAY: int = 30
+    MODERATION_RETRY_MAX_DELAY: int = 3600
+    MODERATION_VISIBILITY_TIMEOUT: int = 600
+    # Воркер модерації будиться через Postgres NOTIFY; опитування лише страхує від втрачених повідомлень
+    MODERATION_FALLBACK_POLL_INTERVAL: int = 30
+    # Як часто з'єднання LISTEN перевіряється запитом SELECT 1, с: тихий обрив TCP інакше не помітити
+    PG_LISTENER_HEALTH_CHECK_INTERVAL: int = 30
+    PG_LISTENER_HEALTH_CHECK_TIMEOUT: int = 10
+
+    # Коли в черзі накопичується MODERATION_BATCH_THRESHOLD задач, їх перевіряють через OpenAI Batch API
+    MODERATION_BATCH_MODE: bool = False
+    MODERATION_BATCH_THRESHOLD: int = 200
+    MODERATION_BATCH_MAX_LISTINGS: int = 500
+    # Розмір вхідного JSONL одного batch (фото вбудовані в base64); більші порції діляться на кілька batch.
+    # Ліміт OpenAI — 200 МБ на файл
+    MODERATION_BATCH_MAX_BYTES: int = 100 * 1024 * 1024
+    MODERATION_BATCH_POLL_INTERVAL: int = 60
+
+    # Скільки зберігаються вердикти модерації для незмінного вмісту, с. Відмову перевіряємо заново
+    # раніше, щоб виправлений промпт чи хибне спрацювання не блокували той самий вміст надовго
+    MODERATION_VERDICT_TTL: int = 30 * 24 * 3600
+    MODERATION_REJECTED_VERDICT_TTL: int = 24 * 3600
+    # Входить у відбиток вмісту: збільшити після зміни інструкцій асистентів чи правил премодерації,
+    # щоб усі збережені вердикти стали недійсними
+    MODERATION_VERDICT_VERSION: int = 1
+
+    # Локальна премодерація відхиляє без GPT лише очевидні випадки. Посилання, повтори символів
+    # і подібне бувають і в нормальних текстах, тож за замовчуванням їх оцінює GPT
+    PRE_MODERATION_MIN_TEXT_LENGTH: int = 10
+    PRE_MODERATION_BLOCKLIST: list[str] = []
+    PRE_MODERATION_SPAM_PATTERNS: list[str] = []
+    PRE_MODERATION_MIN_IMAGE_SIDE: int = 300
+    PRE_MODERATION_IMAGE_HASH_DISTANCE: int = 4
+    # Скільки днів фото з відхиленого оголошення блокуються без перевірки в GPT
+    PRE_MODERATION_REJECTED_IMAGE_TTL_DAYS: int = 90
+
+    REVIEW_MODERATION_CONCURRENCY: int = 2
+    REVIEW_MODERATION_MAX_ATTEMPTS: int = 5
+    # Як часто лідер знову ставить у чергу відгуки, що лишились на модерації, с
+    REVIEW_MODERATION_SWEEP_INTERVAL: int = 600
+
     EMAIL_SMTP_SERVER: str = "smtp.gmail.com"
     EMAIL_SMTP_PORT: int = 587
     EMAIL_LOGIN: str
     EMAIL_PASSWORD: str
+    EMAIL_SMTP_STARTTLS: bool = True
+    EMAIL_SMTP_TIMEOUT: int = 30
+    # Розмір пулу SMTP-з'єднань, тобто скільки листів відправляється одночасно
+    EMAIL_CONCURRENCY: int = 4
+    EMAIL_MAX_ATTEMPTS: int = 5
+    # Після стількох листів з'єднання перевідкривається (ліміти поштових серверів на сесію)
+    EMAIL_MAX_MESSAGES_PER_CONNECTION: int = 100
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_OUTBOX_VISIBILITY_TIMEOUT: int = 300
+    EMAIL_OUTBOX_POLL_INTERVAL: int = 30
+    EMAIL_OUTBOX_RETRY_BASE_DELAY: int = 60
+    EMAIL_OUTBOX_RETRY_MAX_DELAY: int = 3600
+    EMAIL_OUTBOX_RETENTION_DAYS: int = 30
+
+    # Запланованими задачами займається лише один процес кластера — власник advisory lock
+    LEADER_LOCK_KEY: int = 731100044
+    LEADER_CHECK_INTERVAL: int = 5
+    # Якщо з'єднання лідера не відповідає стільки секунд, процес складає лідерство і перепідключається
+    LEADER_CHECK_TIMEOUT: int = 3
+
+    JOB_RUN_RETENTION_DAYS: int = 14
+
+    # Надолуження пропущених запусків воркерів виконується у фоні вже після старту застосунку
+    DEFERRED_STARTUP: bool = True
+    # Скільки /health/ready чекає на відповідь бази, перш ніж повернути 503, с
+    HEALTH_CHECK_DB_TIMEOUT: float = 2
+
+    # Як часто кожен процес перечитує довідник міст для автодоповнення, с. Після імпорту (parsing_locations.py)
+    # процеси оновлюються одразу за NOTIFY; інтервал обмежує розбіжність ETag між процесами
+    # лише для змін, внесених напряму в базу
+    CITY_INDEX_REFRESH_INTERVAL: int = 3600
+    STREET_SEARCH_KEY_BACKFILL_BATCH_SIZE: int = 5000
+    LOCATION_SEARCH_LIMIT: int = 100
+    # Найбільша сторінка вулиць міста; без limit список, як і раніше, повертається повністю
+    LOCATION_STREETS_MAX_PAGE_SIZE: int = 1000
+    # Скільки клієнти й проксі можуть не перепитувати списки вулиць; далі — перевірка за ETag
+    LOCATION_CACHE_MAX_AGE: int = 3600
+    # Нечіткий пошук міст і вулиць; коротші запити шукаються лише за префіксом
+    LOCATION_FUZZY_MIN_LENGTH: int = 4
+    # Частка триграм запиту, що мають знайтися в назві (як pg_trgm.word_similarity_threshold)
+    LOCATION_FUZZY_THRESHOLD: float = 0.5
+    # Бюджет часу на нечіткий пошук вулиць у базі, після нього відповідає пошук за префіксом
+    LOCATION_FUZZY_TIMEOUT_MS: int = 200
+
+    # Активні оголошення без оновлень довше за цей строк автоматично архівуються
+    LISTING_RELEVANCE_DAYS: int = 15
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
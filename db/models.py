@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Text, DECIMAL, UniqueConstraint, \
-    CheckConstraint, Float
+    CheckConstraint, Float, BigInteger, Index, func, event, DDL
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -87,6 +87,11 @@ class ListingModel(Base):
     document_ownership_path = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Для архівації неактуальних оголошень за статусом і датою
+        Index("ix_listing_status_created_at", "listing_status_id", "created_at"),
+    )
+
     owner = relationship("UserModel", backref="listings", foreign_keys=[owner_id])
     heating_type = relationship("HeatingTypeModel")
     listing_type = relationship("ListingTypeModel")
@@ -107,6 +112,142 @@ class ImageModel(Base):
     listing = relationship("ListingModel", back_populates="images")
 
 
+MODERATION_JOB_PENDING = "pending"
+MODERATION_JOB_PROCESSING = "processing"
+MODERATION_JOB_DEAD = "dead"
+# Задача передана в OpenAI Batch API і чекає на результати batch
+MODERATION_JOB_BATCHED = "batched"
+
+# Пріоритет модерації: менше значення обробляється раніше.
+# Нові оголошення йдуть перед правками, верифіковані власники — перед іншими
+MODERATION_PRIORITY_NEW = 0
+MODERATION_PRIORITY_EDIT = 2
+MODERATION_PRIORITY_UNVERIFIED_PENALTY = 1
+
+# Канал Postgres NOTIFY, яким будимо воркер модерації, коли в черзі з'являється задача
+MODERATION_JOBS_CHANNEL = "moderation_jobs"
+
+
+class ModerationBatchModel(Base):
+    __tablename__ = "moderation_batch"
+    id = Column(Integer, primary_key=True)
+    openai_batch_id = Column(String, nullable=False, unique=True)
+    # Статус batch в OpenAI: validating, in_progress, finalizing, completed, failed, expired, cancelled
+    status = Column(String, nullable=False, index=True)
+    request_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    finished_at = Column(DateTime(timezone=True))
+
+
+class ModerationJobModel(Base):
+    __tablename__ = "moderation_job"
+    id = Column(Integer, primary_key=True)
+    listing_id = Column(Integer, ForeignKey("listing.id", ondelete="CASCADE"), nullable=False, unique=True)
+    owner_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), index=True)
+    status = Column(String, nullable=False, default=MODERATION_JOB_PENDING, index=True)
+    priority = Column(Integer, nullable=False, default=MODERATION_PRIORITY_NEW)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Збільшується при кожній повторній постановці в чергу, щоб не застосувати застарілий результат
+    version = Column(Integer, nullable=False, default=1)
+    available_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_until = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    batch_id = Column(Integer, ForeignKey("moderation_batch.id", ondelete="SET NULL"), index=True)
+    # Коли задача стала в чергу; для метрик часу очікування за пріоритетами
+    queued_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    listing = relationship("ListingModel")
+
+
+class ModerationVerdictModel(Base):
+    __tablename__ = "moderation_verdict"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    fingerprint = Column(String, nullable=False)
+    is_ok = Column(Boolean, nullable=False)
+    reason = Column(Text)
+    # Етап, що прийняв рішення: "local" (локальні правила) або "gpt"
+    stage = Column(String, nullable=False, default="gpt")
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Після цього моменту вміст перевіряється заново; відмови живуть менше, ніж схвалення
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    __table_args__ = (UniqueConstraint("kind", "fingerprint", name="uq_moderation_verdict_kind_fingerprint"),)
+
+
+class RejectedImageModel(Base):
+    __tablename__ = "rejected_image"
+    id = Column(Integer, primary_key=True)
+    # 64-бітний perceptual hash (dHash) фото з відхиленого оголошення
+    image_hash = Column(BigInteger, nullable=False, unique=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class OpenAIFileModel(Base):
+    __tablename__ = "openai_file"
+    id = Column(Integer, primary_key=True)
+    content_hash = Column(String, nullable=False, index=True)
+    file_id = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+EMAIL_OUTBOX_PENDING = "pending"
+EMAIL_OUTBOX_SENDING = "sending"
+EMAIL_OUTBOX_SENT = "sent"
+EMAIL_OUTBOX_DEAD = "dead"
+
+EMAIL_OUTBOX_CHANNEL = "email_outbox"
+
+
+class EmailOutboxModel(Base):
+    """Лист, записаний у тій самій транзакції, що й зміна стану; відправляє його диспетчер outbox."""
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True)
+    # Один лист на подію: повторний запис з тим самим ключем ігнорується
+    dedupe_key = Column(String, nullable=False, unique=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default=EMAIL_OUTBOX_PENDING, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_until = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), index=True)
+
+
+JOB_RUN_OK = "ok"
+JOB_RUN_FAILED = "failed"
+
+
+class JobRunModel(Base):
+    """Історія запусків фонових задач: тривалість і кількість опрацьованих елементів."""
+    __tablename__ = "job_run"
+    id = Column(Integer, primary_key=True)
+    job = Column(String, nullable=False)
+    instance_id = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=False)
+    duration = Column(Float, nullable=False)
+    items_seen = Column(Integer, nullable=False, default=0)
+    items_processed = Column(Integer, nullable=False, default=0)
+    items_failed = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+
+    __table_args__ = (
+        Index("ix_job_run_job_started_at", "job", "started_at"),
+    )
+
+
+PUBLISHED_REVIEW_STATUS_ID = 2
+PENDING_REVIEW_STATUS_ID = 3
+REJECTED_REVIEW_STATUS_ID = 4
+
+
 class ReviewStatusModel(Base):
     __tablename__ = "review_status"
     id = Column(Integer, primary_key=True)
@@ -122,6 +263,7 @@ class ReviewModel(Base):
     description = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     review_status_id = Column(Integer, ForeignKey("review_status.id", ondelete="SET NULL"))
+    moderation_reason = Column(String)
 
     review_status = relationship("ReviewStatusModel", backref="reviews")
     tags = relationship("ReviewTagModel", secondary="review_tag_review", backref="reviews")
@@ -200,7 +342,34 @@ class StreetModel(Base):
     id = Column(Integer, primary_key=True)
     name_ukr = Column(String, nullable=False)
     name_eng = Column(String)
+    # Назва без типу вулиці в нижньому регістрі (utils.street_search_key) для пошуку за префіксом
+    search_key = Column(String)
+    # Той самий ключ в офіційній транслітерації (utils.street_search_key_latin) для запитів латиницею
+    search_key_latin = Column(String)
     city_id = Column(Integer, ForeignKey("city.id", ondelete="CASCADE"), nullable=False)
 
+    __table_args__ = (
+        # Сторінки вулиць міста за абеткою
+        Index("ix_street_city_id_name_ukr", "city_id", "name_ukr", "id"),
+        # text_pattern_ops дозволяє використовувати індекс для LIKE 'префікс%' за будь-якого collation
+        Index("ix_street_city_id_search_key", "city_id", "search_key", postgresql_ops={"search_key": "text_pattern_ops"}),
+        Index("ix_street_search_key", "search_key", postgresql_ops={"search_key": "text_pattern_ops"}),
+        # Нечіткий пошук з помилками в назві (pg_trgm)
+        Index("ix_street_search_key_trgm", "search_key", postgresql_using="gin",
+              postgresql_ops={"search_key": "gin_trgm_ops"}),
+        Index("ix_street_search_key_latin", "search_key_latin",
+              postgresql_ops={"search_key_latin": "text_pattern_ops"}),
+        Index("ix_street_search_key_latin_trgm", "search_key_latin", postgresql_using="gin",
+              postgresql_ops={"search_key_latin": "gin_trgm_ops"}),
+    )
+
     city = relationship("CityModel", back_populates="streets")
     listings = relationship("ListingModel", back_populates="street")
+
+
+# Канал Postgres NOTIFY, яким імпорт довідника міст і вулиць повідомляє процеси про зміни:
+# кожен перебудовує city_index одразу, а не за розкладом, і ETag списків вулиць між процесами не розходиться
+LOCATION_DATASET_CHANNEL = "location_dataset"
+
+
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
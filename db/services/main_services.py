@@ -1,6 +1,10 @@
-from typing import List
+from datetime import timedelta
+from typing import Callable, List, Optional
 
-from sqlalchemy import insert, delete, select, func, update
+from sqlalchemy import insert, delete, select, func, update, or_, and_, case, cast, exists, tuple_, bindparam, true
+from sqlalchemy.dialects.postgresql import BIT
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import joinedload, contains_eager
 
 from db.base import async_session_maker
 from db.models import (
@@ -19,8 +23,32 @@ from db.models import (
     ListingTagCategoryModel,
     ListingTagModel,
     ListingTagListingModel, CityModel, StreetModel,
+    ModerationJobModel,
+    ModerationBatchModel,
+    ModerationVerdictModel,
+    RejectedImageModel,
+    OpenAIFileModel,
+    MODERATION_JOB_PENDING,
+    MODERATION_JOB_PROCESSING,
+    MODERATION_JOB_DEAD,
+    MODERATION_JOB_BATCHED,
+    MODERATION_PRIORITY_NEW,
+    MODERATION_PRIORITY_EDIT,
+    MODERATION_PRIORITY_UNVERIFIED_PENALTY,
+    MODERATION_JOBS_CHANNEL,
+    EmailOutboxModel,
+    EMAIL_OUTBOX_PENDING,
+    EMAIL_OUTBOX_SENDING,
+    EMAIL_OUTBOX_SENT,
+    EMAIL_OUTBOX_DEAD,
+    EMAIL_OUTBOX_CHANNEL,
+    JobRunModel,
+    JOB_RUN_FAILED,
+    PUBLISHED_REVIEW_STATUS_ID,
+    PENDING_REVIEW_STATUS_ID,
 )
 from db.services.base_service import BaseService
+from utils import datetime_now, street_search_key, street_search_key_latin, is_latin
 
 
 class UserService(BaseService[UserModel]):
@@ -31,12 +59,18 @@ class UserService(BaseService[UserModel]):
     async def get_user_rating_stats(cls, user_id: int) -> dict:
         async with cls.session_maker() as session:
             # Середній рейтинг
-            avg_rating_query = select(func.avg(ReviewModel.rating)).where(ReviewModel.owner_id == user_id)
+            avg_rating_query = select(func.avg(ReviewModel.rating)).where(
+                ReviewModel.owner_id == user_id,
+                ReviewModel.review_status_id == PUBLISHED_REVIEW_STATUS_ID
+            )
             avg_rating_result = await session.execute(avg_rating_query)
             avg_rating = avg_rating_result.scalar()
 
             # Кількість відгуків
-            count_query = select(func.count()).select_from(ReviewModel).where(ReviewModel.owner_id == user_id)
+            count_query = select(func.count()).select_from(ReviewModel).where(
+                ReviewModel.owner_id == user_id,
+                ReviewModel.review_status_id == PUBLISHED_REVIEW_STATUS_ID
+            )
             count_result = await session.execute(count_query)
             review_count = count_result.scalar()
 
@@ -75,6 +109,38 @@ class ListingService(BaseService[ListingModel]):
     model = ListingModel
     session_maker = async_session_maker
 
+    @classmethod
+    async def archive_stale(
+            cls,
+            cutoff,
+            active_status_id: int,
+            archived_status_id: int,
+            build_email: Callable[[int, str, str], dict]
+    ) -> list:
+        """
+        Одним запитом архівує активні оголошення, створені або оновлені раніше cutoff,
+        і в тій самій транзакції записує в outbox листи, зібрані build_email(id, назва, email власника).
+        Повертає (id, назва, email власника) заархівованих оголошень.
+        """
+        listing, user = ListingModel.__table__, UserModel.__table__
+        # UPDATE ... FROM на рівні Core: ORM-update не вміє повертати колонки іншої таблиці
+        query = (
+            update(listing)
+            .where(
+                listing.c.listing_status_id == active_status_id,
+                listing.c.created_at < cutoff,
+                listing.c.owner_id == user.c.id
+            )
+            # Як і при ручній архівації: після повторної активації відлік починається заново
+            .values(listing_status_id=archived_status_id, created_at=func.timezone("utc", func.now()))
+            .returning(listing.c.id, listing.c.name, user.c.email)
+        )
+        async with cls.session_maker() as session:
+            archived = (await session.execute(query)).all()
+            await EmailOutboxService.stage(session, [build_email(*row) for row in archived])
+            await session.commit()
+            return archived
+
     @classmethod
     async def add_tags_to_listing(cls, listing_id: int, tag_ids: List[int]):
         if not tag_ids:
@@ -106,6 +172,21 @@ class ListingService(BaseService[ListingModel]):
 
             await session.commit()
 
+    @classmethod
+    async def select_for_moderation(cls, listing_ids: List[int]) -> dict[int, ListingModel]:
+        query = (
+            select(ListingModel)
+            .options(
+                joinedload(ListingModel.owner),
+                joinedload(ListingModel.city),
+                joinedload(ListingModel.street),
+                joinedload(ListingModel.images),
+            )
+            .where(ListingModel.id.in_(listing_ids))
+        )
+        listings = await cls.execute(query)
+        return {listing.id: listing for listing in listings}
+
 
 class ListingTypeService(BaseService[ListingTypeModel]):
     model = ListingTypeModel
@@ -149,16 +230,49 @@ class ReviewService(BaseService[ReviewModel]):
             query = select(func.count(ReviewTagReviewModel.review_tag_id)).join(
                 ReviewModel, ReviewTagReviewModel.review_id == ReviewModel.id
             ).where(
-                ReviewModel.owner_id == owner_id
+                ReviewModel.owner_id == owner_id,
+                ReviewModel.review_status_id == PUBLISHED_REVIEW_STATUS_ID
             )
             result = await session.execute(query)
             return result.scalar() or 0
 
+    @classmethod
+    async def apply_moderation_result(cls, review_id: int, description: str, review_status_id: int,
+                                      moderation_reason: str = None) -> bool:
+        # Застосовуємо результат лише якщо відгук не змінили, поки він був на модерації
+        async with cls.session_maker() as session:
+            result = await session.execute(
+                update(ReviewModel)
+                .where(
+                    ReviewModel.id == review_id,
+                    ReviewModel.review_status_id == PENDING_REVIEW_STATUS_ID,
+                    ReviewModel.description.is_not_distinct_from(description)
+                )
+                .values(review_status_id=review_status_id, moderation_reason=moderation_reason)
+                .returning(ReviewModel.id)
+            )
+            updated = result.scalar_one_or_none() is not None
+            await session.commit()
+            return updated
+
 
 class ReviewStatusService(BaseService[ReviewStatusModel]):
     model = ReviewStatusModel
     session_maker = async_session_maker
 
+    @classmethod
+    async def ensure(cls, statuses: dict) -> List[int]:
+        """Додає відсутні статуси {id: назва}; повертає id, яких після цього все одно немає в таблиці."""
+        async with cls.session_maker() as session:
+            await session.execute(
+                pg_insert(ReviewStatusModel)
+                .values([{"id": status_id, "name": name} for status_id, name in statuses.items()])
+                .on_conflict_do_nothing()
+            )
+            existing = await session.execute(select(ReviewStatusModel.id).where(ReviewStatusModel.id.in_(statuses)))
+            await session.commit()
+            return sorted(set(statuses) - set(existing.scalars().all()))
+
 
 class ReviewTagService(BaseService[ReviewTagModel]):
     model = ReviewTagModel
@@ -192,6 +306,752 @@ class CityService(BaseService[CityModel]):
     model = CityModel
     session_maker = async_session_maker
 
+    @classmethod
+    async def select_for_index(cls) -> list:
+        async with cls.session_maker() as session:
+            result = await session.execute(
+                select(CityModel.id, CityModel.name_ukr, CityModel.name_eng, CityModel.oblast)
+            )
+            return result.all()
+
+    @classmethod
+    async def dataset_version(cls) -> str:
+        """
+        Відбиток довідника міст і вулиць: змінюється після імпорту, видалення чи перейменування.
+        Ключі пошуку в нього не входять, бо на відповіді API вони не впливають.
+        """
+        def table_summary(model):
+            return select(
+                func.concat_ws(":", func.count(), func.max(model.id), func.coalesce(func.sum(func.hashtext(model.name_ukr)), 0))
+            ).scalar_subquery()
+
+        async with cls.session_maker() as session:
+            result = await session.execute(
+                select(func.md5(func.concat_ws("/", table_summary(CityModel), table_summary(StreetModel))))
+            )
+            return result.scalar_one()[:16]
+
 class StreetService(BaseService[StreetModel]):
     model = StreetModel
     session_maker = async_session_maker
+
+    @classmethod
+    async def search(
+            cls,
+            keys: list[str],
+            city_id: int = None,
+            limit: int = 100,
+            fuzzy_threshold: float = None,
+            timeout_ms: int = None
+    ) -> list[tuple[StreetModel, int]]:
+        """
+        Вулиці, чий ключ пошуку починається з одного з keys (латинські ключі шукаються
+        в search_key_latin), разом з номером першого ключа, що збігся. Якщо задано fuzzy_threshold —
+        ще й схожі на keys[0] за pg_trgm word_similarity (помилки в назві) з номером len(keys).
+        Спершу збіги за префіксом, далі за схожістю.
+        timeout_ms обмежує час запиту: після нього Postgres скасовує його з QueryCanceledError.
+        """
+        def key_column(key: str):
+            return StreetModel.search_key_latin if is_latin(key) else StreetModel.search_key
+
+        prefixes = [key_column(key).startswith(key, autoescape=True) for key in keys]
+        rank = case(*((prefix, index) for index, prefix in enumerate(prefixes)), else_=len(keys))
+        query = (
+            select(StreetModel, rank)
+            .join(CityModel, CityModel.id == StreetModel.city_id)
+            .options(contains_eager(StreetModel.city))
+            .limit(limit)
+        )
+        if city_id is not None:
+            query = query.where(StreetModel.city_id == city_id)
+        if fuzzy_threshold is None:
+            query = query.where(or_(*prefixes)).order_by(rank, CityModel.name_ukr, StreetModel.name_ukr)
+        else:
+            column = key_column(keys[0])
+            query = query.where(or_(*prefixes, column.op("%>")(keys[0]))).order_by(
+                rank,
+                func.word_similarity(keys[0], column).desc(),
+                CityModel.name_ukr,
+                StreetModel.name_ukr
+            )
+
+        async with cls.session_maker() as session:
+            if timeout_ms is not None:
+                await session.execute(select(func.set_config("statement_timeout", str(timeout_ms), True)))
+            if fuzzy_threshold is not None:
+                # Поріг оператора %>, що використовує GIN-індекс; діє лише до кінця транзакції
+                await session.execute(select(
+                    func.set_config("pg_trgm.word_similarity_threshold", str(fuzzy_threshold), True)
+                ))
+            result = await session.execute(query)
+            return [tuple(row) for row in result.all()]
+
+    @classmethod
+    async def select_city_page(cls, city_id: int, limit: Optional[int], offset: int) -> tuple:
+        """
+        Одним запитом: назва міста, загальна кількість його вулиць і сторінка вулиць за абеткою
+        (limit=None — усі вулиці від offset). Повертає (None, 0, []), якщо міста немає.
+        """
+        page = (
+            select(StreetModel.id, StreetModel.name_ukr)
+            .where(StreetModel.city_id == city_id)
+            .order_by(StreetModel.name_ukr, StreetModel.id)
+            .limit(limit)
+            .offset(offset)
+            .subquery()
+        )
+        # Агрегат у FROM рахується один раз, а не для кожного рядка сторінки, як скалярний підзапит
+        total = select(func.count().label("count")).where(StreetModel.city_id == city_id).subquery()
+        query = (
+            select(CityModel.name_ukr, total.c.count, page.c.id, page.c.name_ukr)
+            .select_from(CityModel)
+            .join(total, true())
+            # LEFT JOIN: рядок міста повертається навіть для порожньої сторінки
+            .outerjoin(page, true())
+            .where(CityModel.id == city_id)
+            .order_by(page.c.name_ukr, page.c.id)
+        )
+        async with cls.session_maker() as session:
+            rows = (await session.execute(query)).all()
+        if not rows:
+            return None, 0, []
+        city_name, total_count = rows[0][0], rows[0][1]
+        return city_name, total_count, [(street_id, name) for _, _, street_id, name in rows if street_id is not None]
+
+    @classmethod
+    async def backfill_search_keys(cls, batch_size: int) -> int:
+        """Заповнює ключі пошуку для однієї пачки вулиць без них, повертає кількість оновлених."""
+        streets = StreetModel.__table__
+        async with cls.session_maker() as session:
+            rows = (await session.execute(
+                select(streets.c.id, streets.c.name_ukr)
+                .where(or_(streets.c.search_key.is_(None), streets.c.search_key_latin.is_(None)))
+                .order_by(streets.c.id)
+                .limit(batch_size)
+            )).all()
+            if not rows:
+                return 0
+            await session.execute(
+                update(streets)
+                .where(streets.c.id == bindparam("street_id"))
+                .values(search_key=bindparam("key"), search_key_latin=bindparam("key_latin")),
+                [
+                    {"street_id": street_id, "key": street_search_key(name), "key_latin": street_search_key_latin(name)}
+                    for street_id, name in rows
+                ]
+            )
+            await session.commit()
+        return len(rows)
+
+
+class ModerationJobService(BaseService[ModerationJobModel]):
+    model = ModerationJobModel
+    session_maker = async_session_maker
+
+    @staticmethod
+    async def notify(session):
+        # Повідомлення доставляється слухачам лише після commit транзакції
+        await session.execute(select(func.pg_notify(MODERATION_JOBS_CHANNEL, "")))
+
+    @staticmethod
+    def priority_for(is_new: bool, owner_verified: bool) -> int:
+        priority = MODERATION_PRIORITY_NEW if is_new else MODERATION_PRIORITY_EDIT
+        return priority if owner_verified else priority + MODERATION_PRIORITY_UNVERIFIED_PENALTY
+
+    @classmethod
+    async def enqueue(cls, listing_id: int, owner_id: int = None, priority: int = MODERATION_PRIORITY_NEW):
+        query = pg_insert(ModerationJobModel).values(listing_id=listing_id, owner_id=owner_id, priority=priority)
+        query = query.on_conflict_do_update(
+            index_elements=[ModerationJobModel.listing_id],
+            set_={
+                "owner_id": query.excluded.owner_id,
+                # Правка ще не промодерованого нового оголошення не знижує його пріоритет
+                "priority": func.least(ModerationJobModel.priority, query.excluded.priority),
+                # Якщо задачу зараз обробляють — не віддаємо її іншому воркеру,
+                # а лише збільшуємо версію: complete() поверне її в чергу
+                "status": case(
+                    (ModerationJobModel.status == MODERATION_JOB_PROCESSING, MODERATION_JOB_PROCESSING),
+                    else_=MODERATION_JOB_PENDING
+                ),
+                "version": ModerationJobModel.version + 1,
+                "attempts": 0,
+                "available_at": func.now(),
+                "last_error": None,
+                # Результат batch для старого вмісту вже не потрібен
+                "batch_id": None,
+            }
+        )
+        async with cls.session_maker() as session:
+            await session.execute(query)
+            await cls.notify(session)
+            await session.commit()
+
+    @classmethod
+    async def enqueue_pending_listings(cls, moderation_status_id: int):
+        query = pg_insert(ModerationJobModel).from_select(
+            ["listing_id", "owner_id", "priority"],
+            select(
+                ListingModel.id,
+                ListingModel.owner_id,
+                case(
+                    (UserModel.is_verified, MODERATION_PRIORITY_NEW),
+                    else_=MODERATION_PRIORITY_NEW + MODERATION_PRIORITY_UNVERIFIED_PENALTY
+                )
+            )
+            .join(UserModel, UserModel.id == ListingModel.owner_id)
+            .where(
+                ListingModel.listing_status_id == moderation_status_id,
+                # Незаповнене оголошення воркер однаково пропустить; задачу для нього створить
+                # enqueue() після редагування, а не кожне резервне опитування
+                ListingModel.name != "",
+                ListingModel.description != "",
+                ListingModel.document_ownership_path != "",
+            )
+        ).on_conflict_do_nothing(index_elements=[ModerationJobModel.listing_id])
+        async with cls.session_maker() as session:
+            await session.execute(query)
+            await session.commit()
+
+    @classmethod
+    async def claim(
+            cls,
+            limit: int,
+            visibility_timeout: int,
+            status: str = MODERATION_JOB_PROCESSING
+    ) -> List[ModerationJobModel]:
+        is_claimable = or_(
+            and_(
+                ModerationJobModel.status == MODERATION_JOB_PENDING,
+                ModerationJobModel.available_at <= func.now()
+            ),
+            # Воркер, що взяв задачу, не завершив її вчасно — задача знову доступна.
+            # Для задач у створеному batch locked_until порожній, їх повертає воркер batch
+            and_(
+                ModerationJobModel.status.in_([MODERATION_JOB_PROCESSING, MODERATION_JOB_BATCHED]),
+                ModerationJobModel.locked_until < func.now()
+            ),
+        )
+        # Номер задачі серед задач того ж власника і пріоритету: спершу беремо по одній
+        # задачі кожного власника, тож масове завантаження одного агентства не блокує інших
+        ranked = (
+            select(
+                ModerationJobModel.id,
+                func.row_number().over(
+                    partition_by=(ModerationJobModel.owner_id, ModerationJobModel.priority),
+                    order_by=(ModerationJobModel.available_at, ModerationJobModel.id)
+                ).label("owner_rank")
+            )
+            .where(is_claimable)
+            .subquery()
+        )
+        # Умову повторюємо для рядка, що блокується: підзапит читає знімок до блокування,
+        # і без перевірки після FOR UPDATE задачу, яку щойно взяв інший воркер, взяли б удруге
+        claimable = (
+            select(ModerationJobModel.id)
+            .join(ranked, ranked.c.id == ModerationJobModel.id)
+            .where(is_claimable)
+            .order_by(ModerationJobModel.priority, ranked.c.owner_rank, ModerationJobModel.available_at)
+            .limit(limit)
+            .with_for_update(of=ModerationJobModel, skip_locked=True)
+        )
+        query = (
+            update(ModerationJobModel)
+            .where(ModerationJobModel.id.in_(claimable))
+            .values(
+                status=status,
+                attempts=ModerationJobModel.attempts + 1,
+                locked_until=func.now() + timedelta(seconds=visibility_timeout),
+                batch_id=None,
+            )
+            .returning(ModerationJobModel)
+            .execution_options(synchronize_session=False)
+        )
+        async with cls.session_maker() as session:
+            result = await session.execute(query)
+            jobs = result.scalars().all()
+            await session.commit()
+            return sorted(jobs, key=lambda job: job.priority)
+
+    @classmethod
+    async def count_pending(cls) -> int:
+        query = select(func.count()).select_from(ModerationJobModel).where(
+            ModerationJobModel.status == MODERATION_JOB_PENDING,
+            ModerationJobModel.available_at <= func.now()
+        )
+        async with cls.session_maker() as session:
+            return (await session.execute(query)).scalar_one()
+
+    @classmethod
+    async def assign_batch(cls, job_ids: List[int], batch_id: int):
+        async with cls.session_maker() as session:
+            await session.execute(
+                update(ModerationJobModel)
+                .where(ModerationJobModel.id.in_(job_ids), ModerationJobModel.status == MODERATION_JOB_BATCHED)
+                .values(batch_id=batch_id, locked_until=None)
+            )
+            await session.commit()
+
+    @classmethod
+    async def select_batched(cls, batch_id: int) -> List[ModerationJobModel]:
+        return await cls.execute(
+            select(ModerationJobModel).where(
+                ModerationJobModel.batch_id == batch_id,
+                ModerationJobModel.status == MODERATION_JOB_BATCHED
+            )
+        )
+
+    @classmethod
+    async def release(cls, job_ids: List[int]):
+        """Повертає задачі з batch у звичайну чергу."""
+        async with cls.session_maker() as session:
+            await session.execute(
+                update(ModerationJobModel)
+                .where(ModerationJobModel.id.in_(job_ids), ModerationJobModel.status == MODERATION_JOB_BATCHED)
+                .values(status=MODERATION_JOB_PENDING, batch_id=None, locked_until=None, available_at=func.now())
+            )
+            await cls.notify(session)
+            await session.commit()
+
+    @classmethod
+    async def complete_many(cls, jobs: List[ModerationJobModel], listing_values: dict) -> set:
+        """
+        Завершує задачі batch одним набором запитів: видаляє задачі з незмінною версією,
+        оновлює їхні оголошення значеннями з listing_values ({job.id: значення або None}),
+        а решту задач повертає в звичайну чергу. Повертає ідентифікатори завершених задач.
+        """
+        decided = [job for job in jobs if job.id in listing_values]
+        async with cls.session_maker() as session:
+            completed_ids = set()
+            if decided:
+                result = await session.execute(
+                    delete(ModerationJobModel)
+                    .where(
+                        tuple_(ModerationJobModel.id, ModerationJobModel.version).in_(
+                            [(job.id, job.version) for job in decided]
+                        ),
+                        ModerationJobModel.status == MODERATION_JOB_BATCHED
+                    )
+                    .returning(ModerationJobModel.id)
+                )
+                completed_ids = set(result.scalars().all())
+
+            listing_updates = [
+                {"id": job.listing_id, **listing_values[job.id]}
+                for job in decided if job.id in completed_ids and listing_values[job.id]
+            ]
+            if listing_updates:
+                await session.execute(update(ListingModel), listing_updates)
+
+            released_ids = [job.id for job in jobs if job.id not in completed_ids]
+            if released_ids:
+                await session.execute(
+                    update(ModerationJobModel)
+                    .where(ModerationJobModel.id.in_(released_ids), ModerationJobModel.status == MODERATION_JOB_BATCHED)
+                    .values(status=MODERATION_JOB_PENDING, batch_id=None, locked_until=None, available_at=func.now())
+                )
+                await cls.notify(session)
+            await session.commit()
+            return completed_ids
+
+    @classmethod
+    async def complete(cls, job: ModerationJobModel, listing_values: dict = None) -> bool:
+        async with cls.session_maker() as session:
+            result = await session.execute(
+                delete(ModerationJobModel)
+                .where(ModerationJobModel.id == job.id, ModerationJobModel.version == job.version)
+                .returning(ModerationJobModel.id)
+            )
+            completed = result.scalar_one_or_none() is not None
+            if not completed:
+                # Оголошення змінили під час модерації — результат застарів, перевіряємо ще раз
+                await session.execute(
+                    update(ModerationJobModel)
+                    .where(ModerationJobModel.id == job.id)
+                    .values(status=MODERATION_JOB_PENDING, locked_until=None)
+                )
+                await cls.notify(session)
+            elif listing_values:
+                await session.execute(
+                    update(ListingModel)
+                    .where(ListingModel.id == job.listing_id)
+                    .values(**listing_values)
+                )
+            await session.commit()
+            return completed
+
+    @classmethod
+    async def fail(cls, job: ModerationJobModel, error: str, max_attempts: int, retry_delay: float):
+        async with cls.session_maker() as session:
+            await session.execute(
+                update(ModerationJobModel)
+                .where(ModerationJobModel.id == job.id, ModerationJobModel.version == job.version)
+                .values(
+                    status=MODERATION_JOB_DEAD if job.attempts >= max_attempts else MODERATION_JOB_PENDING,
+                    available_at=func.now() + timedelta(seconds=retry_delay),
+                    locked_until=None,
+                    last_error=error,
+                )
+            )
+            await session.execute(
+                update(ModerationJobModel)
+                .where(ModerationJobModel.id == job.id, ModerationJobModel.version != job.version)
+                .values(status=MODERATION_JOB_PENDING, locked_until=None)
+            )
+            await session.commit()
+
+    @classmethod
+    async def retry_dead(cls, listing_id: int) -> bool:
+        async with cls.session_maker() as session:
+            result = await session.execute(
+                update(ModerationJobModel)
+                .where(
+                    ModerationJobModel.listing_id == listing_id,
+                    ModerationJobModel.status == MODERATION_JOB_DEAD
+                )
+                .values(status=MODERATION_JOB_PENDING, attempts=0, available_at=func.now(), last_error=None)
+                .returning(ModerationJobModel.id)
+            )
+            job_id = result.scalar_one_or_none()
+            if job_id is not None:
+                # Без сповіщення задача чекала б резервного опитування
+                await cls.notify(session)
+            await session.commit()
+            return job_id is not None
+
+
+class ModerationVerdictService(BaseService[ModerationVerdictModel]):
+    model = ModerationVerdictModel
+    session_maker = async_session_maker
+
+    @classmethod
+    async def remember(cls, kind: str, fingerprint: str, is_ok: bool, reason: str, stage: str, ttl: int):
+        query = pg_insert(ModerationVerdictModel).values(
+            kind=kind,
+            fingerprint=fingerprint,
+            is_ok=is_ok,
+            reason=reason,
+            stage=stage,
+            expires_at=datetime_now() + timedelta(seconds=ttl)
+        )
+        query = query.on_conflict_do_update(
+            constraint="uq_moderation_verdict_kind_fingerprint",
+            set_={
+                "is_ok": query.excluded.is_ok,
+                "reason": query.excluded.reason,
+                "stage": query.excluded.stage,
+                "created_at": func.now(),
+                "expires_at": query.excluded.expires_at
+            }
+        )
+        async with cls.session_maker() as session:
+            await session.execute(query)
+            await session.commit()
+
+    @classmethod
+    async def remember_many(cls, verdicts: List[dict]):
+        # Один INSERT ... ON CONFLICT не може оновити той самий рядок двічі
+        verdicts = list({(verdict["kind"], verdict["fingerprint"]): verdict for verdict in verdicts}.values())
+        if not verdicts:
+            return
+
+        query = pg_insert(ModerationVerdictModel).values(verdicts)
+        query = query.on_conflict_do_update(
+            constraint="uq_moderation_verdict_kind_fingerprint",
+            set_={
+                "is_ok": query.excluded.is_ok,
+                "reason": query.excluded.reason,
+                "stage": query.excluded.stage,
+                "created_at": func.now(),
+                "expires_at": query.excluded.expires_at
+            }
+        )
+        async with cls.session_maker() as session:
+            await session.execute(query)
+            await session.commit()
+
+    @classmethod
+    async def select_fresh(cls, kind: str, fingerprint: str):
+        verdicts = await cls.select_many([(kind, fingerprint)])
+        return verdicts.get((kind, fingerprint))
+
+    @classmethod
+    async def select_many(cls, keys: List[tuple]) -> dict:
+        """Повертає {(kind, fingerprint): вердикт} для відомих вердиктів, строк яких ще не минув."""
+        if not keys:
+            return {}
+
+        verdicts = await cls.execute(
+            select(ModerationVerdictModel).where(
+                tuple_(ModerationVerdictModel.kind, ModerationVerdictModel.fingerprint).in_(set(keys)),
+                ModerationVerdictModel.expires_at > func.now()
+            )
+        )
+        return {(verdict.kind, verdict.fingerprint): verdict for verdict in verdicts}
+
+    @classmethod
+    async def forget(cls, kind: str, fingerprint: str):
+        async with cls.session_maker() as session:
+            await session.execute(
+                delete(ModerationVerdictModel).where(
+                    ModerationVerdictModel.kind == kind,
+                    ModerationVerdictModel.fingerprint == fingerprint
+                )
+            )
+            await session.commit()
+
+    @classmethod
+    async def delete_expired(cls) -> int:
+        async with cls.session_maker() as session:
+            result = await session.execute(
+                delete(ModerationVerdictModel).where(ModerationVerdictModel.expires_at <= func.now())
+            )
+            await session.commit()
+            return result.rowcount
+
+
+class ModerationBatchService(BaseService[ModerationBatchModel]):
+    model = ModerationBatchModel
+    session_maker = async_session_maker
+
+    FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+    @classmethod
+    async def select_active(cls) -> List[ModerationBatchModel]:
+        return await cls.execute(
+            select(ModerationBatchModel)
+            .where(ModerationBatchModel.status.not_in(cls.FINAL_STATUSES))
+            .order_by(ModerationBatchModel.id)
+        )
+
+
+class RejectedImageService(BaseService[RejectedImageModel]):
+    model = RejectedImageModel
+    session_maker = async_session_maker
+
+    @classmethod
+    async def remember(cls, image_hashes: List[int]):
+        if not image_hashes:
+            return
+
+        query = pg_insert(RejectedImageModel).values(
+            [{"image_hash": image_hash} for image_hash in image_hashes]
+        ).on_conflict_do_nothing(index_elements=[RejectedImageModel.image_hash])
+        async with cls.session_maker() as session:
+            await session.execute(query)
+            await session.commit()
+
+    @classmethod
+    async def has_similar(cls, image_hashes: List[int], max_distance: int, since) -> bool:
+        if not image_hashes:
+            return False
+
+        async with cls.session_maker() as session:
+            result = await session.execute(select(exists().where(
+                cls._similar_to(image_hashes, max_distance),
+                RejectedImageModel.created_at >= since
+            )))
+            return result.scalar()
+
+    @classmethod
+    async def forget_similar(cls, image_hashes: List[int], max_distance: int) -> int:
+        if not image_hashes:
+            return 0
+
+        async with cls.session_maker() as session:
+            result = await session.execute(delete(RejectedImageModel).where(cls._similar_to(image_hashes, max_distance)))
+            await session.commit()
+            return result.rowcount
+
+    @classmethod
+    async def delete_before(cls, cutoff) -> int:
+        async with cls.session_maker() as session:
+            result = await session.execute(delete(RejectedImageModel).where(RejectedImageModel.created_at < cutoff))
+            await session.commit()
+            return result.rowcount
+
+    @staticmethod
+    def _similar_to(image_hashes: List[int], max_distance: int):
+        # Відстань Геммінга між хешами: кількість різних бітів у XOR
+        return or_(*(
+            func.bit_count(cast(RejectedImageModel.image_hash.op("#")(image_hash), BIT(64))) <= max_distance
+            for image_hash in image_hashes
+        ))
+
+
+class EmailOutboxService(BaseService[EmailOutboxModel]):
+    model = EmailOutboxModel
+    session_maker = async_session_maker
+
+    @staticmethod
+    async def stage(session, emails: List[dict]):
+        """
+        Записує листи ({dedupe_key, to_email, subject, body}) у транзакцію викликача.
+        Вони будуть відправлені, лише якщо транзакція завершиться commit.
+        """
+        if not emails:
+            return
+        await session.execute(
+            pg_insert(EmailOutboxModel)
+            .values(emails)
+            .on_conflict_do_nothing(index_elements=[EmailOutboxModel.dedupe_key])
+        )
+        await session.execute(select(func.pg_notify(EMAIL_OUTBOX_CHANNEL, "")))
+
+    @classmethod
+    async def enqueue(cls, emails: List[dict]):
+        async with cls.session_maker() as session:
+            await cls.stage(session, emails)
+            await session.commit()
+
+    @classmethod
+    async def claim(cls, limit: int, visibility_timeout: int) -> List[EmailOutboxModel]:
+        claimable = (
+            select(EmailOutboxModel.id)
+            .where(or_(
+                and_(
+                    EmailOutboxModel.status == EMAIL_OUTBOX_PENDING,
+                    EmailOutboxModel.available_at <= func.now()
+                ),
+                # Диспетчер узяв лист і не встиг позначити результат (процес упав)
+                and_(
+                    EmailOutboxModel.status == EMAIL_OUTBOX_SENDING,
+                    EmailOutboxModel.locked_until < func.now()
+                ),
+            ))
+            .order_by(EmailOutboxModel.available_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = (
+            update(EmailOutboxModel)
+            .where(EmailOutboxModel.id.in_(claimable))
+            .values(
+                status=EMAIL_OUTBOX_SENDING,
+                attempts=EmailOutboxModel.attempts + 1,
+                locked_until=func.now() + timedelta(seconds=visibility_timeout),
+            )
+            .returning(EmailOutboxModel)
+            .execution_options(synchronize_session=False)
+        )
+        async with cls.session_maker() as session:
+            result = await session.execute(query)
+            emails = result.scalars().all()
+            await session.commit()
+            return emails
+
+    @classmethod
+    async def mark_sent(cls, email_ids: List[int]):
+        if not email_ids:
+            return
+        async with cls.session_maker() as session:
+            await session.execute(
+                update(EmailOutboxModel)
+                .where(EmailOutboxModel.id.in_(email_ids))
+                .values(status=EMAIL_OUTBOX_SENT, sent_at=func.now(), locked_until=None, last_error=None)
+            )
+            await session.commit()
+
+    @classmethod
+    async def fail(cls, email: EmailOutboxModel, error: str, max_attempts: int, retry_delay: float):
+        async with cls.session_maker() as session:
+            await session.execute(
+                update(EmailOutboxModel)
+                .where(EmailOutboxModel.id == email.id)
+                .values(
+                    status=EMAIL_OUTBOX_DEAD if email.attempts >= max_attempts else EMAIL_OUTBOX_PENDING,
+                    available_at=func.now() + timedelta(seconds=retry_delay),
+                    locked_until=None,
+                    last_error=error,
+                )
+            )
+            await session.commit()
+
+    @classmethod
+    async def delete_sent_before(cls, cutoff) -> int:
+        async with cls.session_maker() as session:
+            result = await session.execute(
+                delete(EmailOutboxModel)
+                .where(EmailOutboxModel.status == EMAIL_OUTBOX_SENT, EmailOutboxModel.sent_at < cutoff)
+                .returning(EmailOutboxModel.id)
+            )
+            await session.commit()
+            return len(result.all())
+
+
+class JobRunService(BaseService[JobRunModel]):
+    model = JobRunModel
+    session_maker = async_session_maker
+
+    @classmethod
+    async def select_recent(cls, job: str = None, limit: int = 50) -> List[JobRunModel]:
+        query = select(JobRunModel).order_by(JobRunModel.started_at.desc()).limit(limit)
+        if job:
+            query = query.where(JobRunModel.job == job)
+        return await cls.execute(query)
+
+    @classmethod
+    async def summary(cls, since) -> list:
+        """Зведення запусків кожної задачі з моменту since: кількість, тривалість і опрацьовані елементи."""
+        query = (
+            select(
+                JobRunModel.job,
+                func.count().label("runs"),
+                func.count().filter(JobRunModel.status == JOB_RUN_FAILED).label("failed_runs"),
+                func.max(JobRunModel.started_at).label("last_started_at"),
+                func.avg(JobRunModel.duration).label("avg_duration"),
+                func.percentile_cont(0.95).within_group(JobRunModel.duration).label("p95_duration"),
+                func.max(JobRunModel.duration).label("max_duration"),
+                func.sum(JobRunModel.items_seen).label("items_seen"),
+                func.sum(JobRunModel.items_processed).label("items_processed"),
+                func.sum(JobRunModel.items_failed).label("items_failed"),
+            )
+            .where(JobRunModel.started_at >= since)
+            .group_by(JobRunModel.job)
+            .order_by(JobRunModel.job)
+        )
+        async with cls.session_maker() as session:
+            return (await session.execute(query)).all()
+
+    @classmethod
+    async def delete_before(cls, cutoff) -> int:
+        async with cls.session_maker() as session:
+            result = await session.execute(
+                delete(JobRunModel).where(JobRunModel.started_at < cutoff).returning(JobRunModel.id)
+            )
+            await session.commit()
+            return len(result.all())
+
+
+class OpenAIFileService(BaseService[OpenAIFileModel]):
+    model = OpenAIFileModel
+    session_maker = async_session_maker
+
+    @classmethod
+    async def get_file_id(cls, content_hash: str):
+        query = (
+            select(OpenAIFileModel.file_id)
+            .where(OpenAIFileModel.content_hash == content_hash, OpenAIFileModel.expires_at > func.now())
+            .order_by(OpenAIFileModel.expires_at.desc())
+            .limit(1)
+        )
+        result = await cls.execute(query)
+        return result[0] if result else None
+
+    @classmethod
+    async def remember(cls, content_hash: str, file_id: str, ttl: int):
+        await cls.add(
+            content_hash=content_hash,
+            file_id=file_id,
+            expires_at=datetime_now() + timedelta(seconds=ttl)
+        )
+
+    @classmethod
+    async def select_expired(cls, limit: int, after_id: int = 0) -> List[OpenAIFileModel]:
+        # Прохід за id: файли, які не вдалося видалити, лишаються в таблиці і не повертаються знову
+        query = (
+            select(OpenAIFileModel)
+            .where(OpenAIFileModel.expires_at <= func.now(), OpenAIFileModel.id > after_id)
+            .order_by(OpenAIFileModel.id)
+            .limit(limit)
+        )
+        return await cls.execute(query)
@@ -0,0 +1,75 @@
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from config import config
+from db.base import engine
+from services.leader_election import leader, APPLICATION_NAME_PREFIX
+from services.startup import startup_state
+from .schemes import LivenessResponse, ReadinessResponse, LeaderResponse
+
+router = APIRouter(
+    prefix="/health",
+    tags=["Health"]
+)
+
+
+@router.get("/live", response_model=LivenessResponse)
+async def liveness():
+    # Процес працює і обробляє запити; залежності не перевіряються
+    return LivenessResponse(status="ok")
+
+
+@router.get("/ready", response_model=ReadinessResponse, responses={503: {"model": ReadinessResponse}})
+async def readiness():
+    async def check_database():
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    try:
+        # База, що не відповідає, — теж неготовність: проба має отримати 503, а не зависнути разом з нею
+        await asyncio.wait_for(check_database(), config.HEALTH_CHECK_DB_TIMEOUT)
+        database = "ok"
+    except Exception as e:
+        database = f"error: {type(e).__name__}"
+
+    # Відкладені задачі старту лише звітуються: вони виконуються вже після того, як застосунок приймає трафік
+    is_ready = startup_state.ready and database == "ok"
+    response = ReadinessResponse(
+        status="ready" if is_ready else "not_ready",
+        database=database,
+        startup_jobs=startup_state.jobs()
+    )
+    return JSONResponse(response.model_dump(), status_code=200 if is_ready else 503)
+
+
+@router.get("/leader", response_model=LeaderResponse)
+async def leadership():
+    # Сесійний advisory lock з bigint-ключем зберігається в pg_locks як дві 32-бітні половини
+    query = text("""
+        SELECT a.application_name
+        FROM pg_locks l
+        JOIN pg_stat_activity a ON a.pid = l.pid
+        WHERE l.locktype = 'advisory' AND l.granted AND l.objsubid = 1
+          AND l.classid = :classid AND l.objid = :objid
+    """)
+    async def select_leader():
+        async with engine.connect() as connection:
+            return (await connection.execute(query, {
+                "classid": leader.lock_key >> 32,
+                "objid": leader.lock_key & 0xFFFFFFFF,
+            })).scalar_one_or_none()
+
+    try:
+        application_name = await asyncio.wait_for(select_leader(), config.HEALTH_CHECK_DB_TIMEOUT)
+    except Exception:
+        application_name = None
+
+    return LeaderResponse(
+        instance_id=leader.instance_id,
+        is_leader=leader.is_leader,
+        leader_since=leader.leader_since,
+        leader_instance=application_name.removeprefix(APPLICATION_NAME_PREFIX) if application_name else None
+    )
@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class LivenessResponse(BaseModel):
+    status: str
+
+
+class ReadinessResponse(BaseModel):
+    status: str
+    database: str
+    startup_jobs: dict[str, str]
+
+
+class LeaderResponse(BaseModel):
+    instance_id: str
+    is_leader: bool
+    leader_since: Optional[datetime]
+    # Процес, що зараз утримує lock лідера в кластері (за даними Postgres)
+    leader_instance: Optional[str]
@@ -13,7 +13,7 @@ from sqlalchemy.orm import joinedload, InstrumentedAttribute, ColumnProperty
 
 from auth_app import get_current_active_user
 from db.models import ListingModel, ImageModel, ListingTagModel, UserModel, ListingTagListingModel
-from db.services.main_services import ListingService, UserService
+from db.services.main_services import ListingService, UserService, ModerationJobService
 from listing_tag_app.schemes import ListingTagShort
 from .schemes import ListingPayload, ListingResponse, ListingDetailResponse, UserShortResponse, UPLOAD_DIR, \
     ACTIVE_STATUS_ID, ARCHIVED_STATUS_ID, MODERATION_STATUS_ID
@@ -307,6 +307,9 @@ async def create_listing(
         await session.commit()
 
     await ListingService.add_tags_to_listing(listing.id, parsed_tag_ids)
+    await ModerationJobService.enqueue(
+        listing.id, user.id, ModerationJobService.priority_for(is_new=True, owner_verified=user.is_verified)
+    )
 
     # async with ListingService.session_maker() as session:
     #     result = await session.execute(
@@ -412,6 +415,10 @@ async def update_listing(
         parsed_tag_ids = json.loads(tag_ids)
         await ListingService.update_tags_for_listing(id, parsed_tag_ids)
 
+    await ModerationJobService.enqueue(
+        id, user.id, ModerationJobService.priority_for(is_new=False, owner_verified=user.is_verified)
+    )
+
     return True
 
 
@@ -1,18 +1,26 @@
-from fastapi import APIRouter, Query, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Query, Depends, HTTPException, Header, Response
+from typing import List, Optional
 import asyncpg
-from sqlalchemy import select, func, tuple_
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import joinedload
 
+from config import config
 from db.models import CityModel, StreetModel
 from db.services.main_services import CityService, StreetService
 from location_app.data import TOP_CITIES_FULL_EN, TOP_CITIES_FULL
 from location_app.schemes import CityOut, StreetOut, StreetShort, StreetWithCity
+from services.city_index import city_index
+from services.street_search import search_streets
+from utils import etag_matches
 
 router = APIRouter(prefix="/location", tags=["Location"])
 
 @router.get("/cities-ukr", response_model=List[CityOut])
 async def get_cities_ukr(q: str = Query("", max_length=50)):
+    # Поки індекс у пам'яті не завантажено (старт процесу), відповідає база
+    if city_index.loaded:
+        return city_index.search(q) if q.strip() else city_index.select_by_names(TOP_CITIES_FULL)
+
     if not q.strip():
         names = [item["name"] for item in TOP_CITIES_FULL]
         oblasts = [item["oblast"] for item in TOP_CITIES_FULL]
@@ -39,39 +47,47 @@ async def get_cities_ukr(q: str = Query("", max_length=50)):
 @router.get("/cities-ukr/{city_id}/streets", response_model=List[StreetShort])
 async def get_streets(
     city_id: int,
-    q: str = Query("", max_length=50)
+    response: Response,
+    q: str = Query("", max_length=50),
+    limit: Optional[int] = Query(
+        None, ge=1, le=config.LOCATION_STREETS_MAX_PAGE_SIZE,
+        description="Розмір сторінки; без нього повертаються всі вулиці міста, як до появи пагінації"
+    ),
+    offset: int = Query(0, ge=0),
+    if_none_match: Optional[str] = Header(None)
 ):
-    city = await CityService.select_one(id=city_id)
-    if not city:
-        raise HTTPException(status_code=404, detail="City with specified oblast not found")
-
     if q.strip():
-        cleaned_name = func.regexp_replace(StreetModel.name_ukr, r'^(вул\.|пров\.)\s*', '', 'i')
-        rows = await StreetService.select(
-            cleaned_name.ilike(f"{q.lower()}%"),
-            city_id=city_id,
-            order_by="name_ukr"
-        )
-    else:
-        rows = await StreetService.select(city_id=city_id, order_by="name_ukr")
+        rows = await search_streets(q, city_id)
+        # Місто перевіряється окремим запитом лише тоді, коли пошук нічого не знайшов
+        city = rows[0].city if rows else await CityService.select_one(id=city_id)
+        if not city:
+            raise HTTPException(status_code=404, detail="City with specified oblast not found")
+        return [StreetShort(id=row.id, name_ukr=row.name_ukr, city_name=city.name_ukr) for row in rows]
+
+    # Список вулиць змінюється лише разом з довідником, тож клієнти й проксі кешують його за версією довідника
+    headers = {}
+    if city_index.dataset_version:
+        headers = {
+            "ETag": f'W/"{city_index.dataset_version}"',
+            "Cache-Control": f"public, max-age={config.LOCATION_CACHE_MAX_AGE}",
+        }
+        # Індекс завантажено разом з цією версією довідника, тож для невідомого міста
+        # замість 304 відповідає база (404)
+        if etag_matches(if_none_match, headers["ETag"]) and city_index.has_city(city_id):
+            return Response(status_code=304, headers=headers)
+
+    city_name, total, streets = await StreetService.select_city_page(city_id, limit, offset)
+    if city_name is None:
+        raise HTTPException(status_code=404, detail="City with specified oblast not found")
 
-    return [StreetShort(id=row.id, name_ukr=row.name_ukr, city_name=city.name_ukr) for row in rows]
+    response.headers.update(headers)
+    response.headers["X-Total-Count"] = str(total)
+    return [StreetShort(id=street_id, name_ukr=name, city_name=city_name) for street_id, name in streets]
 
 @router.get("/streets", response_model=List[StreetWithCity])
 async def get_streets_ukr(q: str = Query("", max_length=50)):
     if q.strip():
-        cleaned_name = func.regexp_replace(StreetModel.name_ukr, r'^(вул\.|пров\.)\s*', '', 'i')
-
-        query = (
-            select(StreetModel)
-            .join(CityModel, CityModel.id == StreetModel.city_id)
-            .options(joinedload(StreetModel.city))
-            .where(cleaned_name.ilike(f"{q.lower()}%"))
-            .order_by(CityModel.name_ukr, StreetModel.name_ukr)
-            .limit(100)
-        )
-
-        rows = await StreetService.execute(query)
+        rows = await search_streets(q)
 
         return [
             {
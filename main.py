@@ -8,9 +8,11 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
+from config import config
 import admin_app
 import auth_app
 import favorites_app
+import health_app
 import heating_type_app
 import listing_app
 import listing_status_app
@@ -20,18 +22,72 @@ import listing_type_app
 import location_app
 import review_app
 import review_tag_app
+from review_app.services import enqueue_pending_reviews, ensure_review_statuses, review_moderation_queue
+from services.city_index import city_index, start_city_index_updates, stop_city_index_updates
+from services.gpt_services import cleanup_expired_files, cleanup_gpt_image_cache
+from services.email_outbox import poll_email_outbox, cleanup_sent_emails, start_email_dispatcher, \
+    stop_email_dispatcher
+from services.job_runs import cleanup_job_runs
+from services.leader_election import leader, leader_only
+from services.moderation_cache import cleanup_moderation_verdicts
+from services.pre_moderation import cleanup_rejected_images
+from services.startup import startup_state
+from services.street_search import backfill_street_search_keys
+from services.worker_batch_moderation import worker_batch_moderation
 from services.worker_checking_listing_relevance import worker_checking_listing_relevance
-from services.worker_moderate_listings import worker_moderate_listings
+from services.worker_moderate_listings import enqueue_pending_moderation, poll_moderation_queue, start_moderation_worker, \
+    stop_moderation_worker
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
+    leader.start()
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(worker_checking_listing_relevance, CronTrigger(hour=12, minute=0))
-    scheduler.add_job(worker_moderate_listings, IntervalTrigger(seconds=2))
+    # Задачі над усією базою виконує лише лідер; черги, що розбираються через SKIP LOCKED, — усі процеси
+    scheduler.add_job(leader_only(worker_checking_listing_relevance), CronTrigger(hour=12, minute=0))
+    scheduler.add_job(leader_only(enqueue_pending_moderation), IntervalTrigger(seconds=config.MODERATION_FALLBACK_POLL_INTERVAL))
+    scheduler.add_job(leader_only(worker_batch_moderation), IntervalTrigger(seconds=config.MODERATION_BATCH_POLL_INTERVAL))
+    scheduler.add_job(leader_only(enqueue_pending_reviews), IntervalTrigger(seconds=config.REVIEW_MODERATION_SWEEP_INTERVAL))
+    scheduler.add_job(leader_only(cleanup_expired_files), CronTrigger(hour=3, minute=0))
+    # Кеш підготовлених фото лежить на локальному диску, тому прибирається в кожному процесі
+    scheduler.add_job(cleanup_gpt_image_cache, CronTrigger(hour=3, minute=15))
+    scheduler.add_job(poll_email_outbox, IntervalTrigger(seconds=config.EMAIL_OUTBOX_POLL_INTERVAL))
+    scheduler.add_job(poll_moderation_queue, IntervalTrigger(seconds=config.MODERATION_FALLBACK_POLL_INTERVAL))
+    scheduler.add_job(leader_only(cleanup_sent_emails), CronTrigger(hour=3, minute=30))
+    scheduler.add_job(leader_only(cleanup_job_runs), CronTrigger(hour=4, minute=0))
+    scheduler.add_job(leader_only(cleanup_moderation_verdicts), CronTrigger(hour=4, minute=15))
+    scheduler.add_job(leader_only(cleanup_rejected_images), CronTrigger(hour=4, minute=30))
+    # Індекс міст живе в пам'яті кожного процесу, тому оновлюється скрізь: одразу за NOTIFY від імпорту
+    # довідника, а за розкладом — на випадок змін напряму в базі
+    scheduler.add_job(city_index.refresh, IntervalTrigger(seconds=config.CITY_INDEX_REFRESH_INTERVAL))
     scheduler.start()
-    await worker_checking_listing_relevance()
+    start_email_dispatcher()
+    start_moderation_worker()
+    start_city_index_updates()
+    review_moderation_queue.start()
+
+    catch_up_jobs = {
+        "city_index": city_index.refresh,
+        # Статуси потрібні до першого відгуку, тому не чекаємо на обрання лідера
+        "review_statuses": ensure_review_statuses,
+        "enqueue_pending_reviews": leader_only(enqueue_pending_reviews),
+        "worker_checking_listing_relevance": leader_only(worker_checking_listing_relevance),
+        "backfill_street_search_keys": leader_only(backfill_street_search_keys),
+    }
+    for name, job in catch_up_jobs.items():
+        if config.DEFERRED_STARTUP:
+            startup_state.run_in_background(name, job)
+        else:
+            await job()
+    startup_state.ready = True
     yield
+    await startup_state.stop()
+    scheduler.shutdown(wait=False)
+    await leader.stop()
+    await stop_moderation_worker()
+    await stop_city_index_updates()
+    await review_moderation_queue.stop()
+    await stop_email_dispatcher()
 
 
 app = FastAPI(
@@ -51,6 +107,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Інакше браузер не дасть фронтенду прочитати кількість вулиць і версію для If-None-Match
+    expose_headers=["X-Total-Count", "ETag"],
 )
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -79,4 +137,5 @@ api_router.include_router(admin_app.router)
 api_router.include_router(location_app.router)
 api_router.include_router(listing_status_app.router)
 app.include_router(api_router)
+app.include_router(health_app.router)
 app.include_router(secured_router)
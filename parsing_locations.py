@@ -3,6 +3,9 @@ import psycopg2
 from transliterate import translit
 import re
 
+from db.models import LOCATION_DATASET_CHANNEL
+from utils import street_search_key, street_search_key_latin
+
 # Відображення типів вулиць
 street_type_map = {
     'вул.': 'Street', 'вул': 'Street',
@@ -116,11 +119,14 @@ for record in root.findall('.//RECORD'):
     # Додати вулиці
     if street_name_ukr:
         street_name_eng = translate_street_name(street_name_ukr)
-        batched_streets.append((street_name_ukr, street_name_eng, city_id))
+        batched_streets.append((
+            street_name_ukr, street_name_eng, street_search_key(street_name_ukr),
+            street_search_key_latin(street_name_ukr), city_id
+        ))
 
         if len(batched_streets) >= batch_size:
             cur.executemany(
-                "INSERT INTO streets (name_ukr, name_eng, city_id) VALUES (%s, %s, %s)",
+                "INSERT INTO streets (name_ukr, name_eng, search_key, search_key_latin, city_id) VALUES (%s, %s, %s, %s, %s)",
                 batched_streets
             )
             print(f"📦 Inserted batch of {len(batched_streets)} streets")
@@ -129,11 +135,13 @@ for record in root.findall('.//RECORD'):
 # Вставити залишок
 if batched_streets:
     cur.executemany(
-        "INSERT INTO streets (name_ukr, name_eng, city_id) VALUES (%s, %s, %s)",
+        "INSERT INTO streets (name_ukr, name_eng, search_key, search_key_latin, city_id) VALUES (%s, %s, %s, %s, %s)",
         batched_streets
     )
     print(f"📦 Inserted final batch of {len(batched_streets)} streets")
 
+# Запущені процеси застосунку перебудують індекс міст і ETag списків вулиць одразу після commit
+cur.execute("SELECT pg_notify(%s, '')", (LOCATION_DATASET_CHANNEL,))
 conn.commit()
 cur.close()
 conn.close()
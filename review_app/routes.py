@@ -3,16 +3,15 @@ from sqlalchemy.orm import joinedload
 from sqlalchemy import select
 from starlette import status
 
-from auth_app import get_current_active_user
+from auth_app import get_current_active_user, get_optional_user
 from auth_app.schemes import UserResponse
 from db.models import ReviewModel, ReviewStatusModel, ReviewTagModel, ReviewTagReviewModel, UserModel
-from db.services import UserService
 from db.services.main_services import ReviewService
-from services.gpt_services import text_and_image_verification
-from .schemes import ReviewPayload, ReviewResponse, ReviewDetailResponse, OwnerResponse
+from .schemes import ReviewPayload, ReviewResponse, ReviewDetailResponse, OwnerResponse, PENDING_REVIEW_STATUS_ID, \
+    PUBLISHED_REVIEW_STATUS_ID
 from typing import List, Optional
 
-from .services import verify_review_description
+from .services import review_moderation_queue
 
 router = APIRouter(
     prefix="/reviews",
@@ -23,7 +22,8 @@ router = APIRouter(
 @router.get("", response_model=List[ReviewResponse])
 async def get_all_reviews(
         user_id: Optional[int] = Query(None),
-        owner_id: Optional[int] = Query(None)
+        owner_id: Optional[int] = Query(None),
+        current_user: Optional[UserModel] = Depends(get_optional_user)
 ):
     query = (
         select(ReviewModel)
@@ -37,6 +37,9 @@ async def get_all_reviews(
 
     if user_id is not None:
         query = query.where(ReviewModel.user_id == user_id)
+    # Автор бачить і свої відгуки, що ще на модерації або відхилені, решта — лише опубліковані
+    if user_id is None or not current_user or current_user.id != user_id:
+        query = query.where(ReviewModel.review_status_id == PUBLISHED_REVIEW_STATUS_ID)
     if owner_id is not None:
         query = query.where(ReviewModel.owner_id == owner_id)
 
@@ -51,6 +54,7 @@ async def get_all_reviews(
             rating=review.rating,
             description=review.description,
             review_status_id=review.review_status_id,
+            moderation_reason=review.moderation_reason,
             created_at=review.created_at,
             review_status=review.review_status.name if review.review_status else None,
             tags=[tag.name for tag in review.tags],
@@ -80,7 +84,7 @@ async def get_all_reviews(
 
 
 @router.get("/{id}", response_model=ReviewResponse)
-async def get_review_by_id(id: int):
+async def get_review_by_id(id: int, current_user: Optional[UserModel] = Depends(get_optional_user)):
     query = (
         select(ReviewModel)
             .options(
@@ -95,6 +99,9 @@ async def get_review_by_id(id: int):
 
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
+    # Неопублікований відгук разом з причиною відхилення бачить лише автор
+    if review.review_status_id != PUBLISHED_REVIEW_STATUS_ID and (not current_user or current_user.id != review.user_id):
+        raise HTTPException(status_code=404, detail="Review not found")
 
     return ReviewResponse(
         id=review.id,
@@ -103,6 +110,7 @@ async def get_review_by_id(id: int):
         rating=review.rating,
         description=review.description,
         review_status_id=review.review_status_id,
+        moderation_reason=review.moderation_reason,
         created_at=review.created_at,
         review_status=review.review_status.name if review.review_status else None,
         tags=[tag.name for tag in review.tags]
@@ -131,25 +139,20 @@ async def create_review(
             detail="Review from this user to this owner already exists"
         )
 
-    await verify_review_description(payload.description)
-
     async with ReviewService.session_maker() as session:
         review = ReviewModel(
             user_id=payload.user_id,
             owner_id=payload.owner_id,
             rating=payload.rating,
             description=payload.description,
-            review_status_id=2,
+            review_status_id=PENDING_REVIEW_STATUS_ID,
         )
         session.add(review)
         await session.flush()
         await session.commit()
 
     await ReviewService.add_tags_to_review(review.id, payload.tag_ids)
-
-    tag_count = await ReviewService.count_total_tags_for_owner(payload.owner_id)
-    if tag_count > 5:
-        await UserService.block_user(payload.owner_id)
+    review_moderation_queue.put(review.id)
 
     query = (
         select(ReviewModel)
@@ -181,12 +184,13 @@ async def update_review(
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
 
-    await verify_review_description(payload.description)
-
     for key, value in payload.model_dump().items():
         setattr(review, key, value)
+    review.review_status_id = PENDING_REVIEW_STATUS_ID
+    review.moderation_reason = None
 
     updated_review = await ReviewService.save(review)
+    review_moderation_queue.put(review.id)
     return updated_review
 
 
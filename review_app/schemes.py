@@ -3,6 +3,7 @@ from pydantic import BaseModel, condecimal
 from datetime import datetime
 
 from auth_app.schemes import UserResponse
+from db.models import PUBLISHED_REVIEW_STATUS_ID, PENDING_REVIEW_STATUS_ID, REJECTED_REVIEW_STATUS_ID
 
 
 class ReviewPayload(BaseModel):
@@ -30,6 +31,7 @@ class ReviewResponse(BaseModel):
     rating: condecimal(max_digits=2, decimal_places=1)
     description: Optional[str] = None
     review_status_id: int
+    moderation_reason: Optional[str] = None
     created_at: datetime
     tags: List[str]
     owner: Optional[OwnerResponse] = None
@@ -1,18 +1,69 @@
+import datetime
+
+from config import config
+from db.services.main_services import ReviewService, ReviewStatusService, UserService
+from services.background_queue import BackgroundQueue
 from services.gpt_services import text_and_image_verification
-from fastapi import HTTPException, status
+from services.moderation_cache import cached_check, text_fingerprint, REVIEW_CHECK, Verdict, LOCAL_STAGE
+from services.pre_moderation import pre_moderate
+from .schemes import PENDING_REVIEW_STATUS_ID, PUBLISHED_REVIEW_STATUS_ID, REJECTED_REVIEW_STATUS_ID
+
+
+async def verify_review_description(description) -> Verdict:
+    if not description:
+        return Verdict(False, "пустий", LOCAL_STAGE)
 
+    async def verify():
+        local_verdict = await pre_moderate(description)
+        if local_verdict:
+            return local_verdict
 
-async def verify_review_description(description):
-    if description:
         verif_result = await text_and_image_verification(f"Відгук про людину:\n{description}")
-        if not verif_result.is_ok:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Ваш відгук не пройшов модерацію. Причина: {verif_result.reason_details or '-'}"
-            )
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Ваш відгук не пройшов модерацію. Причина: пустий"
-        )
-    return True
+        return Verdict(verif_result.is_ok, verif_result.reason_details)
+
+    return await cached_check(REVIEW_CHECK, text_fingerprint(description), verify)
+
+
+async def moderate_review(review_id: int):
+    review = await ReviewService.select_one(id=review_id)
+    if not review or review.review_status_id != PENDING_REVIEW_STATUS_ID:
+        return
+
+    is_ok, reason, _ = await verify_review_description(review.description)
+    applied = await ReviewService.apply_moderation_result(
+        review.id,
+        review.description,
+        PUBLISHED_REVIEW_STATUS_ID if is_ok else REJECTED_REVIEW_STATUS_ID,
+        None if is_ok else f"Ваш відгук не пройшов модерацію. Причина: {reason or '-'}"
+    )
+
+    if applied and is_ok:
+        tag_count = await ReviewService.count_total_tags_for_owner(review.owner_id)
+        if tag_count > 5:
+            await UserService.block_user(review.owner_id)
+
+
+review_moderation_queue = BackgroundQueue(
+    "review_moderation",
+    moderate_review,
+    concurrency=config.REVIEW_MODERATION_CONCURRENCY,
+    max_attempts=config.REVIEW_MODERATION_MAX_ATTEMPTS,
+)
+
+
+async def enqueue_pending_reviews():
+    # Черга живе в пам'яті процесу: відгуки, втрачені під час перезапуску чи падіння будь-якого процесу
+    # або з вичерпаними спробами, підхоплює періодичний прохід лідера
+    for review in await ReviewService.select(review_status_id=PENDING_REVIEW_STATUS_ID):
+        review_moderation_queue.put(review.id)
+
+
+REVIEW_STATUSES = {PENDING_REVIEW_STATUS_ID: "На модерації", REJECTED_REVIEW_STATUS_ID: "Відхилений"}
+
+
+async def ensure_review_statuses():
+    missing = await ReviewStatusService.ensure(REVIEW_STATUSES)
+    if missing:
+        # Назва вже зайнята статусом з іншим id — потрібне ручне виправлення довідника
+        print(f"[{datetime.datetime.now()}] review_status: не вдалося створити статуси {missing}")
+
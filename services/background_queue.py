@@ -0,0 +1,76 @@
+import asyncio
+import datetime
+from typing import Any, Awaitable, Callable
+
+from services.metrics import metrics
+from utils import backoff_delay
+
+
+class BackgroundQueue:
+    """
+    Черга фонових задач у межах процесу з обмеженою кількістю одночасних обробників.
+    Невдалі задачі повертаються в чергу з експоненційною затримкою.
+    Елемент, що вже чекає в черзі, вдруге не додається.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            handler: Callable[[Any], Awaitable[None]],
+            concurrency: int,
+            max_attempts: int = 5,
+            retry_base_delay: float = 5,
+            retry_max_delay: float = 300,
+    ):
+        self.name = name
+        self._handler = handler
+        self._concurrency = concurrency
+        self._max_attempts = max_attempts
+        self._retry_base_delay = retry_base_delay
+        self._retry_max_delay = retry_max_delay
+        self._queue = asyncio.Queue()
+        self._queued = set()
+        self._workers = []
+
+    def put(self, item, attempt: int = 1):
+        if item in self._queued:
+            return
+        self._queued.add(item)
+        self._queue.put_nowait((item, attempt))
+        metrics.set_gauge("background_queue_size", self._queue.qsize(), queue=self.name)
+
+    def start(self):
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def join(self):
+        await self._queue.join()
+
+    async def _worker(self):
+        while True:
+            item, attempt = await self._queue.get()
+            # Зміна під час обробки знову додає елемент у чергу, і він перевіряється ще раз
+            self._queued.discard(item)
+            metrics.set_gauge("background_queue_size", self._queue.qsize(), queue=self.name)
+            try:
+                await self._handler(item)
+                metrics.inc("background_queue_items_total", queue=self.name, result="processed")
+            except Exception as e:
+                print(f"[{datetime.datetime.now()}] {self.name}: {item} failed (attempt {attempt}): {e!r}")
+                if attempt < self._max_attempts:
+                    metrics.inc("background_queue_items_total", queue=self.name, result="retried")
+                    asyncio.get_running_loop().call_later(
+                        backoff_delay(attempt, self._retry_base_delay, self._retry_max_delay),
+                        self.put, item, attempt + 1
+                    )
+                else:
+                    metrics.inc("background_queue_items_total", queue=self.name, result="failed")
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,204 @@
+import asyncio
+import datetime
+import heapq
+import re
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import NamedTuple, Optional
+
+from config import config
+from db.models import LOCATION_DATASET_CHANNEL
+from db.services.main_services import CityService
+from services.metrics import metrics
+from services.pg_notifications import WorkerWakeup, PgListener
+from utils import fold_search_text, search_key_variants, transliterate
+
+UKRAINIAN_ALPHABET = "абвгґдеєжзиіїйклмнопрстуфхцчшщьюя"
+# Літери українського алфавіту переводяться в послідовні символи, щоб порядок рядків
+# збігався з алфавітним (у Unicode є, і, ї, ґ стоять після я)
+ALPHABET_ORDER = str.maketrans({letter: chr(0x0430 + index) for index, letter in enumerate(UKRAINIAN_ALPHABET)})
+# Символ, більший за будь-яку літеру: верхня межа діапазону ключів із заданим префіксом
+PREFIX_END = "\U0010ffff"
+WORD = re.compile(r"[^\W_]+")
+
+
+def sort_key(name: str) -> str:
+    return fold_search_text(name).translate(ALPHABET_ORDER)
+
+
+def trigrams(text: str) -> set[str]:
+    """Триграми як у pg_trgm: кожне слово доповнюється двома пробілами спереду та одним ззаду."""
+    result = set()
+    for word in WORD.findall(text):
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class City(NamedTuple):
+    id: int
+    name: str
+    name_eng: Optional[str]
+    oblast: Optional[str]
+
+    def as_dict(self) -> dict:
+        return {"id": self.id, "name": self.name, "oblast": self.oblast}
+
+
+class CityIndex:
+    """
+    Довідник міст у пам'яті процесу для автодоповнення.
+    Міста відсортовані за українською назвою, а ключі пошуку (українська назва, англійська назва
+    та офіційна транслітерація в нижньому регістрі) — окремим відсортованим списком,
+    тож пошук за префіксом будь-якою з них — це два bisect.
+    Для назв з помилками є інвертований індекс триграм ключів: схожість рахується лише
+    для ключів, що мають хоча б одну спільну з запитом триграму.
+    Оновлюється цілком: новий індекс будується поруч і підміняє старий без проміжних await.
+    """
+
+    def __init__(self):
+        self._cities = []
+        self._keys = []
+        self._positions = []
+        self._trigrams = {}
+        self._trigram_counts = array("H")
+        self._by_name = {}
+        self._ids = frozenset()
+        self.loaded_at = None
+        # Версія довідника міст і вулиць у базі на момент завантаження; з неї будуються ETag
+        self.dataset_version = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def __len__(self):
+        return len(self._cities)
+
+    @staticmethod
+    def prepare(rows) -> dict:
+        """Будує всі структури індексу; повертає їх, не змінюючи поточний індекс."""
+        cities = sorted((City(*row) for row in rows), key=lambda city: (sort_key(city.name), sort_key(city.oblast or "")))
+
+        entries = []
+        for position, city in enumerate(cities):
+            name = fold_search_text(city.name)
+            keys = {name, transliterate(name)}
+            if city.name_eng:
+                keys.add(fold_search_text(city.name_eng).replace("'", ""))
+            entries.extend((key, position) for key in keys)
+        entries.sort()
+
+        postings = defaultdict(list)
+        trigram_counts = array("H")
+        for entry, (key, _) in enumerate(entries):
+            key_trigrams = trigrams(key)
+            trigram_counts.append(len(key_trigrams))
+            for trigram in key_trigrams:
+                postings[trigram].append(entry)
+
+        return {
+            "_cities": cities,
+            "_by_name": {(city.name, city.oblast): position for position, city in enumerate(cities)},
+            "_ids": frozenset(city.id for city in cities),
+            "_keys": [key for key, _ in entries],
+            "_positions": [position for _, position in entries],
+            "_trigrams": {trigram: array("I", items) for trigram, items in postings.items()},
+            "_trigram_counts": trigram_counts,
+        }
+
+    def build(self, rows):
+        vars(self).update(self.prepare(rows))
+        self.loaded_at = datetime.datetime.now(datetime.timezone.utc)
+
+    async def refresh(self):
+        started = time.perf_counter()
+        rows = await CityService.select_for_index()
+        # Побудова для десятків тисяч міст займає до секунди — поза event loop,
+        # а підміна відбувається вже в ньому, тож запити не бачать напівоновлений індекс
+        dataset_version = await CityService.dataset_version()
+        state = await asyncio.to_thread(self.prepare, rows)
+        vars(self).update(state)
+        self.dataset_version = dataset_version
+        self.loaded_at = datetime.datetime.now(datetime.timezone.utc)
+        metrics.observe("city_index_refresh_seconds", time.perf_counter() - started)
+        metrics.set_gauge("city_index_size", len(self._cities))
+
+    def has_city(self, city_id: int) -> bool:
+        return city_id in self._ids
+
+    def select_by_names(self, items: list[dict]) -> list[dict]:
+        """Міста зі списку {"name", "oblast"} (TOP_CITIES_FULL) в алфавітному порядку."""
+        keys = ((item["name"], item["oblast"]) for item in items)
+        positions = sorted(self._by_name[key] for key in keys if key in self._by_name)
+        return [self._cities[position].as_dict() for position in positions]
+
+    def prefix(self, key: str, limit: int) -> list[int]:
+        start = bisect_left(self._keys, key)
+        end = bisect_left(self._keys, key + PREFIX_END, start)
+        # Місто може збігтися кількома назвами — рахується один раз
+        return heapq.nsmallest(limit, set(self._positions[start:end]))
+
+    def search(self, q: str, limit: int = 100) -> list[dict]:
+        """
+        Спершу міста, назва яких починається з q, за абеткою; для запитів від
+        LOCATION_FUZZY_MIN_LENGTH символів решту місць займають схожі назви, найближчі першими.
+        Якщо за самим запитом нічого не знайшлося, пробується той самий набір клавіш
+        в іншій розкладці (utils.search_key_variants).
+        """
+        variants = search_key_variants(q)
+        if not variants:
+            return []
+        for rank, variant in enumerate(variants):
+            positions = self.prefix(variant, limit)
+            if positions:
+                break
+        else:
+            rank = 0
+
+        key = variants[0]
+        if rank == 0 and len(key) >= config.LOCATION_FUZZY_MIN_LENGTH and len(positions) < limit:
+            started = time.perf_counter()
+            positions += self.fuzzy(key, config.LOCATION_FUZZY_THRESHOLD, limit - len(positions), set(positions))
+            metrics.observe("location_fuzzy_search_seconds", time.perf_counter() - started, kind="city")
+        return [self._cities[position].as_dict() for position in positions]
+
+    def fuzzy(self, key: str, threshold: float, limit: int, exclude: set = frozenset()) -> list[int]:
+        """
+        Позиції міст, у назвах яких знайшлася щонайменше частка threshold триграм запиту
+        (аналог word_similarity з pg_trgm, тож недописане слово з помилкою теж знаходиться).
+        За рівної частки вище назва, ближча до запиту за довжиною (similarity з pg_trgm).
+        """
+        query_trigrams = trigrams(key)
+        if not query_trigrams:
+            return []
+        common = Counter()
+        for trigram in query_trigrams:
+            common.update(self._trigrams.get(trigram, ()))
+
+        needed = threshold * len(query_trigrams)
+        scores = {}
+        for entry, count in common.items():
+            position = self._positions[entry]
+            if count < needed or position in exclude:
+                continue
+            score = (count, count / (len(query_trigrams) + self._trigram_counts[entry] - count))
+            if score > scores.get(position, (0, 0)):
+                scores[position] = score
+        return heapq.nsmallest(limit, scores, key=lambda position: (-scores[position][0], -scores[position][1], position))
+
+city_index = CityIndex()
+city_index_wakeup = WorkerWakeup("city_index_refresh", city_index.refresh)
+city_index_listener = PgListener(LOCATION_DATASET_CHANNEL, city_index_wakeup.wake)
+
+
+def start_city_index_updates():
+    city_index_wakeup.start()
+    city_index_listener.start()
+
+
+async def stop_city_index_updates():
+    await city_index_listener.stop()
+    await city_index_wakeup.stop()
@@ -0,0 +1,80 @@
+import asyncio
+import datetime
+
+from config import config
+from db.models import EmailOutboxModel, EMAIL_OUTBOX_CHANNEL
+from db.services.main_services import EmailOutboxService
+from services.mailing import smtp_pool, build_message
+from services.job_runs import track_job_run
+from services.metrics import metrics
+from services.pg_notifications import WorkerWakeup, PgListener
+from utils import backoff_delay, datetime_now
+
+
+def outbox_email(dedupe_key: str, to_email: str, subject: str, body: str) -> dict:
+    return {"dedupe_key": dedupe_key, "to_email": to_email, "subject": subject, "body": body}
+
+
+async def send_outbox_email(email: EmailOutboxModel) -> bool:
+    try:
+        await smtp_pool.send(build_message(email.to_email, email.subject, email.body))
+        return True
+    except Exception as e:
+        print(f"[{datetime.datetime.now()}] лист {email.dedupe_key} не надіслано (спроба {email.attempts}): {e!r}")
+        await EmailOutboxService.fail(
+            email,
+            repr(e),
+            config.EMAIL_MAX_ATTEMPTS,
+            backoff_delay(email.attempts, config.EMAIL_OUTBOX_RETRY_BASE_DELAY, config.EMAIL_OUTBOX_RETRY_MAX_DELAY)
+        )
+        return False
+
+
+async def dispatch_email_outbox() -> bool:
+    """
+    Відправляє одну порцію листів з outbox через пул SMTP-з'єднань.
+    Невдалі листи повертаються в outbox з експоненційною затримкою, після EMAIL_MAX_ATTEMPTS — у dead.
+    Повертає True, якщо порція була повною і в outbox можуть залишатися листи.
+    """
+    async with track_job_run("dispatch_email_outbox", record_empty=False) as job_run:
+        emails = await EmailOutboxService.claim(config.EMAIL_OUTBOX_BATCH_SIZE, config.EMAIL_OUTBOX_VISIBILITY_TIMEOUT)
+        if not emails:
+            return False
+
+        results = await asyncio.gather(*(send_outbox_email(email) for email in emails))
+        sent_ids = [email.id for email, sent in zip(emails, results) if sent]
+        await EmailOutboxService.mark_sent(sent_ids)
+        job_run.seen = len(emails)
+        job_run.processed = len(sent_ids)
+        job_run.failed = len(emails) - len(sent_ids)
+
+    metrics.inc("email_outbox_total", len(sent_ids), result="sent")
+    metrics.inc("email_outbox_total", len(emails) - len(sent_ids), result="failed")
+    print(f"[{datetime.datetime.now()}] email outbox: надіслано {len(sent_ids)}/{len(emails)}")
+    return len(emails) == config.EMAIL_OUTBOX_BATCH_SIZE
+
+
+email_outbox_wakeup = WorkerWakeup("dispatch_email_outbox", dispatch_email_outbox)
+email_outbox_listener = PgListener(EMAIL_OUTBOX_CHANNEL, email_outbox_wakeup.wake)
+
+
+async def poll_email_outbox():
+    # Страхує від втраченого NOTIFY і підхоплює листи, відкладені після невдалої спроби
+    email_outbox_wakeup.wake()
+
+
+async def cleanup_sent_emails():
+    cutoff = datetime_now() - datetime.timedelta(days=config.EMAIL_OUTBOX_RETENTION_DAYS)
+    deleted = await EmailOutboxService.delete_sent_before(cutoff)
+    print(f"[{datetime.datetime.now()}] email outbox: видалено {deleted} надісланих листів")
+
+
+def start_email_dispatcher():
+    email_outbox_wakeup.start()
+    email_outbox_listener.start()
+
+
+async def stop_email_dispatcher():
+    await email_outbox_listener.stop()
+    await email_outbox_wakeup.stop()
+    await smtp_pool.close()
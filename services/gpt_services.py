@@ -1,17 +1,177 @@
 import asyncio
+import base64
+import datetime
 import json
+import mimetypes
+import os
+from typing import Callable, NamedTuple, Optional
 
 import openai
+from openai.types.chat import ChatCompletion
 from pydantic import BaseModel
 
 from config import config
+from db.models import OpenAIFileModel
+from db.services.main_services import OpenAIFileService
+from services.gpt_tracing import current_trace, trace_gpt_call
+from services.image_preprocessing import prepare_image_for_gpt, file_sha256, cleanup_image_cache
+from services.metrics import metrics
 
 client = openai.AsyncOpenAI(
     api_key=config.API_KEY.get_secret_value(),
-    organization=config.ORGANISATION_ID
+    organization=config.ORGANISATION_ID,
+    base_url=config.OPENAI_BASE_URL
 )
 
 
+async def upload_file(path: str, max_side: int = None) -> str:
+    with current_trace().phase("upload"):
+        return await _upload_file(path, max_side)
+
+
+async def _upload_file(path: str, max_side: int = None) -> str:
+    # Декодування і перекодування фото займає десятки мілісекунд — поза event loop
+    prepared_path = await asyncio.to_thread(prepare_image_for_gpt, path, max_side)
+    content_hash = await asyncio.to_thread(file_sha256, prepared_path)
+
+    file_id = await OpenAIFileService.get_file_id(content_hash)
+    if file_id:
+        metrics.inc("gpt_file_cache_total", result="hit")
+        return file_id
+
+    metrics.inc("gpt_file_cache_total", result="miss")
+    with open(prepared_path, "rb") as f:
+        uploaded_file = await client.files.create(
+            file=f,
+            purpose="assistants"
+        )
+
+    await OpenAIFileService.remember(content_hash, uploaded_file.id, config.GPT_FILE_CACHE_TTL)
+    return uploaded_file.id
+
+
+async def delete_remote_file(file_id: str):
+    try:
+        await client.files.delete(file_id)
+    except openai.NotFoundError:
+        pass
+
+
+async def cleanup_expired_files(batch_size: int = 100):
+    print(f"[{datetime.datetime.now()}] cleanup_expired_files запущений")
+    last_id = 0
+    while True:
+        files = await OpenAIFileService.select_expired(batch_size, after_id=last_id)
+        if not files:
+            return
+        last_id = files[-1].id
+
+        deleted_ids = []
+        for file in files:
+            try:
+                await delete_remote_file(file.file_id)
+            except openai.OpenAIError as e:
+                # Запис лишається, і видалення повториться під час наступного запуску
+                print(f"Не вдалося видалити файл {file.file_id} з OpenAI: {e!r}")
+                continue
+            deleted_ids.append(file.id)
+        if deleted_ids:
+            await OpenAIFileService.delete(OpenAIFileModel.id.in_(deleted_ids))
+
+
+async def cleanup_gpt_image_cache():
+    removed = await asyncio.to_thread(cleanup_image_cache, config.GPT_IMAGE_CACHE_TTL)
+    print(f"[{datetime.datetime.now()}] cleanup_gpt_image_cache: видалено {removed} файлів")
+
+
+RUN_FAILED_STATUSES = {"failed", "expired", "cancelled", "incomplete", "requires_action"}
+
+
+class GptRunError(Exception):
+    def __init__(self, run_id: str, status: str, details: str = ""):
+        self.run_id = run_id
+        self.status = status
+        self.details = details
+        super().__init__(f"GPT run {run_id} finished with status '{status}' {details}".strip())
+
+
+class GptRunTimeoutError(GptRunError):
+    pass
+
+
+async def run_assistant(thread_id: str, assistant_id: str):
+    """
+    Запускає асистента на треді і чекає завершення run з експоненційним backoff.
+    Якщо run не завершився за GPT_RUN_TIMEOUT секунд — скасовує його.
+    """
+    loop = asyncio.get_running_loop()
+    trace = current_trace()
+    metrics.add_gauge("gpt_runs_in_flight", 1)
+    run = None
+    # Час у черзі OpenAI (status=queued) рахуємо окремо від часу виконання run
+    queued = True
+    phase_started = None
+    try:
+        with trace.phase("run_create"):
+            run = await client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=assistant_id
+            )
+        phase_started = loop.time()
+        deadline = phase_started + config.GPT_RUN_TIMEOUT
+        delay = config.GPT_RUN_POLL_INITIAL_DELAY
+
+        while run.status != "completed":
+            if run.status in RUN_FAILED_STATUSES:
+                metrics.inc("gpt_runs_total", result=run.status)
+                last_error = getattr(run, "last_error", None)
+                raise GptRunError(run.id, run.status, getattr(last_error, "message", "") or "")
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                metrics.inc("gpt_runs_total", result="timeout")
+                try:
+                    await client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+                except openai.OpenAIError as e:
+                    print(f"Не вдалося скасувати GPT run {run.id}: {e!r}")
+                raise GptRunTimeoutError(run.id, run.status, f"after {config.GPT_RUN_TIMEOUT}s")
+
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 1.5, config.GPT_RUN_POLL_MAX_DELAY)
+            run = await client.beta.threads.runs.retrieve(
+                thread_id=thread_id,
+                run_id=run.id
+            )
+            trace.polls += 1
+            if queued and run.status != "queued":
+                trace.add_phase("run_queue", loop.time() - phase_started)
+                phase_started = loop.time()
+                queued = False
+
+        metrics.inc("gpt_runs_total", result="completed")
+        return run
+    finally:
+        metrics.add_gauge("gpt_runs_in_flight", -1)
+        if phase_started is not None:
+            trace.add_phase("run_queue" if queued else "run_poll", loop.time() - phase_started)
+        if run is not None:
+            trace.record_run(run)
+
+
+async def get_assistant_result(thread_id: str, result_cls):
+    with current_trace().phase("messages_list"):
+        messages = await client.beta.threads.messages.list(thread_id=thread_id)
+
+    for msg in reversed(messages.data):
+        if msg.role == "assistant":
+            result_text = msg.content[0].text.value
+            return result_cls(**json.loads(
+                result_text.replace("json", "").replace("`", "")
+            ))
+
+    return result_cls()
+
+
 class IdVerificationGptResult(BaseModel):
     image_quality: str = 'low'
     valid_data: bool = False
@@ -26,6 +186,8 @@ class IdVerificationGptResult(BaseModel):
 class TextVerificationGptResult(BaseModel):
     is_ok: bool = False
     reason_details: str = ''
+    # Відмова саме через фото (а не лише текст); тільки такі фото потрапляють у список відхилених
+    images_rejected: bool = False
 
 
 class OwnershipVerificationGptResult(BaseModel):
@@ -34,62 +196,26 @@ class OwnershipVerificationGptResult(BaseModel):
     error_details: str = ''
 
 
-async def passport_documents_verification(document_photos_paths: list[str]) -> IdVerificationGptResult:
-    openai_document_ids = []
-    for document_photo_path in document_photos_paths:
-        with open(document_photo_path, "rb") as f:
-            image_file = await client.files.create(
-                file=f,
-                purpose="assistants"
-            )
-            openai_document_ids.append(image_file.id)
+class GptCheck(NamedTuple):
+    assistant_id: str
+    text: str
+    file_paths: list[str]
+    result_cls: type
+    # Найбільша сторона фото після зменшення; None — GPT_IMAGE_MAX_SIDE
+    image_max_side: Optional[int] = None
 
-    thread = await client.beta.threads.create()
 
-    message_contents = [
-        {
-            "type": "text",
-            "text": "Validate this passport and return json"
-        }
-    ]
-    message_contents += [{
-        "type": "image_file",
-        "image_file": {"file_id": item}
-    } for item in openai_document_ids]
-
-    await client.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content=message_contents
+def passport_documents_check(document_photos_paths: list[str]) -> GptCheck:
+    return GptCheck(
+        config.VERIFICATION_ASSISTANT_ID,
+        "Validate this passport and return json",
+        document_photos_paths,
+        IdVerificationGptResult,
+        config.GPT_DOCUMENT_IMAGE_MAX_SIDE
     )
 
-    run = await client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=config.VERIFICATION_ASSISTANT_ID
-    )
-
-    while True:
-        run_status = await client.beta.threads.runs.retrieve(
-            thread_id=thread.id,
-            run_id=run.id
-        )
-        if run_status.status == "completed":
-            break
-        await asyncio.sleep(0.2)
-
-    messages = await client.beta.threads.messages.list(thread_id=thread.id)
-
-    for msg in reversed(messages.data):
-        if msg.role == "assistant":
-            result_text = msg.content[0].text.value
-            return IdVerificationGptResult(**json.loads(
-                result_text.replace("json", "").replace("`", "")
-            ))
-
-    return IdVerificationGptResult()
-
 
-async def ownership_documents_verification(
+def ownership_documents_check(
         owner_first_name: str,
         owner_second_name: str,
         owner_patronymic: str,
@@ -97,122 +223,207 @@ async def ownership_documents_verification(
         document_ownership_path: str,
         city: str,
         street: str,
-) -> OwnershipVerificationGptResult:
+) -> GptCheck:
+    return GptCheck(
+        config.OWNERSHIP_VERIFICATION_ASSISTANT_ID,
+        f"{owner_first_name} {owner_second_name} {owner_patronymic}\n"
+        f"City: {city}, {street}\n",
+        [document_ownership_path],
+        OwnershipVerificationGptResult,
+        config.GPT_DOCUMENT_IMAGE_MAX_SIDE
+    )
+
+
+def text_and_image_check(text: str, image_paths=None) -> GptCheck:
+    return GptCheck(
+        config.MODERATOR_ASSISTANT_ID,
+        f"Input text: {text}",
+        image_paths or [],
+        TextVerificationGptResult
+    )
+
+
+async def assistant_check(check: GptCheck):
+    """Перевірка через Assistants API: завантаження файлів, тред, повідомлення, run і читання відповіді."""
     openai_document_ids = []
-    with open(document_ownership_path, "rb") as f:
-        # try:
-        image_file = await client.files.create(
-            file=f,
-            purpose="assistants"
-        )
-        # except Exception as e:
-        #     return OwnershipVerificationGptResult(error_details=str(e))
-        openai_document_ids.append(image_file.id)
+    for file_path in check.file_paths:
+        openai_document_ids.append(await upload_file(file_path, check.image_max_side))
 
-    thread = await client.beta.threads.create()
-    # thread = await client.beta.threads.retrieve("thread_JA6FSQomLZ06ZhtVRHk8kZxT")
+    with current_trace().phase("thread_create"):
+        thread = await client.beta.threads.create()
 
-    message_contents = []
-    message_contents.append(
+    message_contents = [
         {
             "type": "text",
-            "text": f"{owner_first_name} {owner_second_name} {owner_patronymic}\n"
-                    f"City: {city}, {street}\n"
+            "text": check.text
         }
-    )
+    ]
     message_contents += [{
         "type": "image_file",
         "image_file": {"file_id": item}
     } for item in openai_document_ids]
-    print(message_contents)
-    await client.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content=message_contents
-    )
-
-    run = await client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=config.OWNERSHIP_VERIFICATION_ASSISTANT_ID
-    )
 
-    while True:
-        run_status = await client.beta.threads.runs.retrieve(
+    with current_trace().phase("message_create"):
+        await client.beta.threads.messages.create(
             thread_id=thread.id,
-            run_id=run.id
+            role="user",
+            content=message_contents
         )
-        if run_status.status == "completed":
-            break
-        await asyncio.sleep(0.2)
 
-    messages = await client.beta.threads.messages.list(thread_id=thread.id)
+    await run_assistant(thread.id, check.assistant_id)
+    return await get_assistant_result(thread.id, check.result_cls)
 
-    for msg in reversed(messages.data):
-        if msg.role == "assistant":
-            result_text = msg.content[0].text.value
-            return OwnershipVerificationGptResult(**json.loads(
-                result_text.replace("json", "").replace("`", "")
-            ))
 
-    return OwnershipVerificationGptResult()
+_assistants = {}
 
 
-async def text_and_image_verification(
-        text: str,
-        image_paths=None
-) -> TextVerificationGptResult:
-    if image_paths is None:
-        image_paths = []
+async def get_assistant(assistant_id: str):
+    # Інструкції і модель беремо з налаштованого асистента, щоб промпти не дублювались у коді
+    if assistant_id not in _assistants:
+        _assistants[assistant_id] = await client.beta.assistants.retrieve(assistant_id)
+    return _assistants[assistant_id]
 
-    openai_document_ids = []
-    for image_path in image_paths:
-        with open(image_path, "rb") as f:
-            image_file = await client.files.create(
-                file=f,
-                purpose="assistants"
-            )
-            openai_document_ids.append(image_file.id)
 
-    thread = await client.beta.threads.create()
+def structured_response_format(result_cls) -> dict:
+    """Строга JSON-схема відповіді, побудована з pydantic-моделі результату."""
+    schema = result_cls.model_json_schema()
+    for field_schema in schema["properties"].values():
+        # Strict-режим вимагає всі поля і не допускає значень за замовчуванням
+        field_schema.pop("default", None)
+    schema["required"] = list(schema["properties"])
+    schema["additionalProperties"] = False
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": result_cls.__name__, "schema": schema, "strict": True}
+    }
 
-    message_contents = [
-        {
-            "type": "text",
-            "text": f"Input text: {text}"
-        }
-    ]
-    message_contents += [{
-        "type": "image_file",
-        "image_file": {"file_id": item}
-    } for item in openai_document_ids]
 
-    await client.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content=message_contents
-    )
+def inline_file_content(path: str, max_side: int = None) -> dict:
+    prepared_path = prepare_image_for_gpt(path, max_side)
+    mime_type = mimetypes.guess_type(prepared_path)[0] or "application/octet-stream"
+    with open(prepared_path, "rb") as f:
+        data_url = f"data:{mime_type};base64,{base64.b64encode(f.read()).decode()}"
+
+    if mime_type.startswith("image/"):
+        return {"type": "image_url", "image_url": {"url": data_url}}
+    return {"type": "file", "file": {"filename": os.path.basename(prepared_path), "file_data": data_url}}
+
+
+async def structured_request_body(check: GptCheck) -> dict:
+    """Тіло запиту Chat Completions: один запит з файлами в ньому і строгою JSON-схемою відповіді."""
+    assistant = await get_assistant(check.assistant_id)
+    with current_trace().phase("encode"):
+        files = [
+            await asyncio.to_thread(inline_file_content, path, check.image_max_side) for path in check.file_paths
+        ]
+        content = [{"type": "text", "text": check.text}] + files
+
+    return {
+        "model": config.GPT_CHAT_MODEL or assistant.model,
+        "messages": [
+            {"role": "system", "content": assistant.instructions or ""},
+            {"role": "user", "content": content},
+        ],
+        "response_format": structured_response_format(check.result_cls),
+    }
+
+
+def parse_structured_completion(completion: ChatCompletion, result_cls):
+    choice = completion.choices[0]
+    if choice.message.refusal or choice.finish_reason != "stop":
+        status = "refused" if choice.message.refusal else choice.finish_reason
+        metrics.inc("gpt_runs_total", result=status)
+        raise GptRunError(completion.id, status, choice.message.refusal or "")
+
+    metrics.inc("gpt_runs_total", result="completed")
+    return result_cls.model_validate_json(choice.message.content)
 
-    run = await client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=config.MODERATOR_ASSISTANT_ID
+
+async def structured_check(check: GptCheck):
+    body = await structured_request_body(check)
+    with current_trace().phase("completion"):
+        completion = await client.chat.completions.create(**body, timeout=config.GPT_RUN_TIMEOUT)
+    current_trace().record_usage(completion.usage)
+    return parse_structured_completion(completion, check.result_cls)
+
+
+async def gpt_check(check: GptCheck):
+    if config.GPT_BACKEND == "chat":
+        return await structured_check(check)
+    return await assistant_check(check)
+
+
+def batch_request_line(custom_id: str, body: dict) -> str:
+    return json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body})
+
+
+async def submit_batch(custom_ids_and_bodies: list[tuple[str, dict]]):
+    """Створює Batch API задачу з запитів Chat Completions. Результати будуть готові протягом 24 годин."""
+    lines = [batch_request_line(custom_id, body) for custom_id, body in custom_ids_and_bodies]
+    input_file = await client.files.create(
+        file=("moderation_batch.jsonl", "\n".join(lines).encode()),
+        purpose="batch"
+    )
+    return await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
     )
 
-    while True:
-        run_status = await client.beta.threads.runs.retrieve(
-            thread_id=thread.id,
-            run_id=run.id
-        )
-        if run_status.status == "completed":
-            break
-        await asyncio.sleep(0.2)
 
-    messages = await client.beta.threads.messages.list(thread_id=thread.id)
+async def retrieve_batch(batch_id: str):
+    return await client.batches.retrieve(batch_id)
+
+
+async def read_batch_results(batch, result_cls_for: Callable[[str], type]) -> dict:
+    """
+    Повертає {custom_id: результат} для успішних запитів batch.
+    Рядки з помилками пропускаються — такі перевірки виконуються звичайним шляхом.
+    """
+    if not batch.output_file_id:
+        return {}
+
+    output = await client.files.content(batch.output_file_id)
+    results = {}
+    for line in output.text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            continue
+        try:
+            completion = ChatCompletion.model_validate(response["body"])
+            results[item["custom_id"]] = parse_structured_completion(completion, result_cls_for(item["custom_id"]))
+        except (GptRunError, ValueError) as e:
+            print(f"Некоректна відповідь batch {batch.id} для {item['custom_id']}: {e!r}")
+    return results
+
+
+@trace_gpt_call("passport_verification")
+async def passport_documents_verification(document_photos_paths: list[str]) -> IdVerificationGptResult:
+    return await gpt_check(passport_documents_check(document_photos_paths))
+
+
+@trace_gpt_call("ownership_verification")
+async def ownership_documents_verification(
+        owner_first_name: str,
+        owner_second_name: str,
+        owner_patronymic: str,
+        owner_birth_date: str,
+        document_ownership_path: str,
+        city: str,
+        street: str,
+) -> OwnershipVerificationGptResult:
+    return await gpt_check(ownership_documents_check(
+        owner_first_name, owner_second_name, owner_patronymic, owner_birth_date,
+        document_ownership_path, city, street
+    ))
 
-    for msg in reversed(messages.data):
-        if msg.role == "assistant":
-            result_text = msg.content[0].text.value
-            return TextVerificationGptResult(**json.loads(
-                result_text.replace("json", "").replace("`", "")
-            ))
 
-    return TextVerificationGptResult()
+@trace_gpt_call("text_and_image_verification")
+async def text_and_image_verification(
+        text: str,
+        image_paths=None
+) -> TextVerificationGptResult:
+    return await gpt_check(text_and_image_check(text, image_paths))
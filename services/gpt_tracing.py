@@ -0,0 +1,87 @@
+import datetime
+import json
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from services.metrics import metrics
+
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+class GptCallTrace:
+    """Тривалість фаз, кількість опитувань run і використані токени одного виклику GPT."""
+
+    def __init__(self, call: str):
+        self.call = call
+        self.phases = {}
+        self.polls = 0
+        self.run_status = None
+        self.tokens = {}
+        self.error = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - started)
+
+    def add_phase(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+        metrics.observe("gpt_phase_seconds", seconds, call=self.call, phase=name)
+
+    def record_run(self, run):
+        self.run_status = run.status
+        self.record_usage(getattr(run, "usage", None))
+
+    def record_usage(self, usage):
+        for field in USAGE_FIELDS:
+            value = getattr(usage, field, None)
+            if isinstance(value, int):
+                self.tokens[field] = value
+                metrics.inc("gpt_tokens_total", value, call=self.call, kind=field.removesuffix("_tokens"))
+
+    def to_log(self, seconds: float) -> dict:
+        return {
+            "event": "gpt_call",
+            "time": datetime.datetime.now().isoformat(),
+            "call": self.call,
+            "result": "error" if self.error else "ok",
+            "seconds": round(seconds, 3),
+            "phases": {name: round(value, 3) for name, value in self.phases.items()},
+            "polls": self.polls,
+            "run_status": self.run_status,
+            "tokens": self.tokens,
+            "error": self.error,
+        }
+
+
+_current_trace: ContextVar[Optional[GptCallTrace]] = ContextVar("gpt_call_trace", default=None)
+
+
+def current_trace() -> GptCallTrace:
+    # Поза trace_gpt_call (наприклад, окремий upload_file) пишемо в тимчасовий trace без логу
+    return _current_trace.get() or GptCallTrace("untraced")
+
+
+@asynccontextmanager
+async def trace_gpt_call(call: str):
+    trace = GptCallTrace(call)
+    token = _current_trace.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    except Exception as e:
+        trace.error = f"{type(e).__name__}: {e}"
+        metrics.inc("gpt_call_failures_total", call=call, reason=getattr(e, "status", None) or type(e).__name__)
+        raise
+    finally:
+        _current_trace.reset(token)
+        seconds = time.perf_counter() - started
+        metrics.inc("gpt_calls_total", call=call, result="error" if trace.error else "ok")
+        metrics.observe("gpt_call_seconds", seconds, call=call)
+        metrics.observe("gpt_run_polls", trace.polls, call=call)
+        print(json.dumps(trace.to_log(seconds), ensure_ascii=False))
@@ -0,0 +1,75 @@
+import hashlib
+import io
+import os
+import time
+import uuid
+from pathlib import Path
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from config import config
+
+CACHE_DIR = Path(config.GPT_IMAGE_CACHE_DIR)
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prepare_image_for_gpt(path, max_side: int = None) -> str:
+    """
+    Готує фото для відправки в GPT: прибирає EXIF, зменшує до max_side (за замовчуванням
+    GPT_IMAGE_MAX_SIDE) і перекодовує в JPEG. Результат кешується на диску за хешем вмісту
+    оригіналу разом з параметрами обробки, тож після зміни налаштувань файли готуються заново.
+    Якщо файл не є зображенням (наприклад PDF), повертається оригінальний шлях.
+    """
+    max_side = max_side or config.GPT_IMAGE_MAX_SIDE
+    with open(path, "rb") as f:
+        data = f.read()
+
+    key = hashlib.sha256(data + f":{max_side}:{config.GPT_IMAGE_JPEG_QUALITY}".encode()).hexdigest()
+    prepared_path = CACHE_DIR / f"{key}.jpg"
+    if prepared_path.exists():
+        # Час зміни — час останнього використання, за ним cleanup_image_cache прибирає застарілі файли
+        os.utime(prepared_path)
+        return str(prepared_path)
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError):
+        return str(path)
+
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = CACHE_DIR / f"{uuid.uuid4()}.tmp"
+    # exif не передаємо в save, тому метадані (включно з геолокацією) не потрапляють у файл
+    image.save(tmp_path, format="JPEG", quality=config.GPT_IMAGE_JPEG_QUALITY, optimize=True)
+    tmp_path.replace(prepared_path)
+
+    return str(prepared_path)
+
+
+def cleanup_image_cache(max_age: int) -> int:
+    """Видаляє з кешу файли (і недописані .tmp), якими не користувались довше за max_age секунд."""
+    if not CACHE_DIR.exists():
+        return 0
+
+    threshold = time.time() - max_age
+    removed = 0
+    for path in CACHE_DIR.iterdir():
+        try:
+            if path.stat().st_mtime < threshold:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            # Файл уже прибрав інший процес
+            continue
+    return removed
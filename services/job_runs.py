@@ -0,0 +1,72 @@
+import asyncio
+import datetime
+import time
+from contextlib import asynccontextmanager
+
+from config import config
+from db.models import JOB_RUN_OK, JOB_RUN_FAILED
+from db.services.main_services import JobRunService
+from services.leader_election import leader
+from services.metrics import metrics
+from utils import datetime_now
+
+
+class JobRun:
+    """Лічильники одного запуску фонової задачі; задача заповнює їх сама."""
+
+    def __init__(self, job: str):
+        self.job = job
+        self.started_at = datetime_now()
+        self.seen = 0
+        self.processed = 0
+        self.failed = 0
+        self.error = None
+
+
+async def _finish_job_run(run: JobRun, seconds: float, record_empty: bool):
+    status = JOB_RUN_FAILED if run.error else JOB_RUN_OK
+    metrics.inc("job_runs_total", job=run.job, status=status)
+    metrics.observe("job_run_seconds", seconds, job=run.job)
+    metrics.inc("job_items_total", run.processed, job=run.job, result="processed")
+    metrics.inc("job_items_total", run.failed, job=run.job, result="failed")
+    metrics.set_gauge("job_last_run_timestamp", time.time(), job=run.job)
+
+    # Порожні запуски черг (нічого не знайшли) лишаються лише в метриках, щоб не засмічувати історію
+    if not (run.error or run.seen or record_empty):
+        return
+    try:
+        await JobRunService.add(
+            job=run.job,
+            instance_id=leader.instance_id,
+            status=status,
+            started_at=run.started_at,
+            finished_at=datetime_now(),
+            duration=seconds,
+            items_seen=run.seen,
+            items_processed=run.processed,
+            items_failed=run.failed,
+            error=run.error,
+        )
+    except Exception as e:
+        print(f"[{datetime.datetime.now()}] не вдалося записати запуск {run.job}: {e!r}")
+
+
+@asynccontextmanager
+async def track_job_run(job: str, record_empty: bool = True):
+    run = JobRun(job)
+    started = time.perf_counter()
+    try:
+        yield run
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        run.error = f"{type(e).__name__}: {e}"
+        await _finish_job_run(run, time.perf_counter() - started, record_empty)
+        raise
+    await _finish_job_run(run, time.perf_counter() - started, record_empty)
+
+
+async def cleanup_job_runs():
+    cutoff = datetime_now() - datetime.timedelta(days=config.JOB_RUN_RETENTION_DAYS)
+    deleted = await JobRunService.delete_before(cutoff)
+    print(f"[{datetime.datetime.now()}] видалено {deleted} записів історії запусків")
@@ -0,0 +1,116 @@
+import asyncio
+import datetime
+import functools
+import os
+import socket
+from typing import Awaitable, Callable, Optional
+
+import asyncpg
+
+from config import config
+from services.metrics import metrics
+from services.pg_notifications import pg_connect
+from utils import datetime_now
+
+# За application_name з'єднання лідера /health/leader показує, який процес зараз лідер
+APPLICATION_NAME_PREFIX = "easyrent-leader:"
+
+
+class LeaderElection:
+    """
+    Вибір лідера серед процесів застосунку через сесійний advisory lock Postgres.
+    Лок утримується, поки живе окреме з'єднання лідера: якщо процес завершився або з'єднання
+    обірвалось, Postgres звільняє лок, і резервний процес забирає його за LEADER_CHECK_INTERVAL.
+    """
+
+    def __init__(self, lock_key: int, check_interval: float, check_timeout: float):
+        self.lock_key = lock_key
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self.leader_since: Optional[datetime.datetime] = None
+        self._connection: Optional[asyncpg.Connection] = None
+        self._task = None
+        self._first_attempt = asyncio.Event()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Закрите з'єднання звільняє лок одразу, не чекаючи таймауту
+        await self._disconnect()
+
+    async def wait_first_attempt(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._first_attempt.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while True:
+            try:
+                await self._check()
+            except Exception as e:
+                print(f"[{datetime.datetime.now()}] leader election ({self.instance_id}): {e!r}")
+                await self._disconnect()
+            finally:
+                self._first_attempt.set()
+            await asyncio.sleep(self.check_interval)
+
+    async def _check(self):
+        if self._connection is None or self._connection.is_closed():
+            self._step_down()
+            self._connection = await pg_connect(application_name=APPLICATION_NAME_PREFIX + self.instance_id)
+
+        if self.is_leader:
+            # З'єднання живе — отже, лок досі наш. Без таймауту напіввідкрите з'єднання завісило б
+            # перевірку, і процес лишався б лідером після того, як Postgres уже віддав лок іншому
+            await self._fetchval("SELECT 1")
+        elif await self._fetchval("SELECT pg_try_advisory_lock($1)", self.lock_key):
+            self.is_leader = True
+            self.leader_since = datetime_now()
+            metrics.set_gauge("leader", 1)
+            metrics.inc("leader_elections_total")
+            print(f"[{datetime.datetime.now()}] {self.instance_id} став лідером")
+
+    async def _fetchval(self, query: str, *args):
+        return await asyncio.wait_for(self._connection.fetchval(query, *args), self.check_timeout)
+
+    def _step_down(self):
+        if self.is_leader:
+            print(f"[{datetime.datetime.now()}] {self.instance_id} втратив лідерство")
+        self.is_leader = False
+        self.leader_since = None
+        metrics.set_gauge("leader", 0)
+
+    async def _disconnect(self):
+        self._step_down()
+        connection, self._connection = self._connection, None
+        if connection is not None and not connection.is_closed():
+            try:
+                await connection.close(timeout=self.check_interval)
+            except Exception:
+                connection.terminate()
+
+
+leader = LeaderElection(config.LEADER_LOCK_KEY, config.LEADER_CHECK_INTERVAL, config.LEADER_CHECK_TIMEOUT)
+
+
+def leader_only(job: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+    """Запланована задача виконується лише в процесі-лідері; в резервних процесах запуск пропускається."""
+
+    @functools.wraps(job)
+    async def wrapper():
+        # Одразу після старту лідера ще не обрано — чекаємо першої спроби взяти лок
+        await leader.wait_first_attempt(leader.check_interval)
+        if not leader.is_leader:
+            metrics.inc("leader_only_skipped_total", job=job.__name__)
+            return
+        await job()
+
+    return wrapper
@@ -1,9 +1,21 @@
 import asyncio
 import smtplib
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
 from config import config
+from services.metrics import metrics
+
+
+def build_message(to_email, subject, body) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg["From"] = config.EMAIL_LOGIN
+    msg["To"] = to_email
+    msg["Subject"] = subject
+
+    msg.attach(MIMEText(body, "plain"))
+    return msg
 
 
 def send_email(to_email, subject, body):
@@ -12,12 +24,7 @@ def send_email(to_email, subject, body):
     from_email = config.EMAIL_LOGIN
     app_password = config.EMAIL_PASSWORD
 
-    msg = MIMEMultipart()
-    msg["From"] = from_email
-    msg["To"] = to_email
-    msg["Subject"] = subject
-
-    msg.attach(MIMEText(body, "plain"))
+    msg = build_message(to_email, subject, body)
 
     with smtplib.SMTP(smtp_server, smtp_port) as server:
         server.starttls()
@@ -29,3 +36,98 @@ def send_email(to_email, subject, body):
 
 async def send_email_async(to_email, subject, body):
     await asyncio.to_thread(send_email, to_email, subject, body)
+
+
+# Відмова сервера прийняти конкретний лист: з'єднання після неї лишається робочим.
+# SMTPRecipientsRefused не є SMTPResponseException, бо містить відповіді для кожної адреси
+REJECTED_ERRORS = (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)
+
+
+class SmtpConnection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.sent = 0
+
+
+class SmtpPool:
+    """
+    Невеликий пул автентифікованих SMTP-з'єднань для масової розсилки.
+    З'єднання відкриваються за потреби і перевикористовуються між листами;
+    якщо з'єднання з пулу обірвалось, відкривається нове і лист надсилається ще раз.
+    """
+
+    def __init__(self, size: int):
+        self._semaphore = asyncio.Semaphore(size)
+        self._idle: list[SmtpConnection] = []
+
+    @staticmethod
+    def _connect() -> SmtpConnection:
+        server = smtplib.SMTP(config.EMAIL_SMTP_SERVER, config.EMAIL_SMTP_PORT, timeout=config.EMAIL_SMTP_TIMEOUT)
+        try:
+            if config.EMAIL_SMTP_STARTTLS:
+                server.starttls()
+            server.login(config.EMAIL_LOGIN, config.EMAIL_PASSWORD)
+        except Exception:
+            server.close()
+            raise
+        metrics.inc("smtp_connections_opened_total")
+        return SmtpConnection(server)
+
+    @staticmethod
+    def _close(connection: SmtpConnection):
+        try:
+            connection.server.quit()
+        except Exception:
+            connection.server.close()
+
+    @staticmethod
+    async def _send(connection: SmtpConnection, msg):
+        await asyncio.to_thread(connection.server.send_message, msg)
+        connection.sent += 1
+
+    async def send(self, msg):
+        async with self._semaphore:
+            # З'єднання, яким зараз надсилається лист: після будь-якої помилки, крім відмови сервера, воно закривається
+            connection = self._idle.pop() if self._idle else None
+            started = time.perf_counter()
+            try:
+                if connection is not None:
+                    try:
+                        await self._send(connection, msg)
+                    except REJECTED_ERRORS:
+                        raise
+                    except OSError:
+                        # Сервер закрив з'єднання, поки воно простоювало в пулі, або сокет обірвався
+                        # (SMTPServerDisconnected, ConnectionResetError, BrokenPipeError)
+                        metrics.inc("smtp_reconnects_total")
+                        connection.server.close()
+                        connection = None
+                if connection is None:
+                    connection = await asyncio.to_thread(self._connect)
+                    await self._send(connection, msg)
+            except REJECTED_ERRORS:
+                # Сервер відхилив лист (наприклад, адресу), але з'єднання придатне для наступних
+                metrics.inc("emails_sent_total", result="failed")
+                if connection is not None:
+                    self._idle.append(connection)
+                raise
+            except Exception:
+                metrics.inc("emails_sent_total", result="failed")
+                if connection is not None:
+                    connection.server.close()
+                raise
+
+            metrics.inc("emails_sent_total", result="sent")
+            metrics.observe("email_send_seconds", time.perf_counter() - started)
+            if connection.sent >= config.EMAIL_MAX_MESSAGES_PER_CONNECTION:
+                await asyncio.to_thread(self._close, connection)
+            else:
+                self._idle.append(connection)
+
+    async def close(self):
+        connections, self._idle = self._idle, []
+        for connection in connections:
+            await asyncio.to_thread(self._close, connection)
+
+
+smtp_pool = SmtpPool(config.EMAIL_CONCURRENCY)
@@ -0,0 +1,78 @@
+import threading
+from collections import defaultdict, deque
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+
+def _percentile(values: list, percent: float) -> float:
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+class MetricsRegistry:
+    """
+    Прості метрики в пам'яті процесу: лічильники, gauge і гістограми
+    з останніх HISTOGRAM_SIZE спостережень для перцентилів.
+    """
+    HISTOGRAM_SIZE = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = defaultdict(float)
+        self._histograms = defaultdict(lambda: deque(maxlen=self.HISTOGRAM_SIZE))
+        self._histogram_totals = defaultdict(lambda: [0, 0.0])
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def add_gauge(self, name: str, delta: float, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] += delta
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._histograms[key].append(value)
+            totals = self._histogram_totals[key]
+            totals[0] += 1
+            totals[1] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            histograms = {}
+            for key, values in self._histograms.items():
+                ordered = sorted(values)
+                count, total = self._histogram_totals[key]
+                histograms[key] = {
+                    "count": count,
+                    "sum": round(total, 6),
+                    "p50": _percentile(ordered, 50),
+                    "p95": _percentile(ordered, 95),
+                    "p99": _percentile(ordered, 99),
+                    "max": ordered[-1],
+                }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": histograms,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self._histogram_totals.clear()
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,80 @@
+import asyncio
+import datetime
+import hashlib
+import json
+from typing import Awaitable, Callable, NamedTuple
+
+from config import config
+from db.services.main_services import ModerationVerdictService
+from services.image_preprocessing import file_sha256
+from services.metrics import metrics
+
+CONTENT_CHECK = "content"
+OWNERSHIP_CHECK = "ownership"
+REVIEW_CHECK = "review"
+
+LOCAL_STAGE = "local"
+GPT_STAGE = "gpt"
+
+
+class Verdict(NamedTuple):
+    is_ok: bool
+    reason: str = ""
+    stage: str = GPT_STAGE
+
+
+def _fingerprint(assistant_id: str, *parts) -> str:
+    # Вердикт залежить не лише від вмісту, а й від того, хто і якою моделлю його перевіряв
+    checker = (assistant_id, config.GPT_BACKEND, config.GPT_CHAT_MODEL, config.MODERATION_VERDICT_VERSION)
+    return hashlib.sha256(json.dumps((checker, *parts), ensure_ascii=False).encode()).hexdigest()
+
+
+def text_fingerprint(text: str) -> str:
+    return _fingerprint(config.MODERATOR_ASSISTANT_ID, text)
+
+
+def _files_sha256(paths: list[str]) -> list[str]:
+    return [file_sha256(path) for path in paths]
+
+
+async def content_fingerprint(name: str, description: str, image_paths: list[str]) -> str:
+    # Хешування файлів читає їх з диска повністю — поза event loop
+    image_hashes = await asyncio.to_thread(_files_sha256, image_paths)
+    return _fingerprint(config.MODERATOR_ASSISTANT_ID, name, description, sorted(image_hashes))
+
+
+async def ownership_fingerprint(document_path: str, *owner_and_address: str) -> str:
+    document_hash = await asyncio.to_thread(file_sha256, document_path)
+    return _fingerprint(config.OWNERSHIP_VERIFICATION_ASSISTANT_ID, document_hash, *owner_and_address)
+
+
+def verdict_ttl(is_ok: bool) -> int:
+    return config.MODERATION_VERDICT_TTL if is_ok else config.MODERATION_REJECTED_VERDICT_TTL
+
+
+async def cached_check(
+        kind: str,
+        fingerprint: str,
+        verify: Callable[[], Awaitable[Verdict]]
+) -> Verdict:
+    """
+    Повертає збережений вердикт для незмінного вмісту, інакше викликає verify()
+    і запам'ятовує результат разом з етапом, що його прийняв, на verdict_ttl() секунд.
+    """
+    verdict = await ModerationVerdictService.select_fresh(kind, fingerprint)
+    if verdict:
+        metrics.inc("moderation_verdict_cache_total", kind=kind, result="hit")
+        return Verdict(verdict.is_ok, verdict.reason, verdict.stage)
+
+    metrics.inc("moderation_verdict_cache_total", kind=kind, result="miss")
+    result = await verify()
+    metrics.inc("moderation_decisions_total", kind=kind, stage=result.stage, result="ok" if result.is_ok else "rejected")
+    await ModerationVerdictService.remember(
+        kind, fingerprint, result.is_ok, result.reason, result.stage, ttl=verdict_ttl(result.is_ok)
+    )
+    return result
+
+
+async def cleanup_moderation_verdicts():
+    deleted = await ModerationVerdictService.delete_expired()
+    print(f"[{datetime.datetime.now()}] видалено {deleted} застарілих вердиктів модерації")
@@ -0,0 +1,130 @@
+import asyncio
+import datetime
+from typing import Awaitable, Callable, Optional
+
+import asyncpg
+
+from config import config
+from services.metrics import metrics
+from utils import backoff_delay
+
+
+async def pg_connect(application_name: Optional[str] = None) -> asyncpg.Connection:
+    """Окреме з'єднання поза пулом SQLAlchemy для LISTEN і сесійних advisory lock."""
+    return await asyncpg.connect(
+        host=config.DB_HOST,
+        port=int(config.DB_PORT),
+        user=config.DB_USER,
+        password=config.DB_PASS.get_secret_value(),
+        database=config.DB_NAME,
+        server_settings={"application_name": application_name} if application_name else None,
+    )
+
+
+class WorkerWakeup:
+    """
+    Запускає воркер за сигналом (Postgres NOTIFY або резервне опитування).
+    Сигнали, що надійшли під час роботи воркера, зливаються в один наступний запуск,
+    тож у межах процесу воркер ніколи не працює паралельно сам із собою.
+    Якщо воркер повернув True (черга ще не порожня), він запускається знову одразу.
+    """
+
+    def __init__(self, name: str, worker: Callable[[], Awaitable[bool]]):
+        self.name = name
+        self._worker = worker
+        self._event = asyncio.Event()
+        self._task = None
+
+    def wake(self, *_):
+        self._event.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self._event.wait()
+            self._event.clear()
+            metrics.inc("worker_wakeups_total", worker=self.name)
+            try:
+                has_more = await self._worker()
+            except Exception as e:
+                print(f"[{datetime.datetime.now()}] {self.name} failed: {e!r}")
+                continue
+            if has_more:
+                self._event.set()
+
+
+class PgListener:
+    """
+    Тримає окреме з'єднання з Postgres з LISTEN на каналі та викликає callback на кожне NOTIFY.
+    Після обриву з'єднання перепідключається з експоненційною затримкою і викликає callback
+    ще раз, бо повідомлення, надіслані без слухача, втрачаються. Обрив, про який сокет не дізнався
+    (NAT, перезапуск балансувальника), виявляє періодичний SELECT 1.
+    """
+
+    def __init__(self, channel: str, callback: Callable[[Optional[str]], None]):
+        self.channel = channel
+        self._callback = callback
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @staticmethod
+    async def connect() -> asyncpg.Connection:
+        return await pg_connect()
+
+    def _on_notification(self, _connection, _pid, _channel, payload: str):
+        metrics.inc("pg_notifications_total", channel=self.channel)
+        self._callback(payload)
+
+    @staticmethod
+    async def _wait_lost(lost: asyncio.Event) -> bool:
+        try:
+            await asyncio.wait_for(lost.wait(), timeout=config.PG_LISTENER_HEALTH_CHECK_INTERVAL)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _run(self):
+        attempt = 0
+        while True:
+            try:
+                connection = await self.connect()
+            except Exception as e:
+                attempt += 1
+                delay = backoff_delay(attempt, 1, 60)
+                print(f"[{datetime.datetime.now()}] LISTEN {self.channel}: не вдалося підключитись ({e!r}), "
+                      f"повтор через {delay} с")
+                await asyncio.sleep(delay)
+                continue
+
+            attempt = 0
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            try:
+                await connection.add_listener(self.channel, self._on_notification)
+                metrics.set_gauge("pg_listener_connected", 1, channel=self.channel)
+                self._callback(None)
+                while not await self._wait_lost(lost):
+                    await connection.fetchval("SELECT 1", timeout=config.PG_LISTENER_HEALTH_CHECK_TIMEOUT)
+                print(f"[{datetime.datetime.now()}] LISTEN {self.channel}: з'єднання втрачено")
+            except Exception as e:
+                print(f"[{datetime.datetime.now()}] LISTEN {self.channel}: {e!r}")
+            finally:
+                metrics.set_gauge("pg_listener_connected", 0, channel=self.channel)
+                if not connection.is_closed():
+                    await connection.close(timeout=config.PG_LISTENER_HEALTH_CHECK_TIMEOUT)
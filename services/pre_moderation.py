@@ -0,0 +1,113 @@
+import asyncio
+import datetime
+import re
+from typing import Optional
+
+from PIL import Image, UnidentifiedImageError
+
+from config import config
+from db.services.main_services import RejectedImageService
+from services.moderation_cache import Verdict, LOCAL_STAGE
+from utils import datetime_now
+
+SPAM_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in config.PRE_MODERATION_SPAM_PATTERNS]
+BLOCKLIST = [word.casefold() for word in config.PRE_MODERATION_BLOCKLIST]
+
+
+def image_dhash(path) -> Optional[int]:
+    """64-бітний difference hash: стійкий до масштабування і перекодування фото."""
+    try:
+        with Image.open(path) as image:
+            pixels = list(image.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    # BigInteger у Postgres знаковий
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def check_text(text: str, min_length: int = 0) -> Optional[Verdict]:
+    text = (text or "").strip()
+    if len(text) < min_length:
+        return Verdict(False, "текст занадто короткий", LOCAL_STAGE)
+
+    folded = text.casefold()
+    for word in BLOCKLIST:
+        if word in folded:
+            return Verdict(False, "текст містить заборонені слова", LOCAL_STAGE)
+
+    for pattern in SPAM_PATTERNS:
+        if pattern.search(text):
+            return Verdict(False, "текст схожий на спам", LOCAL_STAGE)
+
+    return None
+
+
+def check_image_resolution(image_paths: list[str]) -> Optional[Verdict]:
+    for path in image_paths:
+        try:
+            with Image.open(path) as image:
+                width, height = image.size
+        except (UnidentifiedImageError, OSError):
+            # Формат, який Pillow не читає (наприклад HEIC з телефона), не обов'язково пошкоджений — його оцінює GPT
+            continue
+
+        if min(width, height) < config.PRE_MODERATION_MIN_IMAGE_SIDE:
+            return Verdict(False, "фото занадто низької роздільної здатності", LOCAL_STAGE)
+
+    return None
+
+
+def _image_hashes(image_paths: list[str]) -> list[int]:
+    return [image_hash for image_hash in map(image_dhash, image_paths) if image_hash is not None]
+
+
+async def image_hashes(image_paths: list[str]) -> list[int]:
+    # Декодування фото займає десятки мілісекунд на кожне — поза event loop
+    return await asyncio.to_thread(_image_hashes, image_paths)
+
+
+def rejected_images_cutoff() -> datetime.datetime:
+    return datetime_now() - datetime.timedelta(days=config.PRE_MODERATION_REJECTED_IMAGE_TTL_DAYS)
+
+
+async def check_rejected_images(image_paths: list[str]) -> Optional[Verdict]:
+    if await RejectedImageService.has_similar(
+            await image_hashes(image_paths), config.PRE_MODERATION_IMAGE_HASH_DISTANCE, rejected_images_cutoff()
+    ):
+        return Verdict(False, "фото вже використовувались у відхиленому оголошенні", LOCAL_STAGE)
+    return None
+
+
+async def remember_rejected_images(image_paths: list[str]):
+    await RejectedImageService.remember(await image_hashes(image_paths))
+
+
+async def forget_rejected_images(image_paths: list[str]) -> int:
+    """Знімає блокування з фото (і схожих на них), наприклад після апеляції власника."""
+    return await RejectedImageService.forget_similar(
+        await image_hashes(image_paths), config.PRE_MODERATION_IMAGE_HASH_DISTANCE
+    )
+
+
+async def cleanup_rejected_images():
+    deleted = await RejectedImageService.delete_before(rejected_images_cutoff())
+    print(f"[{datetime.datetime.now()}] видалено {deleted} застарілих хешів відхилених фото")
+
+
+async def pre_moderate(text: str, image_paths: list[str] = None, min_text_length: int = 0) -> Optional[Verdict]:
+    """
+    Дешева локальна перевірка перед GPT. Повертає вердикт, якщо рішення очевидне,
+    або None, якщо вміст потрібно перевірити в GPT. Мінімальна довжина тексту задається
+    лише для оголошень: короткий відгук на кшталт «Супер!» цілком нормальний.
+    """
+    image_paths = image_paths or []
+    return (
+        check_text(text, min_text_length)
+        or await asyncio.to_thread(check_image_resolution, image_paths)
+        or await check_rejected_images(image_paths)
+    )
@@ -0,0 +1,46 @@
+import asyncio
+import datetime
+import time
+from typing import Awaitable, Callable
+
+from services.metrics import metrics
+
+
+class StartupState:
+    """
+    Готовність застосунку та стан задач, відкладених до моменту після старту
+    (надолуження пропущених запусків воркерів тощо). Їх показує /health/ready.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._jobs = {}
+        self._tasks = []
+
+    def run_in_background(self, name: str, job: Callable[[], Awaitable[None]]):
+        self._jobs[name] = "running"
+        self._tasks.append(asyncio.create_task(self._run(name, job)))
+
+    async def _run(self, name: str, job: Callable[[], Awaitable[None]]):
+        started = time.perf_counter()
+        try:
+            await job()
+            self._jobs[name] = "done"
+        except Exception as e:
+            self._jobs[name] = "failed"
+            print(f"[{datetime.datetime.now()}] startup job {name} failed: {e!r}")
+        finally:
+            metrics.observe("startup_job_seconds", time.perf_counter() - started, job=name)
+
+    def jobs(self) -> dict:
+        return dict(self._jobs)
+
+    async def stop(self):
+        self.ready = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+startup_state = StartupState()
@@ -0,0 +1,67 @@
+import time
+
+from sqlalchemy.exc import DBAPIError
+
+from config import config
+from db.models import StreetModel
+from db.services.main_services import StreetService
+from services.job_runs import track_job_run
+from services.metrics import metrics
+from utils import street_search_key, search_key_variants
+
+# SQLSTATE query_canceled: запит перевищив statement_timeout
+QUERY_CANCELED = "57014"
+
+
+def best_variant(rows: list[tuple[StreetModel, int]], variants: int) -> list[StreetModel]:
+    """
+    Лишає вулиці, знайдені найімовірнішим варіантом запиту: якщо сам запит дав збіги за префіксом,
+    варіант в іншій розкладці (часто випадкові латинські літери) не змішується з ними.
+    Нечіткі збіги (номер variants) лишаються, коли за префіксом збігся сам запит або нічого.
+    """
+    if not rows:
+        return []
+    best = min(rank for _, rank in rows)
+    return [street for street, rank in rows if rank == best or (best in (0, variants) and rank == variants)]
+
+
+async def search_streets(q: str, city_id: int = None) -> list[StreetModel]:
+    """
+    Автодоповнення вулиць українською, латиницею або в неправильній розкладці: за префіксом назви,
+    а для запитів від LOCATION_FUZZY_MIN_LENGTH символів — ще й нечітко, щоб знаходилися назви з помилками.
+    Усі варіанти запиту шукаються одним запитом до бази.
+    Нечіткий пошук має бюджет часу; якщо база не вклалась, відповідає пошук за префіксом.
+    """
+    keys = search_key_variants(q, street_search_key)
+    if not keys:
+        return []
+    if len(keys[0]) < config.LOCATION_FUZZY_MIN_LENGTH:
+        return best_variant(await StreetService.search(keys, city_id, config.LOCATION_SEARCH_LIMIT), len(keys))
+
+    started = time.perf_counter()
+    try:
+        rows = await StreetService.search(
+            keys,
+            city_id,
+            config.LOCATION_SEARCH_LIMIT,
+            fuzzy_threshold=config.LOCATION_FUZZY_THRESHOLD,
+            timeout_ms=config.LOCATION_FUZZY_TIMEOUT_MS
+        )
+    except DBAPIError as e:
+        if getattr(e.orig, "pgcode", None) != QUERY_CANCELED:
+            raise
+        metrics.inc("location_fuzzy_timeouts_total", kind="street")
+        rows = await StreetService.search(keys, city_id, config.LOCATION_SEARCH_LIMIT)
+    metrics.observe("location_fuzzy_search_seconds", time.perf_counter() - started, kind="street")
+    return best_variant(rows, len(keys))
+
+
+async def backfill_street_search_keys():
+    """
+    Заповнює ключі пошуку вулиць, імпортованих до появи колонки search_key.
+    Працює пачками, щоб не тримати довгу транзакцію над усією таблицею вулиць.
+    """
+    async with track_job_run("backfill_street_search_keys", record_empty=False) as run:
+        while updated := await StreetService.backfill_search_keys(config.STREET_SEARCH_KEY_BACKFILL_BATCH_SIZE):
+            run.seen += updated
+            run.processed += updated
@@ -0,0 +1,235 @@
+import datetime
+
+from config import config
+from db.models import MODERATION_JOB_BATCHED, ModerationBatchModel
+from db.services.main_services import ListingService, ModerationJobService, ModerationBatchService, \
+    ModerationVerdictService
+from services.gpt_services import submit_batch, retrieve_batch, read_batch_results, structured_request_body, \
+    batch_request_line, text_and_image_check, ownership_documents_check, TextVerificationGptResult, OwnershipVerificationGptResult
+from services.metrics import metrics
+from services.moderation_cache import CONTENT_CHECK, OWNERSHIP_CHECK, Verdict, verdict_ttl
+from services.pre_moderation import pre_moderate, remember_rejected_images
+from services.worker_moderate_listings import is_ready_for_moderation, listing_image_paths, content_text, \
+    ownership_args, listing_fingerprints, content_result_verdict, ownership_result_verdict, listing_values, \
+    observe_claimed_jobs, observe_decided_job
+from utils import datetime_now
+
+RESULT_CLASSES = {CONTENT_CHECK: TextVerificationGptResult, OWNERSHIP_CHECK: OwnershipVerificationGptResult}
+RESULT_VERDICTS = {CONTENT_CHECK: content_result_verdict, OWNERSHIP_CHECK: ownership_result_verdict}
+
+
+def batch_custom_id(kind: str, fingerprint: str) -> str:
+    return f"{kind}:{fingerprint}"
+
+
+def parse_custom_id(custom_id: str) -> tuple[str, str]:
+    kind, fingerprint = custom_id.split(":", 1)
+    return kind, fingerprint
+
+
+def verdict_row(kind: str, fingerprint: str, verdict: Verdict) -> dict:
+    metrics.inc("moderation_decisions_total", kind=kind, stage=verdict.stage, result="ok" if verdict.is_ok else "rejected")
+    return {
+        "kind": kind,
+        "fingerprint": fingerprint,
+        "is_ok": verdict.is_ok,
+        "reason": verdict.reason,
+        "stage": verdict.stage,
+        "expires_at": datetime_now() + datetime.timedelta(seconds=verdict_ttl(verdict.is_ok)),
+    }
+
+
+async def encode_checks(checks: dict) -> tuple[dict, int]:
+    """Тіла запитів для перевірок {custom_id: GptCheck} і їхній розмір у вхідному файлі batch, байт."""
+    bodies = {custom_id: await structured_request_body(check) for custom_id, check in checks.items()}
+    return bodies, sum(len(batch_request_line(custom_id, body).encode()) for custom_id, body in bodies.items())
+
+
+async def build_batch_requests(listings: dict):
+    """
+    Видає порції (запити {custom_id: тіло}, id оголошень) для перевірок, яких ще немає в кеші вердиктів.
+    Кожна порція — окремий batch не більший за MODERATION_BATCH_MAX_BYTES, і в пам'яті тримається
+    лише поточна. Однаковий вміст оголошень порції перевіряється одним запитом,
+    а очевидні випадки вирішуються локальною премодерацією без GPT.
+    """
+    ready = [listing for listing in listings.values() if is_ready_for_moderation(listing)]
+    fingerprints = {listing.id: await listing_fingerprints(listing) for listing in ready}
+    known = await ModerationVerdictService.select_many([
+        key for content_key, ownership_key in fingerprints.values()
+        for key in ((CONTENT_CHECK, content_key), (OWNERSHIP_CHECK, ownership_key))
+    ])
+
+    requests, listing_ids, size = {}, set(), 0
+    local_verdicts = []
+    for listing in ready:
+        content_key, ownership_key = fingerprints[listing.id]
+        image_paths = listing_image_paths(listing)
+
+        checks = {}
+        if (CONTENT_CHECK, content_key) not in known:
+            local_verdict = await pre_moderate(
+                f"{listing.name}\n{listing.description}", image_paths, config.PRE_MODERATION_MIN_TEXT_LENGTH
+            )
+            if local_verdict:
+                local_verdicts.append(verdict_row(CONTENT_CHECK, content_key, local_verdict))
+                known[(CONTENT_CHECK, content_key)] = local_verdict
+            else:
+                checks[batch_custom_id(CONTENT_CHECK, content_key)] = text_and_image_check(content_text(listing), image_paths)
+        if (OWNERSHIP_CHECK, ownership_key) not in known:
+            checks[batch_custom_id(OWNERSHIP_CHECK, ownership_key)] = ownership_documents_check(*ownership_args(listing))
+        if not checks:
+            continue
+
+        bodies, listing_size = await encode_checks({
+            custom_id: check for custom_id, check in checks.items() if custom_id not in requests
+        })
+        if requests and size + listing_size > config.MODERATION_BATCH_MAX_BYTES:
+            yield requests, listing_ids
+            requests, listing_ids, size = {}, set(), 0
+            # Запити, спільні з попередньою порцією, потрібні й у новій
+            shared, shared_size = await encode_checks({
+                custom_id: check for custom_id, check in checks.items() if custom_id not in bodies
+            })
+            bodies.update(shared)
+            listing_size += shared_size
+        requests.update(bodies)
+        listing_ids.add(listing.id)
+        size += listing_size
+
+    await ModerationVerdictService.remember_many(local_verdicts)
+    if requests:
+        yield requests, listing_ids
+
+
+async def apply_verdicts(jobs: list, listings: dict) -> int:
+    """
+    Застосовує відомі вердикти до оголошень batch одним набором запитів.
+    Задачі, для яких вердикту немає (помилка в рядку batch), повертаються в звичайну чергу.
+    """
+    fingerprints = {
+        job.listing_id: await listing_fingerprints(listings[job.listing_id])
+        for job in jobs if is_ready_for_moderation(listings.get(job.listing_id))
+    }
+    known = await ModerationVerdictService.select_many([
+        key for content_key, ownership_key in fingerprints.values()
+        for key in ((CONTENT_CHECK, content_key), (OWNERSHIP_CHECK, ownership_key))
+    ])
+
+    values = {}
+    for job in jobs:
+        if job.listing_id not in fingerprints:
+            # Оголошення видалене або вже не на модерації — задача просто завершується
+            values[job.id] = None
+            continue
+
+        content_key, ownership_key = fingerprints[job.listing_id]
+        content_verdict = known.get((CONTENT_CHECK, content_key))
+        ownership_verdict = known.get((OWNERSHIP_CHECK, ownership_key))
+        if content_verdict and ownership_verdict:
+            values[job.id] = listing_values(content_verdict, ownership_verdict)
+
+    completed_ids = await ModerationJobService.complete_many(jobs, values)
+    for job in jobs:
+        if job.id in completed_ids:
+            observe_decided_job(job)
+    metrics.inc("moderation_batch_jobs_total", len(completed_ids), result="completed")
+    metrics.inc("moderation_batch_jobs_total", len(jobs) - len(completed_ids), result="released")
+    return len(completed_ids)
+
+
+async def submit_moderation_batch():
+    if await ModerationJobService.count_pending() < config.MODERATION_BATCH_THRESHOLD:
+        return
+
+    jobs = await ModerationJobService.claim(
+        config.MODERATION_BATCH_MAX_LISTINGS,
+        config.MODERATION_VISIBILITY_TIMEOUT,
+        status=MODERATION_JOB_BATCHED
+    )
+    if not jobs:
+        return
+    observe_claimed_jobs(jobs)
+
+    assigned_ids = set()
+    try:
+        listings = await ListingService.select_for_moderation([job.listing_id for job in jobs])
+        async for requests, listing_ids in build_batch_requests(listings):
+            batch = await submit_batch(list(requests.items()))
+            batch_record = await ModerationBatchService.add(
+                openai_batch_id=batch.id,
+                status=batch.status,
+                request_count=len(requests)
+            )
+            job_ids = [job.id for job in jobs if job.listing_id in listing_ids]
+            await ModerationJobService.assign_batch(job_ids, batch_record.id)
+            assigned_ids.update(job_ids)
+            metrics.inc("moderation_batches_total", status="submitted")
+            print(f"[{datetime.datetime.now()}] batch {batch.id}: {len(requests)} запитів для {len(job_ids)} оголошень")
+
+        # Для решти оголошень вердикти вже відомі або вони більше не на модерації
+        unassigned = [job for job in jobs if job.id not in assigned_ids]
+        if unassigned:
+            await apply_verdicts(unassigned, listings)
+    except Exception as e:
+        print(f"[{datetime.datetime.now()}] не вдалося створити batch модерації: {e!r}")
+        await ModerationJobService.release([job.id for job in jobs if job.id not in assigned_ids])
+
+
+async def poll_moderation_batch(batch_record: ModerationBatchModel):
+    batch = await retrieve_batch(batch_record.openai_batch_id)
+    if batch.status not in ModerationBatchService.FINAL_STATUSES:
+        if batch.status != batch_record.status:
+            await ModerationBatchService.update({"id": batch_record.id}, status=batch.status)
+        return
+
+    jobs = await ModerationJobService.select_batched(batch_record.id)
+    if batch.status == "completed":
+        results = await read_batch_results(batch, lambda custom_id: RESULT_CLASSES[parse_custom_id(custom_id)[0]])
+        verdicts = {}
+        for custom_id, result in results.items():
+            kind, fingerprint = parse_custom_id(custom_id)
+            verdicts[(kind, fingerprint)] = RESULT_VERDICTS[kind](result)
+        await ModerationVerdictService.remember_many([
+            verdict_row(kind, fingerprint, verdict) for (kind, fingerprint), verdict in verdicts.items()
+        ])
+
+        listings = await ListingService.select_for_moderation([job.listing_id for job in jobs])
+        for listing in listings.values():
+            if not is_ready_for_moderation(listing):
+                continue
+            content_key, _ = await listing_fingerprints(listing)
+            content_result = results.get(batch_custom_id(CONTENT_CHECK, content_key))
+            if content_result and not content_result.is_ok and content_result.images_rejected:
+                await remember_rejected_images(listing_image_paths(listing))
+
+        completed = await apply_verdicts(jobs, listings)
+        print(f"[{datetime.datetime.now()}] batch {batch.id}: {len(results)}/{batch_record.request_count} "
+              f"відповідей, завершено {completed}/{len(jobs)} задач")
+    else:
+        await ModerationJobService.release([job.id for job in jobs])
+        print(f"[{datetime.datetime.now()}] batch {batch.id} завершився зі статусом {batch.status}, "
+              f"{len(jobs)} задач повернуто в чергу")
+
+    metrics.inc("moderation_batches_total", status=batch.status)
+    await ModerationBatchService.update(
+        {"id": batch_record.id},
+        status=batch.status,
+        finished_at=datetime.datetime.now(datetime.timezone.utc)
+    )
+
+
+async def worker_batch_moderation():
+    """
+    Пакетна модерація для великих черг: замість окремих запитів на кожне оголошення
+    перевірки збираються в OpenAI Batch, а вердикти застосовуються разом.
+    Нова порція береться лише тоді, коли всі batch попередньої завершились.
+    """
+    if not config.MODERATION_BATCH_MODE:
+        return
+
+    active_batches = await ModerationBatchService.select_active()
+    for batch_record in active_batches:
+        await poll_moderation_batch(batch_record)
+
+    if not active_batches:
+        await submit_moderation_batch()
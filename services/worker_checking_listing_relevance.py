@@ -2,31 +2,20 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 import asyncio
 import datetime
-from sqlalchemy import func
-from db.models import ListingModel
-from db.services.main_services import ListingService, UserService
+from config import config
+from db.services.main_services import ListingService
 from listing_app.schemes import ARCHIVED_STATUS_ID, ACTIVE_STATUS_ID
-from services.mailing import send_email_async
+from services.email_outbox import outbox_email
+from services.job_runs import track_job_run
+from services.metrics import metrics
+from utils import naive_utc_now
 
 
-async def worker_checking_listing_relevance():
-    print(f"[{datetime.datetime.now()}] worker_checking_listing_relevance запущений")
-    now = datetime.datetime.utcnow()
-    listings = await ListingService.select(
-        func.date(ListingModel.created_at) == (now - datetime.timedelta(days=15)).date(),
-        listing_status_id=ACTIVE_STATUS_ID
-    )
-    # print((now - datetime.timedelta(days=15)).date())
-    for listing in listings:
-        # print(listing)
-        user = await UserService.select_one(id=listing.owner_id)
-        if not user:
-            continue
-
-        text = f"""
+def archive_notification_text(listing_name: str) -> str:
+    return f"""
 Шановний(а) користувачу,
 
-Повідомляємо, що ваше оголошення "{listing.name}" було автоматично переміщене до розділу «Архівовані» у зв’язку з відсутністю активності протягом останніх 15 днів.
+Повідомляємо, що ваше оголошення "{listing_name}" було автоматично переміщене до розділу «Архівовані» у зв’язку з відсутністю активності протягом останніх {config.LISTING_RELEVANCE_DAYS} днів.
 
 Відповідно до правил платформи, оголошення, які не оновлювались або не мали активних дій упродовж зазначеного періоду, автоматично архівуються з метою забезпечення актуальності контенту.
 
@@ -35,15 +24,28 @@ async def worker_checking_listing_relevance():
 З повагою,
 Команда EasyRent
         """
-        await send_email_async(
-            user.email,
-            subject="EasyRent - повідомлення про архівацію оголошення",
-            body=text
-        )
-        listing.listing_status_id = ARCHIVED_STATUS_ID
-        await ListingService.save(listing)
 
 
+def archive_notification(listing_id: int, listing_name: str, owner_email: str) -> dict:
+    # Листи записуються в outbox разом з архівацією; ключ не дає надіслати повідомлення двічі за день
+    return outbox_email(
+        f"listing_archived:{listing_id}:{datetime.date.today().isoformat()}",
+        owner_email,
+        subject="EasyRent - повідомлення про архівацію оголошення",
+        body=archive_notification_text(listing_name)
+    )
+
+
+async def worker_checking_listing_relevance():
+    print(f"[{datetime.datetime.now()}] worker_checking_listing_relevance запущений")
+    # Усі прострочені оголошення, а не лише створені рівно N днів тому: пропущений запуск надолужується наступним
+    cutoff = naive_utc_now() - datetime.timedelta(days=config.LISTING_RELEVANCE_DAYS)
+    async with track_job_run("worker_checking_listing_relevance") as job_run:
+        archived = await ListingService.archive_stale(cutoff, ACTIVE_STATUS_ID, ARCHIVED_STATUS_ID, archive_notification)
+        job_run.seen = job_run.processed = len(archived)
+    metrics.inc("listings_archived_total", len(archived))
+    print(f"[{datetime.datetime.now()}] заархівовано {len(archived)} оголошень")
+
 
 def start_scheduler():
     scheduler = AsyncIOScheduler()
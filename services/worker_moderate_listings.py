@@ -1,60 +1,203 @@
+import asyncio
 import datetime
+from typing import Optional
 
-from db.models import ListingModel
-from db.services.main_services import ListingService, UserService, CityService, StreetService, ImageService
+from config import config
+from db.models import ModerationJobModel, ListingModel, MODERATION_JOBS_CHANNEL
+from db.services.main_services import ListingService, ModerationJobService
 from listing_app.schemes import MODERATION_STATUS_ID, DISCARD_STATUS_ID, ACTIVE_STATUS_ID
-from services.gpt_services import ownership_documents_verification, text_and_image_verification
+from services.job_runs import track_job_run
+from services.metrics import metrics
+from services.gpt_services import ownership_documents_verification, text_and_image_verification, \
+    TextVerificationGptResult, OwnershipVerificationGptResult
+from services.moderation_cache import cached_check, content_fingerprint, ownership_fingerprint, CONTENT_CHECK, \
+    OWNERSHIP_CHECK, Verdict
+from services.pg_notifications import WorkerWakeup, PgListener
+from services.pre_moderation import pre_moderate, remember_rejected_images
+from utils import backoff_delay
 
 
-async def discard_listing_service(listing: ListingModel, discard_reason: str):
-    listing.listing_status_id = DISCARD_STATUS_ID
-    listing.discard_reason = discard_reason
-    await ListingService.save(listing)
+def discard_listing_values(discard_reason: str) -> dict:
+    return {"listing_status_id": DISCARD_STATUS_ID, "discard_reason": discard_reason}
 
 
-async def worker_moderate_listings():
-    print(f"[{datetime.datetime.now()}] worker_moderate_listings запущений")
-    listings = await ListingService.select(
-        listing_status_id=MODERATION_STATUS_ID
+def is_ready_for_moderation(listing: Optional[ListingModel]) -> bool:
+    if not listing or listing.listing_status_id != MODERATION_STATUS_ID:
+        return False
+    return bool(listing.document_ownership_path and listing.name and listing.description)
+
+
+def listing_image_paths(listing: ListingModel) -> list[str]:
+    return [f"static/listing_photos/{image.image_url}" for image in listing.images]
+
+
+def content_text(listing: ListingModel) -> str:
+    return f"Оголошення про нерухомість:\n{listing.name}\n{listing.description}"
+
+
+def ownership_args(listing: ListingModel) -> tuple:
+    user = listing.owner
+    return (
+        user.first_name,
+        user.last_name,
+        user.patronymic,
+        user.birth_date,
+        listing.document_ownership_path,
+        listing.city.name_ukr if listing.city else "",
+        listing.street.name_ukr if listing.street else "",
     )
-    for listing in listings:
-        user = await UserService.select_one(id=listing.owner_id)
-        city = await CityService.select_one(id=listing.city_id)
-        street = await StreetService.select_one(id=listing.street_id)
-        images = await ImageService.select(listing_id=listing.id)
-
-        if not listing.document_ownership_path or not listing.name or not listing.description:
-            continue
-
-        if True:
-            # Content Verification
-            verification_result = await text_and_image_verification(
-                f"Оголошення про нерухомість:\n{listing.name}\n{listing.description}",
-                [f"static/listing_photos/{image.image_url}" for image in images]
-            )
-            if not verification_result.is_ok:
-                await discard_listing_service(
-                    listing,
-                    discard_reason=f"Ваше оголошення не пройшло модерацію. Причина: {verification_result.reason_details or '-'}"
-                )
-                continue
-
-        # Ownership Verification
-        verification_result = await ownership_documents_verification(
-            user.first_name,
-            user.last_name,
-            user.patronymic,
-            user.birth_date,
-            listing.document_ownership_path,
-            city.name_ukr,
-            street.name_ukr,
+
+
+async def listing_fingerprints(listing: ListingModel) -> tuple[str, str]:
+    first_name, last_name, patronymic, birth_date, document_path, city_name, street_name = ownership_args(listing)
+    return (
+        await content_fingerprint(listing.name, listing.description, listing_image_paths(listing)),
+        await ownership_fingerprint(
+            document_path, first_name, last_name, patronymic, birth_date, city_name, street_name
+        ),
+    )
+
+
+def content_result_verdict(result: TextVerificationGptResult) -> Verdict:
+    return Verdict(result.is_ok, result.reason_details)
+
+
+def ownership_result_verdict(result: OwnershipVerificationGptResult) -> Verdict:
+    return Verdict(bool(result.valid and result.belongs_to_user and not result.error_details), result.error_details)
+
+
+def listing_values(content_verdict: Verdict, ownership_verdict: Verdict) -> dict:
+    if not content_verdict.is_ok:
+        return discard_listing_values(
+            f"Ваше оголошення не пройшло модерацію. Причина: {content_verdict.reason or '-'}"
+        )
+
+    if not ownership_verdict.is_ok:
+        return discard_listing_values(
+            f"Ваше фото документу 'Право власності' не пройшло модерацію. Причина: {ownership_verdict.reason or '-'}"
         )
-        if not verification_result.valid or not verification_result.belongs_to_user or verification_result.error_details:
-            await discard_listing_service(
-                listing,
-                discard_reason=f"Ваше фото документу 'Право власності' не пройшло модерацію. Причина: {verification_result.error_details or '-'}"
-            )
-            continue
-
-        listing.listing_status_id = ACTIVE_STATUS_ID
-        await ListingService.save(listing)
+
+    return {"listing_status_id": ACTIVE_STATUS_ID}
+
+
+async def moderate_listing(listing: Optional[ListingModel]) -> Optional[dict]:
+    """
+    Перевіряє оголошення і повертає нові значення полів оголошення,
+    або None, якщо оголошення поки що не можна промодерувати.
+    """
+    if not is_ready_for_moderation(listing):
+        return None
+
+    image_paths = listing_image_paths(listing)
+
+    async def verify_content():
+        local_verdict = await pre_moderate(
+            f"{listing.name}\n{listing.description}", image_paths, config.PRE_MODERATION_MIN_TEXT_LENGTH
+        )
+        if local_verdict:
+            return local_verdict
+
+        result = await text_and_image_verification(content_text(listing), image_paths)
+        if not result.is_ok and result.images_rejected:
+            await remember_rejected_images(image_paths)
+        return content_result_verdict(result)
+
+    async def verify_ownership():
+        return ownership_result_verdict(await ownership_documents_verification(*ownership_args(listing)))
+
+    content_key, ownership_key = await listing_fingerprints(listing)
+    # Вердикти для незмінного вмісту беремо з кешу, тож правка ціни не запускає повторну перевірку GPT.
+    # Перевірки контенту і документа незалежні, тому виконуємо їх паралельно
+    content_verdict, ownership_verdict = await asyncio.gather(
+        cached_check(CONTENT_CHECK, content_key, verify_content),
+        cached_check(OWNERSHIP_CHECK, ownership_key, verify_ownership)
+    )
+    return listing_values(content_verdict, ownership_verdict)
+
+
+def queue_seconds(job: ModerationJobModel) -> float:
+    return (datetime.datetime.now(datetime.timezone.utc) - job.queued_at).total_seconds()
+
+
+def observe_claimed_jobs(jobs: list[ModerationJobModel]):
+    # Час в черзі до першого взяття задачі; повторні спроби рахує moderation_decision_seconds
+    for job in jobs:
+        if job.attempts == 1:
+            metrics.observe("moderation_queue_seconds", queue_seconds(job), priority=job.priority)
+
+
+def observe_decided_job(job: ModerationJobModel):
+    metrics.observe("moderation_decision_seconds", queue_seconds(job), priority=job.priority)
+
+
+async def process_moderation_job(job: ModerationJobModel, listing: Optional[ListingModel]) -> bool:
+    if job.attempts > config.MODERATION_MAX_ATTEMPTS:
+        # Задачу вже кілька разів забирали і не завершили (воркер падав) — в dead-letter
+        await ModerationJobService.fail(job, job.last_error or "visibility timeout", config.MODERATION_MAX_ATTEMPTS, 0)
+        return False
+
+    try:
+        listing_values = await moderate_listing(listing)
+    except Exception as e:
+        print(f"[{datetime.datetime.now()}] moderation of listing {job.listing_id} failed: {e!r}")
+        await ModerationJobService.fail(
+            job,
+            repr(e),
+            config.MODERATION_MAX_ATTEMPTS,
+            backoff_delay(job.attempts, config.MODERATION_RETRY_BASE_DELAY, config.MODERATION_RETRY_MAX_DELAY)
+        )
+        return False
+
+    if await ModerationJobService.complete(job, listing_values):
+        observe_decided_job(job)
+    return True
+
+
+async def worker_moderate_listings() -> bool:
+    """
+    Обробляє одну порцію задач модерації.
+    Повертає True, якщо порція була повною і в черзі можуть залишатися задачі.
+    """
+    async with track_job_run("worker_moderate_listings", record_empty=False) as job_run:
+        # Беремо не більше задач, ніж перевіряється одночасно: кожна задача стартує одразу після взяття,
+        # тож MODERATION_VISIBILITY_TIMEOUT не спливає, поки задача чекає на вільне місце
+        jobs = await ModerationJobService.claim(config.MODERATION_CONCURRENCY, config.MODERATION_VISIBILITY_TIMEOUT)
+        if not jobs:
+            return False
+        print(f"[{datetime.datetime.now()}] worker_moderate_listings: {len(jobs)} задач")
+        observe_claimed_jobs(jobs)
+        job_run.seen = len(jobs)
+
+        listings = await ListingService.select_for_moderation([job.listing_id for job in jobs])
+        results = await asyncio.gather(*(process_moderation_job(job, listings.get(job.listing_id)) for job in jobs))
+        job_run.processed = sum(results)
+        job_run.failed = len(results) - job_run.processed
+        return len(jobs) == config.MODERATION_CONCURRENCY
+
+
+moderation_wakeup = WorkerWakeup("worker_moderate_listings", worker_moderate_listings)
+moderation_listener = PgListener(MODERATION_JOBS_CHANNEL, moderation_wakeup.wake)
+
+
+async def enqueue_pending_moderation():
+    """
+    Резервний обхід на випадок втраченого NOTIFY: ставить у чергу оголошення на модерації без задачі
+    (наприклад, змінені напряму в базі).
+    """
+    await ModerationJobService.enqueue_pending_listings(MODERATION_STATUS_ID)
+    moderation_wakeup.wake()
+
+
+async def poll_moderation_queue():
+    # Будить воркер кожного процесу: страхує від втраченого NOTIFY і підхоплює відкладені повторні спроби
+    moderation_wakeup.wake()
+
+
+def start_moderation_worker():
+    moderation_wakeup.start()
+    moderation_listener.start()
+
+
+async def stop_moderation_worker():
+    await moderation_listener.stop()
+    await moderation_wakeup.stop()
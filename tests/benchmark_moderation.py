@@ -0,0 +1,178 @@
+"""
+Бенчмарк пропускної здатності модерації оголошень на фейковому OpenAI API (tests/fake_openai.py).
+
+Створює N оголошень у статусі "На модерації" і викликає worker_moderate_listings,
+поки всі вони не будуть промодеровані. Пише в базу з налаштувань застосунку, тому запускається
+лише на тестовій базі, назву якої треба підтвердити аргументом --database:
+    python -m tests.benchmark_moderation --database easyrent_test --listings 200 --run-time 2 --concurrency 8
+"""
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from PIL import Image
+from sqlalchemy import insert, select, func, delete, tuple_
+
+from config import config
+from db.base import async_session_maker
+from db.models import UserModel, CityModel, StreetModel, ListingModel, ImageModel, OpenAIFileModel, \
+    ModerationVerdictModel, RejectedImageModel
+from db.services.main_services import ModerationJobService, ListingService
+from listing_app.schemes import MODERATION_STATUS_ID
+from services import gpt_services
+from services.metrics import metrics
+from services.moderation_cache import CONTENT_CHECK, OWNERSHIP_CHECK
+from services.pre_moderation import image_hashes
+from services.worker_moderate_listings import worker_moderate_listings, listing_fingerprints
+from tests.fake_openai import FakeOpenAI, create_client
+from utils import street_search_key, street_search_key_latin
+
+LISTING_PHOTOS_DIR = Path("static/listing_photos")
+
+
+def make_photo(path: Path, index: int):
+    # Різні кольори, щоб фото не збігались між оголошеннями і кеші не спрацьовували
+    Image.new("RGB", (640, 480), (index % 256, (index // 256) % 256, 128)).save(path, "JPEG")
+
+
+async def seed(count: int, tag: str, documents_dir: Path) -> dict:
+    LISTING_PHOTOS_DIR.mkdir(parents=True, exist_ok=True)
+    async with async_session_maker() as session:
+        owner_id = (await session.execute(insert(UserModel).values(
+            email=f"{tag}@benchmark.local", password="-", first_name="Бенчмарк", last_name="Тестовий",
+            patronymic="Іванович", birth_date="1990-01-01", phone=tag, role=1, is_verified=True
+        ).returning(UserModel.id))).scalar_one()
+        city_id = (await session.execute(
+            insert(CityModel).values(name_ukr=f"Місто {tag}").returning(CityModel.id)
+        )).scalar_one()
+        street_id = (await session.execute(
+            insert(StreetModel).values(
+                name_ukr=f"вул. {tag}", search_key=street_search_key(f"вул. {tag}"),
+                search_key_latin=street_search_key_latin(f"вул. {tag}"), city_id=city_id
+            ).returning(StreetModel.id)
+        )).scalar_one()
+
+        listings = []
+        for index in range(count):
+            document_path = documents_dir / f"document_{index}.jpg"
+            make_photo(document_path, index)
+            listings.append({
+                "name": f"Квартира {index}",
+                "description": f"Затишна квартира для бенчмарку модерації {tag}, номер {index}",
+                "price": 10000 + index, "city_id": city_id, "street_id": street_id, "building": "1",
+                "floor": 1, "all_floors": 9, "rooms": 2, "square": 50, "communal": 1000,
+                "owner_id": owner_id, "listing_status_id": MODERATION_STATUS_ID,
+                "document_ownership_path": str(document_path),
+            })
+        listing_ids = (await session.execute(
+            insert(ListingModel).values(listings).returning(ListingModel.id)
+        )).scalars().all()
+
+        images = []
+        for index, listing_id in enumerate(listing_ids):
+            image_url = f"{tag}_{index}.jpg"
+            make_photo(LISTING_PHOTOS_DIR / image_url, count + index)
+            images.append({"listing_id": listing_id, "image_url": image_url})
+        await session.execute(insert(ImageModel).values(images))
+        await session.commit()
+
+    return {"owner_id": owner_id, "city_id": city_id, "listing_ids": listing_ids}
+
+
+async def cleanup(seeded: dict, tag: str):
+    # Вердикти і хеші відхилених фото синтетичних оголошень не повинні впливати на справжню модерацію
+    verdict_keys = []
+    for listing in (await ListingService.select_for_moderation(seeded["listing_ids"])).values():
+        content_key, ownership_key = await listing_fingerprints(listing)
+        verdict_keys += [(CONTENT_CHECK, content_key), (OWNERSHIP_CHECK, ownership_key)]
+    photo_hashes = await image_hashes([str(path) for path in LISTING_PHOTOS_DIR.glob(f"{tag}_*.jpg")])
+
+    async with async_session_maker() as session:
+        if verdict_keys:
+            await session.execute(delete(ModerationVerdictModel).where(
+                tuple_(ModerationVerdictModel.kind, ModerationVerdictModel.fingerprint).in_(verdict_keys)
+            ))
+        if photo_hashes:
+            await session.execute(delete(RejectedImageModel).where(RejectedImageModel.image_hash.in_(photo_hashes)))
+        await session.execute(delete(UserModel).where(UserModel.id == seeded["owner_id"]))
+        await session.execute(delete(CityModel).where(CityModel.id == seeded["city_id"]))
+        # Ідентифікатори файлів фейкового API не повинні потрапити в кеш завантажень
+        await session.execute(delete(OpenAIFileModel).where(OpenAIFileModel.file_id.like("file_fake%")))
+        await session.commit()
+    for path in LISTING_PHOTOS_DIR.glob(f"{tag}_*.jpg"):
+        path.unlink()
+
+
+async def count_in_moderation(listing_ids: list[int]) -> int:
+    async with async_session_maker() as session:
+        return (await session.execute(
+            select(func.count()).select_from(ListingModel).where(
+                ListingModel.id.in_(listing_ids), ListingModel.listing_status_id == MODERATION_STATUS_ID
+            )
+        )).scalar_one()
+
+
+async def main(args):
+    if args.database != config.DB_NAME:
+        raise SystemExit(
+            f"Бенчмарк пише в базу {config.DB_NAME!r}. Якщо це тестова база, передайте --database {config.DB_NAME}"
+        )
+
+    config.MODERATION_CONCURRENCY = args.concurrency
+    config.GPT_BACKEND = args.backend
+    fake = FakeOpenAI(
+        latency=args.latency,
+        queue_time=args.queue_time,
+        run_time=args.run_time,
+        error_rate=args.error_rate,
+        run_failure_rate=args.run_failure_rate,
+        seed=42,
+    )
+    gpt_services.client = create_client(fake)
+
+    tag = f"bench_{uuid.uuid4().hex[:8]}"
+    documents_dir = Path(tempfile.mkdtemp(prefix=f"{tag}_"))
+    seeded = await seed(args.listings, tag, documents_dir)
+    print(f"Створено {args.listings} оголошень на модерації ({tag})")
+
+    try:
+        await ModerationJobService.enqueue_pending_listings(MODERATION_STATUS_ID)
+        started = time.perf_counter()
+        worker_calls = 0
+        remaining = args.listings
+        while remaining and time.perf_counter() - started < args.timeout:
+            await worker_moderate_listings()
+            worker_calls += 1
+            remaining = await count_in_moderation(seeded["listing_ids"])
+        elapsed = time.perf_counter() - started
+    finally:
+        await cleanup(seeded, tag)
+        shutil.rmtree(documents_dir, ignore_errors=True)
+
+    moderated = args.listings - remaining
+    snapshot = metrics.snapshot()
+    print(f"Промодеровано: {moderated}/{args.listings} за {elapsed:.2f} с ({moderated / elapsed:.2f} оголошень/с)")
+    print(f"Викликів воркера: {worker_calls}")
+    print(f"Фейковий API: {fake.stats()}")
+    for key, histogram in sorted(snapshot["histograms"].items()):
+        if key.startswith(("gpt_call_seconds", "gpt_phase_seconds")):
+            print(f"  {key}: p50={histogram['p50']:.3f} p95={histogram['p95']:.3f} max={histogram['max']:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк worker_moderate_listings на фейковому OpenAI API")
+    parser.add_argument("--database", required=True, help="назва тестової бази з DB_NAME — підтвердження запису в неї")
+    parser.add_argument("--listings", type=int, default=100)
+    parser.add_argument("--backend", choices=["assistants", "chat"], default=config.GPT_BACKEND)
+    parser.add_argument("--concurrency", type=int, default=config.MODERATION_CONCURRENCY)
+    parser.add_argument("--latency", type=float, default=0.05, help="затримка кожного запиту до API, с")
+    parser.add_argument("--queue-time", type=float, default=0.5, help="скільки run у статусі queued, с")
+    parser.add_argument("--run-time", type=float, default=2, help="скільки run у статусі in_progress, с")
+    parser.add_argument("--error-rate", type=float, default=0, help="частка запитів з HTTP 500")
+    parser.add_argument("--run-failure-rate", type=float, default=0, help="частка run, що завершуються failed")
+    parser.add_argument("--timeout", type=float, default=600, help="максимальний час бенчмарку, с")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,9 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+
+@pytest.fixture(autouse=True)
+def job_run_history():
+    # Фонові задачі записують історію запусків у базу; в тестах запис лише перевіряється
+    with patch("services.job_runs.JobRunService.add", new=AsyncMock()) as mock_add:
+        yield mock_add
@@ -0,0 +1,429 @@
+"""
+Локальна заміна OpenAI API для тестів і бенчмарків: Assistants (assistants, files, threads,
+messages, runs), Chat Completions для режиму GPT_BACKEND=chat і Batch API для пакетної модерації.
+
+Запуск окремим сервером:
+    python -m tests.fake_openai --port 8001 --latency 0.05 --run-time 2 --error-rate 0.01
+і в .env застосунку:
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Callable, Optional
+
+from fastapi import APIRouter, FastAPI, Request, UploadFile, Form
+from fastapi.responses import JSONResponse, Response
+
+INJECTED_FAILURE = {"error": {"message": "injected failure", "type": "server_error", "code": None}}
+
+APPROVE_ALL = {
+    # Поля всіх трьох результатів перевірки: паспорт, право власності, текст і фото
+    "image_quality": "high",
+    "valid_data": True,
+    "first_name": "Іван",
+    "second_name": "Іваненко",
+    "patronymic": "Іванович",
+    "birth_date": "1990-01-01",
+    "is_front_side": True,
+    "valid": True,
+    "belongs_to_user": True,
+    "error_details": "",
+    "is_ok": True,
+    "reason_details": "",
+    "images_rejected": False,
+}
+
+
+def approve_all(assistant_id: str, user_text: str) -> dict:
+    return APPROVE_ALL
+
+
+class FakeOpenAI:
+    """
+    Стан фейкового API в пам'яті. Статус run залежить лише від часу:
+    queued протягом queue_time, in_progress ще run_time, далі completed (або failed
+    з імовірністю run_failure_rate). Chat Completions відповідає через queue_time + run_time
+    (або HTTP 500 з імовірністю run_failure_rate). Batch проходить validating і in_progress
+    за той самий час, далі completed (рядки з помилками — з імовірністю run_failure_rate)
+    або failed з імовірністю batch_failure_rate. error_rate — частка запитів з HTTP 500.
+    """
+
+    def __init__(
+            self,
+            latency: float = 0,
+            queue_time: float = 0,
+            run_time: float = 0,
+            error_rate: float = 0,
+            run_failure_rate: float = 0,
+            batch_failure_rate: float = 0,
+            responder: Callable[[str, str], dict] = approve_all,
+            seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.queue_time = queue_time
+        self.run_time = run_time
+        self.error_rate = error_rate
+        self.run_failure_rate = run_failure_rate
+        self.batch_failure_rate = batch_failure_rate
+        self.responder = responder
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+
+        self.files = {}
+        self.file_contents = {}
+        self.completions = 0
+        self.batches = {}
+        self.threads = {}
+        self.runs = {}
+
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.peak_active_runs = 0
+
+        self.app = self._create_app()
+
+    def _new_id(self, prefix: str) -> str:
+        return f"{prefix}_fake{next(self._ids)}"
+
+    def _run_status(self, run: dict) -> str:
+        if run["final_status"] == "cancelled":
+            return "cancelled"
+        elapsed = time.monotonic() - run["started"]
+        if elapsed < self.queue_time:
+            return "queued"
+        if elapsed < self.queue_time + self.run_time:
+            return "in_progress"
+        return run["final_status"]
+
+    def _active_runs(self) -> int:
+        return sum(self._run_status(run) in ("queued", "in_progress") for run in self.runs.values())
+
+    def _serialize_run(self, run: dict) -> dict:
+        status = self._run_status(run)
+        if status == "completed" and not run["answered"]:
+            self._answer(run)
+        return {
+            "id": run["id"],
+            "object": "thread.run",
+            "created_at": run["created_at"],
+            "thread_id": run["thread_id"],
+            "assistant_id": run["assistant_id"],
+            "status": status,
+            "last_error": {"code": "server_error", "message": "injected failure"} if status == "failed" else None,
+            "usage": run["usage"] if status == "completed" else None,
+            "model": "fake-gpt",
+            "instructions": "",
+            "tools": [],
+            "parallel_tool_calls": True,
+        }
+
+    def _answer(self, run: dict):
+        messages = self.threads[run["thread_id"]]
+        user_text = "\n".join(
+            part["text"]
+            for message in messages if message["role"] == "user"
+            for part in message["content"] if part["type"] == "text"
+        )
+        self._add_message(run["thread_id"], "assistant", json.dumps(self.responder(run["assistant_id"], user_text)))
+        run["answered"] = True
+
+    def _add_message(self, thread_id: str, role: str, text: str, images: list = None):
+        content = [{"type": "text", "text": text}] + [
+            {"type": "image_file", "image_file": {"file_id": file_id}} for file_id in images or []
+        ]
+        self.threads[thread_id].append({
+            "id": self._new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "content": content,
+        })
+
+    @staticmethod
+    def _serialize_message(message: dict) -> dict:
+        content = [
+            {"type": "text", "text": {"value": part["text"], "annotations": []}} if part["type"] == "text" else part
+            for part in message["content"]
+        ]
+        return {**message, "content": content, "attachments": [], "metadata": {}, "status": "completed"}
+
+    @staticmethod
+    def _instructions(assistant_id: str) -> str:
+        return f"Fake instructions for {assistant_id}"
+
+    def _chat_completion(self, body: dict) -> dict:
+        system_prompt = next(m["content"] for m in body["messages"] if m["role"] == "system")
+        assistant_id = system_prompt.removeprefix(self._instructions(""))
+        user_content = next(m["content"] for m in body["messages"] if m["role"] == "user")
+        user_text = "\n".join(part["text"] for part in user_content if part["type"] == "text")
+
+        answer = self.responder(assistant_id, user_text)
+        # Як і strict-режим OpenAI, повертаємо рівно поля зі схеми відповіді
+        schema_fields = body["response_format"]["json_schema"]["schema"]["properties"]
+        answer = {field: answer[field] for field in schema_fields if field in answer}
+
+        prompt_tokens = 100 + 10 * len(user_content)
+        return {
+            "id": self._new_id("chatcmpl"),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": json.dumps(answer), "refusal": None},
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 40, "total_tokens": prompt_tokens + 40},
+        }
+
+    def _batch_status(self, batch: dict) -> str:
+        elapsed = time.monotonic() - batch["started"]
+        if elapsed < self.queue_time:
+            return "validating"
+        if elapsed < self.queue_time + self.run_time:
+            return "in_progress"
+        return batch["final_status"]
+
+    def _run_batch(self, batch: dict):
+        """Виконує всі рядки batch; частка run_failure_rate рядків потрапляє у файл помилок."""
+        output, errors = [], []
+        for line in self.file_contents[batch["input_file_id"]].decode().splitlines():
+            request = json.loads(line)
+            if self._random.random() < self.run_failure_rate:
+                errors.append({
+                    "id": self._new_id("batch_req"),
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 500, "request_id": "", "body": INJECTED_FAILURE},
+                    "error": None,
+                })
+                continue
+            self.completions += 1
+            output.append({
+                "id": self._new_id("batch_req"),
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": "", "body": self._chat_completion(request["body"])},
+                "error": None,
+            })
+
+        for key, lines in (("output_file_id", output), ("error_file_id", errors)):
+            if lines:
+                file_id = self._new_id("file")
+                self.file_contents[file_id] = "\n".join(json.dumps(line) for line in lines).encode()
+                batch[key] = file_id
+        batch["request_counts"] = {"total": len(output) + len(errors), "completed": len(output), "failed": len(errors)}
+
+    def _serialize_batch(self, batch: dict) -> dict:
+        status = self._batch_status(batch)
+        if status == "completed" and "request_counts" not in batch:
+            self._run_batch(batch)
+        return {
+            "id": batch["id"],
+            "object": "batch",
+            "endpoint": batch["endpoint"],
+            "input_file_id": batch["input_file_id"],
+            "completion_window": batch["completion_window"],
+            "created_at": batch["created_at"],
+            "status": status,
+            "output_file_id": batch["output_file_id"],
+            "error_file_id": batch["error_file_id"],
+            "request_counts": batch.get("request_counts", {"total": 0, "completed": 0, "failed": 0}),
+        }
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI(title="Fake OpenAI")
+        router = APIRouter(prefix="/v1")
+
+        @app.middleware("http")
+        async def inject_latency_and_errors(request: Request, call_next):
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if self.error_rate and self._random.random() < self.error_rate:
+                    return JSONResponse(
+                        {"error": {"message": "injected error", "type": "server_error", "code": None}},
+                        status_code=500
+                    )
+                return await call_next(request)
+            finally:
+                self.in_flight -= 1
+
+        @router.get("/assistants/{assistant_id}")
+        async def retrieve_assistant(assistant_id: str):
+            return {
+                "id": assistant_id,
+                "object": "assistant",
+                "created_at": int(time.time()),
+                "model": "fake-gpt",
+                "instructions": self._instructions(assistant_id),
+                "tools": [],
+            }
+
+        @router.post("/chat/completions")
+        async def create_chat_completion(request: Request):
+            body = await request.json()
+            self.completions += 1
+            await asyncio.sleep(self.queue_time + self.run_time)
+            if self._random.random() < self.run_failure_rate:
+                return JSONResponse(INJECTED_FAILURE, status_code=500)
+            return self._chat_completion(body)
+
+        @router.post("/batches")
+        async def create_batch(request: Request):
+            body = await request.json()
+            batch_id = self._new_id("batch")
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "input_file_id": body["input_file_id"],
+                "endpoint": body["endpoint"],
+                "completion_window": body["completion_window"],
+                "created_at": int(time.time()),
+                "started": time.monotonic(),
+                "final_status": "failed" if self._random.random() < self.batch_failure_rate else "completed",
+                "output_file_id": None,
+                "error_file_id": None,
+            }
+            return self._serialize_batch(self.batches[batch_id])
+
+        @router.get("/batches/{batch_id}")
+        async def retrieve_batch(batch_id: str):
+            return self._serialize_batch(self.batches[batch_id])
+
+        @router.get("/files/{file_id}/content")
+        async def file_content(file_id: str):
+            return Response(self.file_contents[file_id], media_type="application/jsonl")
+
+        @router.post("/files")
+        async def create_file(file: UploadFile, purpose: str = Form(...)):
+            content = await file.read()
+            file_id = self._new_id("file")
+            if purpose == "batch":
+                self.file_contents[file_id] = content
+            self.files[file_id] = {
+                "id": file_id,
+                "object": "file",
+                "bytes": len(content),
+                "created_at": int(time.time()),
+                "filename": file.filename,
+                "purpose": purpose,
+                "status": "processed",
+            }
+            return self.files[file_id]
+
+        @router.delete("/files/{file_id}")
+        async def delete_file(file_id: str):
+            if self.files.pop(file_id, None) is None:
+                return JSONResponse({"error": {"message": "No such file", "type": "invalid_request_error"}}, status_code=404)
+            return {"id": file_id, "object": "file", "deleted": True}
+
+        @router.post("/threads")
+        async def create_thread():
+            thread_id = self._new_id("thread")
+            self.threads[thread_id] = []
+            return {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}}
+
+        @router.post("/threads/{thread_id}/messages")
+        async def create_message(thread_id: str, request: Request):
+            body = await request.json()
+            text = "\n".join(part["text"] for part in body["content"] if part["type"] == "text")
+            images = [part["image_file"]["file_id"] for part in body["content"] if part["type"] == "image_file"]
+            self._add_message(thread_id, body["role"], text, images)
+            return self._serialize_message(self.threads[thread_id][-1])
+
+        @router.get("/threads/{thread_id}/messages")
+        async def list_messages(thread_id: str, order: str = "desc"):
+            messages = [self._serialize_message(message) for message in self.threads[thread_id]]
+            if order == "desc":
+                messages.reverse()
+            return {
+                "object": "list",
+                "data": messages,
+                "first_id": messages[0]["id"] if messages else None,
+                "last_id": messages[-1]["id"] if messages else None,
+                "has_more": False,
+            }
+
+        @router.post("/threads/{thread_id}/runs")
+        async def create_run(thread_id: str, request: Request):
+            body = await request.json()
+            run_id = self._new_id("run")
+            prompt_tokens = 100 + 10 * sum(len(message["content"]) for message in self.threads[thread_id])
+            self.runs[run_id] = {
+                "id": run_id,
+                "thread_id": thread_id,
+                "assistant_id": body["assistant_id"],
+                "created_at": int(time.time()),
+                "started": time.monotonic(),
+                "final_status": "failed" if self._random.random() < self.run_failure_rate else "completed",
+                "answered": False,
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 40, "total_tokens": prompt_tokens + 40},
+            }
+            self.peak_active_runs = max(self.peak_active_runs, self._active_runs())
+            return self._serialize_run(self.runs[run_id])
+
+        @router.get("/threads/{thread_id}/runs/{run_id}")
+        async def retrieve_run(thread_id: str, run_id: str):
+            return self._serialize_run(self.runs[run_id])
+
+        @router.post("/threads/{thread_id}/runs/{run_id}/cancel")
+        async def cancel_run(thread_id: str, run_id: str):
+            self.runs[run_id]["final_status"] = "cancelled"
+            return self._serialize_run(self.runs[run_id])
+
+        app.include_router(router)
+        return app
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "peak_in_flight_requests": self.peak_in_flight,
+            "peak_active_runs": self.peak_active_runs,
+            "runs": len(self.runs),
+            "batches": len(self.batches),
+            "completions": self.completions,
+            "files": len(self.files),
+        }
+
+
+def create_client(fake: FakeOpenAI, **kwargs):
+    """AsyncOpenAI, що звертається до фейкового API в тому ж процесі, без мережі."""
+    import httpx
+    import openai
+
+    return openai.AsyncOpenAI(
+        api_key="fake",
+        base_url="http://fake-openai/v1",
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=fake.app), base_url="http://fake-openai/v1"),
+        **kwargs
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI Assistants API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.05, help="затримка кожного запиту, с")
+    parser.add_argument("--queue-time", type=float, default=0.5, help="скільки run перебуває у статусі queued, с")
+    parser.add_argument("--run-time", type=float, default=2, help="скільки run перебуває у статусі in_progress, с")
+    parser.add_argument("--error-rate", type=float, default=0, help="частка запитів з HTTP 500")
+    parser.add_argument("--run-failure-rate", type=float, default=0, help="частка run, що завершуються failed")
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(
+        latency=args.latency,
+        queue_time=args.queue_time,
+        run_time=args.run_time,
+        error_rate=args.error_rate,
+        run_failure_rate=args.run_failure_rate,
+    )
+    uvicorn.run(fake.app, host=args.host, port=args.port)
@@ -0,0 +1,107 @@
+"""
+Локальний SMTP-сервер для тестів і перевірки розсилки: приймає EHLO, AUTH PLAIN/LOGIN
+і листи, зберігаючи їх у пам'яті. STARTTLS не підтримує, тож застосунку потрібно
+EMAIL_SMTP_STARTTLS=false.
+
+Запуск окремим сервером:
+    python -m tests.fake_smtp --port 8025 --latency 0.05
+"""
+import argparse
+import asyncio
+from email import message_from_bytes
+
+
+class FakeSmtpServer:
+    def __init__(self, latency: float = 0, close_after: int = 0):
+        self.latency = latency
+        # Закривати з'єднання після стількох листів, імітуючи розрив з боку сервера
+        self.close_after = close_after
+        # Адреси, які сервер відхиляє на RCPT TO
+        self.refused_recipients = set()
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self._server = None
+        self._writers = set()
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        # Інакше wait_closed чекатиме, поки клієнти самі закриють з'єднання з пулу
+        for writer in self._writers:
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        received = 0
+
+        async def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 fake smtp ready")
+        try:
+            while line := await reader.readline():
+                command = line.decode().strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb in ("EHLO", "HELO"):
+                    await reply("250-fake smtp\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+                elif verb == "AUTH":
+                    self.logins += 1
+                    if command.upper().startswith("AUTH LOGIN"):
+                        await reply("334 VXNlcm5hbWU6")
+                        await reader.readline()
+                        await reply("334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    await reply("235 authenticated")
+                elif verb == "DATA":
+                    await reply("354 end with <CRLF>.<CRLF>")
+                    data = b""
+                    while (chunk := await reader.readline()) not in (b".\r\n", b""):
+                        data += chunk
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    self.messages.append(message_from_bytes(data))
+                    received += 1
+                    await reply("250 queued")
+                    if self.close_after and received >= self.close_after:
+                        break
+                elif verb == "RCPT" and any(f"<{address}>" in command for address in self.refused_recipients):
+                    await reply("550 no such user")
+                elif verb == "QUIT":
+                    await reply("221 bye")
+                    break
+                else:
+                    # MAIL, RCPT, RSET, NOOP
+                    await reply("250 ok")
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+async def main(args):
+    server = await FakeSmtpServer(latency=args.latency).start(args.host, args.port)
+    print(f"Фейковий SMTP-сервер на {args.host}:{server.port}")
+    try:
+        while True:
+            await asyncio.sleep(5)
+            print(f"з'єднань: {server.connections}, листів: {len(server.messages)}")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Фейковий SMTP-сервер")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=0, help="затримка прийому кожного листа, с")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,66 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.dialects import postgresql
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import admin_app
+from auth_app.deps import get_admin_user
+from listing_app.schemes import DISCARD_STATUS_ID, MODERATION_STATUS_ID
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def admin_client():
+    app = FastAPI()
+    app.include_router(admin_app.router)
+    app.dependency_overrides[get_admin_user] = lambda: MagicMock(id=1)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def make_listing(status_id):
+    listing = MagicMock(id=5, owner_id=3, listing_status_id=status_id, images=[MagicMock(image_url="a.jpg")],
+                        description="Затишна квартира")
+    listing.name = "Квартира"
+    listing.owner = MagicMock(is_verified=True)
+    return listing
+
+
+@pytest.fixture
+def unblock_mocks():
+    with patch("admin_app.routes.forget_rejected_images", new=AsyncMock(return_value=2)) as forget_images, \
+         patch("admin_app.routes.content_fingerprint", new=AsyncMock(return_value="abc")) as fingerprint, \
+         patch("admin_app.routes.ModerationVerdictService.forget", new=AsyncMock()) as forget_verdict, \
+         patch("admin_app.routes.ModerationJobService.enqueue", new=AsyncMock()) as enqueue:
+        yield forget_images, fingerprint, forget_verdict, enqueue
+
+
+@pytest.mark.parametrize("status_id, requeued", [(MODERATION_STATUS_ID, True), (DISCARD_STATUS_ID, False)])
+async def test_unblock_images_forgets_cached_rejection(admin_client, unblock_mocks, status_id, requeued):
+    forget_images, fingerprint, forget_verdict, enqueue = unblock_mocks
+    listing = make_listing(status_id)
+    with patch("admin_app.routes.ListingService.select_for_moderation", new=AsyncMock(return_value={5: listing})):
+        response = await admin_client.post("/admin/listings/5/unblock-images")
+
+    assert response.status_code == 200
+    forget_images.assert_awaited_once_with(["static/listing_photos/a.jpg"])
+    fingerprint.assert_awaited_once_with("Квартира", "Затишна квартира", ["static/listing_photos/a.jpg"])
+    # Інакше повторна модерація взяла б з кешу ту саму локальну відмову
+    forget_verdict.assert_awaited_once_with("content", "abc")
+    assert enqueue.await_count == requeued
+
+
+@pytest.mark.parametrize("job_id, status_code", [(9, 200), (None, 404)])
+async def test_retry_dead_job_wakes_workers(admin_client, job_id, status_code):
+    session = MagicMock(execute=AsyncMock(return_value=MagicMock(scalar_one_or_none=MagicMock(return_value=job_id))),
+                        commit=AsyncMock())
+    session.__aenter__.return_value = session
+    with patch("admin_app.routes.ModerationJobService.session_maker", new=MagicMock(return_value=session)):
+        response = await admin_client.post("/admin/moderation-jobs/5/retry")
+
+    assert response.status_code == status_code
+    sql = [str(call.args[0].compile(dialect=postgresql.dialect())) for call in session.execute.await_args_list]
+    # Воркери дізнаються про задачу одразу після commit, а не з резервного опитування
+    assert any("pg_notify" in statement for statement in sql) == (job_id is not None)
+    session.commit.assert_awaited_once()
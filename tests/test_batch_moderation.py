@@ -0,0 +1,191 @@
+import datetime
+import re
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from PIL import Image
+
+from listing_app.schemes import ACTIVE_STATUS_ID, DISCARD_STATUS_ID, MODERATION_STATUS_ID
+from services import gpt_services, worker_batch_moderation
+from tests.fake_openai import FakeOpenAI, create_client
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def batch_mode(monkeypatch, tmp_path):
+    monkeypatch.setattr(worker_batch_moderation.config, "MODERATION_BATCH_MODE", True)
+    monkeypatch.setattr(worker_batch_moderation.config, "MODERATION_BATCH_THRESHOLD", 2)
+    monkeypatch.setattr(gpt_services, "_assistants", {})
+    monkeypatch.setattr("services.image_preprocessing.CACHE_DIR", tmp_path / "cache")
+    with patch("services.moderation_cache.file_sha256", new=lambda path: f"hash:{path}"), \
+         patch("services.pre_moderation.RejectedImageService.has_similar", new=AsyncMock(return_value=False)):
+        yield
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    fake = FakeOpenAI(responder=lambda assistant_id, text: {
+        "is_ok": "спам" not in text, "reason_details": "спам", "images_rejected": "фото" in text,
+        "valid": True, "belongs_to_user": True, "error_details": ""
+    })
+    monkeypatch.setattr(gpt_services, "client", create_client(fake))
+    return fake
+
+
+@pytest.fixture
+def document(tmp_path):
+    path = tmp_path / "document.jpg"
+    Image.new("RGB", (400, 300), (10, 20, 30)).save(path)
+    return str(path)
+
+
+def make_listing(listing_id, description, document_path, owner_id=1):
+    listing = MagicMock(id=listing_id, description=description, document_ownership_path=document_path,
+                        listing_status_id=MODERATION_STATUS_ID, images=[])
+    listing.name = f"Квартира {listing_id}"
+    listing.owner = MagicMock(id=owner_id, first_name="Іван", last_name="Іваненко", patronymic="Іванович",
+                              birth_date="1990-01-01")
+    listing.city = MagicMock(name_ukr="Київ")
+    listing.street = MagicMock(name_ukr="вул. Хрещатик")
+    return listing
+
+
+def make_job(job_id, listing_id):
+    return MagicMock(id=job_id, listing_id=listing_id, version=1, attempts=1, priority=0,
+                     queued_at=datetime.datetime.now(datetime.timezone.utc))
+
+
+@pytest.fixture
+def verdict_store():
+    verdicts = {}
+
+    async def select_many(keys):
+        return {key: verdicts[key] for key in keys if key in verdicts}
+
+    async def remember_many(rows):
+        for row in rows:
+            verdicts[(row["kind"], row["fingerprint"])] = MagicMock(is_ok=row["is_ok"], reason=row["reason"])
+
+    with patch.object(worker_batch_moderation.ModerationVerdictService, "select_many", new=select_many), \
+         patch.object(worker_batch_moderation.ModerationVerdictService, "remember_many", new=remember_many):
+        yield verdicts
+
+
+async def test_build_batch_requests_deduplicates_and_skips_local_rejections(monkeypatch, fake_api, verdict_store, document):
+    monkeypatch.setattr("services.pre_moderation.SPAM_PATTERNS", [re.compile(r"www\.")])
+    listings = {
+        1: make_listing(1, "Затишна квартира біля метро", document),
+        2: make_listing(2, "Затишна квартира біля метро", document),
+        3: make_listing(3, "Пишіть на www.example.com", document),
+    }
+    listings[2].name = listings[1].name
+
+    chunks = [chunk async for chunk in worker_batch_moderation.build_batch_requests(listings)]
+
+    assert len(chunks) == 1
+    requests, listing_ids = chunks[0]
+    assert listing_ids == {1, 2, 3}
+    kinds = sorted(custom_id.split(":")[0] for custom_id in requests)
+    # Однаковий вміст і документ — один запит, спам відхилено локально
+    assert kinds == ["content", "ownership"]
+    assert [verdict.is_ok for verdict in verdict_store.values()] == [False]
+    body = next(iter(requests.values()))
+    assert body["response_format"]["json_schema"]["strict"] is True
+
+
+async def test_batch_is_submitted_polled_and_applied_in_bulk(fake_api, verdict_store, document):
+    listings = {
+        1: make_listing(1, "Затишна квартира біля метро", document),
+        2: make_listing(2, "Це спам з чужими фото", document),
+    }
+    jobs = [make_job(10 + listing_id, listing_id) for listing_id in listings]
+    batch_record = MagicMock(id=7)
+
+    with patch.object(worker_batch_moderation.ModerationJobService, "count_pending", new=AsyncMock(return_value=2)), \
+         patch.object(worker_batch_moderation.ModerationJobService, "claim", new=AsyncMock(return_value=jobs)), \
+         patch.object(worker_batch_moderation.ModerationJobService, "assign_batch", new=AsyncMock()) as mock_assign, \
+         patch.object(worker_batch_moderation.ModerationJobService, "select_batched", new=AsyncMock(return_value=jobs)), \
+         patch.object(worker_batch_moderation.ModerationJobService, "complete_many", new=AsyncMock(return_value={11, 12})) as mock_complete, \
+         patch.object(worker_batch_moderation.ListingService, "select_for_moderation", new=AsyncMock(return_value=listings)), \
+         patch.object(worker_batch_moderation.ModerationBatchService, "select_active", new=AsyncMock(return_value=[])), \
+         patch.object(worker_batch_moderation.ModerationBatchService, "add", new=AsyncMock(return_value=batch_record)) as mock_add, \
+         patch.object(worker_batch_moderation.ModerationBatchService, "update", new=AsyncMock()) as mock_update, \
+         patch.object(worker_batch_moderation, "remember_rejected_images", new=AsyncMock()) as mock_rejected:
+        await worker_batch_moderation.worker_batch_moderation()
+
+        mock_assign.assert_awaited_once_with([11, 12], 7)
+        assert mock_add.await_args.kwargs["request_count"] == 3
+
+        batch_record.openai_batch_id = mock_add.await_args.kwargs["openai_batch_id"]
+        await worker_batch_moderation.poll_moderation_batch(batch_record)
+
+    assert fake_api.completions == 3
+    values = mock_complete.await_args.args[1]
+    assert values[11] == {"listing_status_id": ACTIVE_STATUS_ID}
+    assert values[12]["listing_status_id"] == DISCARD_STATUS_ID
+    mock_rejected.assert_awaited_once()
+    assert mock_update.await_args.kwargs["status"] == "completed"
+
+
+async def test_large_batch_is_split_by_encoded_size(monkeypatch, fake_api, verdict_store, document):
+    monkeypatch.setattr(worker_batch_moderation.config, "MODERATION_BATCH_MAX_BYTES", 1)
+    listings = {
+        1: make_listing(1, "Затишна квартира біля метро", document),
+        2: make_listing(2, "Простора квартира в центрі", document),
+    }
+    jobs = [make_job(10 + listing_id, listing_id) for listing_id in listings]
+
+    with patch.object(worker_batch_moderation.ModerationJobService, "count_pending", new=AsyncMock(return_value=2)), \
+         patch.object(worker_batch_moderation.ModerationJobService, "claim", new=AsyncMock(return_value=jobs)), \
+         patch.object(worker_batch_moderation.ModerationJobService, "assign_batch", new=AsyncMock()) as mock_assign, \
+         patch.object(worker_batch_moderation.ModerationJobService, "release", new=AsyncMock()) as mock_release, \
+         patch.object(worker_batch_moderation.ListingService, "select_for_moderation", new=AsyncMock(return_value=listings)), \
+         patch.object(worker_batch_moderation.ModerationBatchService, "add",
+                      new=AsyncMock(side_effect=[MagicMock(id=7), MagicMock(id=8)])) as mock_add:
+        await worker_batch_moderation.submit_moderation_batch()
+
+    # Кожне оголошення — окремий batch; спільна перевірка документа потрапляє в обидва
+    assert [call.args for call in mock_assign.await_args_list] == [([11], 7), ([12], 8)]
+    assert [call.kwargs["request_count"] for call in mock_add.await_args_list] == [2, 2]
+    mock_release.assert_not_awaited()
+
+
+async def test_failed_batch_lines_leave_jobs_for_regular_worker(fake_api, verdict_store, document):
+    fake_api.run_failure_rate = 1
+    listings = {1: make_listing(1, "Затишна квартира біля метро", document)}
+    jobs = [make_job(11, 1)]
+    batch = await gpt_services.submit_batch([
+        (worker_batch_moderation.batch_custom_id("content", "x"), {"messages": [], "model": "m"}),
+    ])
+
+    with patch.object(worker_batch_moderation.ModerationJobService, "select_batched", new=AsyncMock(return_value=jobs)), \
+         patch.object(worker_batch_moderation.ModerationJobService, "complete_many", new=AsyncMock(return_value=set())) as mock_complete, \
+         patch.object(worker_batch_moderation.ListingService, "select_for_moderation", new=AsyncMock(return_value=listings)), \
+         patch.object(worker_batch_moderation.ModerationBatchService, "update", new=AsyncMock()):
+        await worker_batch_moderation.poll_moderation_batch(MagicMock(id=7, openai_batch_id=batch.id, request_count=1))
+
+    assert mock_complete.await_args.args[1] == {}
+
+
+async def test_failed_batch_releases_jobs(fake_api):
+    fake_api.batch_failure_rate = 1
+    batch = await gpt_services.submit_batch([("content:x", {"messages": [], "model": "m"})])
+    jobs = [MagicMock(id=11, listing_id=1), MagicMock(id=12, listing_id=2)]
+
+    with patch.object(worker_batch_moderation.ModerationJobService, "select_batched", new=AsyncMock(return_value=jobs)), \
+         patch.object(worker_batch_moderation.ModerationJobService, "release", new=AsyncMock()) as mock_release, \
+         patch.object(worker_batch_moderation.ModerationBatchService, "update", new=AsyncMock()) as mock_update:
+        await worker_batch_moderation.poll_moderation_batch(MagicMock(id=7, openai_batch_id=batch.id))
+
+    mock_release.assert_awaited_once_with([11, 12])
+    assert mock_update.await_args.kwargs["status"] == "failed"
+
+
+async def test_small_queue_is_left_to_regular_worker():
+    with patch.object(worker_batch_moderation.ModerationBatchService, "select_active", new=AsyncMock(return_value=[])), \
+         patch.object(worker_batch_moderation.ModerationJobService, "count_pending", new=AsyncMock(return_value=1)), \
+         patch.object(worker_batch_moderation.ModerationJobService, "claim", new=AsyncMock()) as mock_claim:
+        await worker_batch_moderation.worker_batch_moderation()
+
+    mock_claim.assert_not_awaited()
@@ -0,0 +1,185 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from unittest.mock import AsyncMock, patch
+
+import location_app
+from location_app.data import TOP_CITIES_FULL
+from services.city_index import CityIndex
+
+pytestmark = pytest.mark.asyncio
+
+ROWS = [
+    (1, "Київ", "Kyiv", "м.Київ"),
+    (2, "Кам'янець-Подільський", "Kamianets-Podilskyi", "Хмельницька обл."),
+    (3, "Ізмаїл", "Izmail", "Одеська обл."),
+    (4, "Яготин", "Yahotyn", "Київська обл."),
+    (5, "Ківерці", "Kivertsi", "Волинська обл."),
+    (6, "Іванків", "Ivankiv", "Київська обл."),
+    (7, "Гнідин", None, "Київська обл."),
+    (8, "Ґлева", None, "Київська обл."),
+    (9, "Київ", "Kyiv", "Інша обл."),
+]
+
+
+@pytest.fixture
+def index():
+    index = CityIndex()
+    index.build(ROWS)
+    return index
+
+
+def names(cities: list[dict]) -> list[str]:
+    return [city["name"] for city in cities]
+
+
+async def test_prefix_search_ignores_case_and_sorts_alphabetically(index):
+    assert names(index.search("К")) == ["Кам'янець-Подільський", "Київ", "Київ", "Ківерці"]
+    assert names(index.search("  кИїВ ")) == ["Київ", "Київ"]
+    assert names(index.search("КІ")) == ["Ківерці"]
+    assert index.search("х") == []
+    assert index.search("   ") == []
+
+
+async def test_ukrainian_letters_follow_alphabet_order(index):
+    assert names(index.search("г")) == ["Гнідин"]
+    assert names(index.search("ґ")) == ["Ґлева"]
+    # У Unicode «і» стоїть після «я», але в абетці — перед нею
+    assert names(index.search("і")) == ["Іванків", "Ізмаїл"]
+
+
+async def test_english_names_and_apostrophes_are_searchable(index):
+    assert [city["id"] for city in index.search("kyiv")] == [9, 1]
+    assert names(index.search("кам’янець")) == ["Кам'янець-Подільський"]
+    # Місто, що збіглося обома назвами, повертається один раз
+    assert names(index.search("k", limit=2)) == ["Кам'янець-Подільський", "Київ"]
+
+
+async def test_top_cities_are_matched_by_name_and_oblast(index):
+    assert index.select_by_names(TOP_CITIES_FULL) == [{"id": 1, "name": "Київ", "oblast": "м.Київ"}]
+
+
+async def test_refresh_replaces_index():
+    index = CityIndex()
+    assert not index.loaded
+
+    with patch("services.city_index.CityService.select_for_index", new=AsyncMock(side_effect=[ROWS, ROWS[:1]])), \
+         patch("services.city_index.CityService.dataset_version", new=AsyncMock(side_effect=["v1", "v2"])):
+        await index.refresh()
+        assert len(index) == len(ROWS)
+        await index.refresh()
+
+    assert index.loaded
+    assert index.dataset_version == "v2"
+    assert names(index.search("і")) == []
+    assert names(index.search("k")) == ["Київ"]
+
+
+async def test_route_answers_from_index_without_database(index, monkeypatch):
+    monkeypatch.setattr("location_app.routes.city_index", index)
+    app = FastAPI()
+    app.include_router(location_app.router)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    with patch("location_app.routes.CityService.execute", new=AsyncMock()) as execute:
+        found = await client.get("/location/cities-ukr", params={"q": "Ізм"})
+        top = await client.get("/location/cities-ukr")
+
+    execute.assert_not_awaited()
+    assert found.json() == [{"id": 3, "name": "Ізмаїл", "oblast": "Одеська обл."}]
+    assert names(top.json()) == ["Київ"]
+
+
+async def test_misspelled_names_are_found_after_prefix_matches(index):
+    index.build(ROWS + [(10, "Хмельницький", "Khmelnytskyi", "Хмельницька обл."), (11, "Київець", None, "Інша обл.")])
+
+    assert names(index.search("Хмельницкий")) == ["Хмельницький"]
+    assert names(index.search("khmelnitsky")) == ["Хмельницький"]
+    assert names(index.search("Киверці")) == ["Ківерці"]
+    # Точні збіги за префіксом ідуть першими, схожі назви — після них
+    assert names(index.search("київе")) == ["Київець", "Київ", "Київ"]
+
+
+async def test_short_queries_are_prefix_only(index):
+    assert index.search("кив") == []
+    assert names(index.search("ків")) == ["Ківерці"]
+
+
+async def test_latin_and_wrong_layout_queries(index):
+    # Транслітерація без англійської назви в базі
+    assert names(index.search("gnid")) == []
+    assert names(index.search("hnid")) == ["Гнідин"]
+    assert names(index.search("kamianets")) == ["Кам'янець-Подільський"]
+    # Набрано в англійській розкладці замість української і навпаки
+    assert names(index.search("rb]d")) == ["Київ", "Київ"]
+    assert names(index.search("лнш")) == ["Київ", "Київ"]
+
+
+@pytest.fixture
+def client(index, monkeypatch):
+    index.dataset_version = "abc123"
+    monkeypatch.setattr("location_app.routes.city_index", index)
+    app = FastAPI()
+    app.include_router(location_app.router)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def test_street_list_is_paginated_and_cacheable(client):
+    page = ("Київ", 250, [(11, "вул. Андріївська"), (12, "вул. Бастіонна")])
+    with patch("location_app.routes.StreetService.select_city_page", new=AsyncMock(return_value=page)) as select:
+        response = await client.get("/location/cities-ukr/1/streets", params={"limit": 2, "offset": 10})
+
+    select.assert_awaited_once_with(1, 2, 10)
+    assert response.headers["X-Total-Count"] == "250"
+    assert response.headers["ETag"] == 'W/"abc123"'
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+    assert response.json() == [
+        {"id": 11, "name_ukr": "вул. Андріївська", "city_name": "Київ"},
+        {"id": 12, "name_ukr": "вул. Бастіонна", "city_name": "Київ"},
+    ]
+
+
+async def test_street_list_without_limit_returns_all_streets(client):
+    # Клієнти, написані до появи пагінації, отримують повний список
+    page = ("Київ", 2, [(11, "вул. Андріївська"), (12, "вул. Бастіонна")])
+    with patch("location_app.routes.StreetService.select_city_page", new=AsyncMock(return_value=page)) as select:
+        response = await client.get("/location/cities-ukr/1/streets")
+
+    select.assert_awaited_once_with(1, None, 0)
+    assert len(response.json()) == 2
+
+
+async def test_unchanged_street_list_is_not_queried(client):
+    with patch("location_app.routes.StreetService.select_city_page", new=AsyncMock()) as select:
+        response = await client.get("/location/cities-ukr/1/streets", headers={"If-None-Match": '"old", W/"abc123"'})
+
+    select.assert_not_awaited()
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == 'W/"abc123"'
+
+
+async def test_cached_etag_does_not_hide_unknown_city(client):
+    with patch("location_app.routes.StreetService.select_city_page", new=AsyncMock(return_value=(None, 0, []))):
+        response = await client.get("/location/cities-ukr/404/streets", headers={"If-None-Match": 'W/"abc123"'})
+
+    assert response.status_code == 404
+
+
+async def test_street_list_of_unknown_city(client):
+    with patch("location_app.routes.StreetService.select_city_page", new=AsyncMock(return_value=(None, 0, []))):
+        response = await client.get("/location/cities-ukr/404/streets")
+
+    assert response.status_code == 404
+
+
+async def test_street_search_takes_city_from_results(client):
+    city = type("City", (), {"name_ukr": "Київ"})
+    street = type("Street", (), {"id": 11, "name_ukr": "вул. Хрещатик", "city": city})
+    with patch("location_app.routes.search_streets", new=AsyncMock(return_value=[street])), \
+         patch("location_app.routes.CityService.select_one", new=AsyncMock()) as select_one:
+        response = await client.get("/location/cities-ukr/1/streets", params={"q": "хре"})
+
+    select_one.assert_not_awaited()
+    assert "ETag" not in response.headers
+    assert response.json() == [{"id": 11, "name_ukr": "вул. Хрещатик", "city_name": "Київ"}]
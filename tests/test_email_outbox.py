@@ -0,0 +1,70 @@
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from services import email_outbox, mailing
+from tests.fake_smtp import FakeSmtpServer
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def smtp_server(monkeypatch):
+    server = await FakeSmtpServer().start()
+    monkeypatch.setattr(mailing.config, "EMAIL_SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setattr(mailing.config, "EMAIL_SMTP_PORT", server.port)
+    monkeypatch.setattr(mailing.config, "EMAIL_SMTP_STARTTLS", False)
+    # Пул прив'язується до event loop, тому в кожному тесті — новий
+    monkeypatch.setattr(email_outbox, "smtp_pool", mailing.SmtpPool(2))
+    yield server
+    await email_outbox.smtp_pool.close()
+    await server.stop()
+
+
+def make_email(email_id, attempts=1):
+    return MagicMock(id=email_id, dedupe_key=f"test:{email_id}", to_email=f"user{email_id}@example.com",
+                     subject="Тема", body="Текст", attempts=attempts)
+
+
+@pytest.fixture
+def outbox():
+    with patch.object(email_outbox.EmailOutboxService, "claim", new=AsyncMock()) as mock_claim, \
+         patch.object(email_outbox.EmailOutboxService, "mark_sent", new=AsyncMock()) as mock_sent, \
+         patch.object(email_outbox.EmailOutboxService, "fail", new=AsyncMock()) as mock_fail:
+        yield MagicMock(claim=mock_claim, mark_sent=mock_sent, fail=mock_fail)
+
+
+async def test_claimed_emails_are_sent_and_marked(smtp_server, outbox):
+    outbox.claim.return_value = [make_email(i) for i in range(3)]
+
+    has_more = await email_outbox.dispatch_email_outbox()
+
+    assert not has_more
+    assert {msg["To"] for msg in smtp_server.messages} == {f"user{i}@example.com" for i in range(3)}
+    outbox.mark_sent.assert_awaited_once_with([0, 1, 2])
+    outbox.fail.assert_not_awaited()
+
+
+async def test_smtp_failure_is_retried_with_backoff(smtp_server, outbox):
+    await smtp_server.stop()
+    outbox.claim.return_value = [make_email(1, attempts=2)]
+
+    await email_outbox.dispatch_email_outbox()
+
+    outbox.mark_sent.assert_awaited_once_with([])
+    email, error, max_attempts, delay = outbox.fail.await_args.args
+    assert email.id == 1
+    assert max_attempts == email_outbox.config.EMAIL_MAX_ATTEMPTS
+    assert delay == email_outbox.config.EMAIL_OUTBOX_RETRY_BASE_DELAY * 2
+
+
+async def test_full_batch_asks_for_another_run(smtp_server, outbox, monkeypatch):
+    monkeypatch.setattr(email_outbox.config, "EMAIL_OUTBOX_BATCH_SIZE", 2)
+    outbox.claim.return_value = [make_email(1), make_email(2)]
+
+    assert await email_outbox.dispatch_email_outbox()
+
+
+async def test_empty_outbox():
+    with patch.object(email_outbox.EmailOutboxService, "claim", new=AsyncMock(return_value=[])):
+        assert not await email_outbox.dispatch_email_outbox()
@@ -0,0 +1,125 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from PIL import Image
+
+from services import gpt_services
+from tests.fake_openai import FakeOpenAI, create_client
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(gpt_services.config, "GPT_RUN_POLL_INITIAL_DELAY", 0.01)
+    monkeypatch.setattr(gpt_services.config, "GPT_RUN_POLL_MAX_DELAY", 0.02)
+    with patch.object(gpt_services.OpenAIFileService, "get_file_id", new=AsyncMock(return_value=None)), \
+         patch.object(gpt_services.OpenAIFileService, "remember", new=AsyncMock()):
+        yield
+
+
+def use_fake(fake: FakeOpenAI, **client_kwargs):
+    return patch.object(gpt_services, "client", create_client(fake, **client_kwargs))
+
+
+@pytest.fixture
+def photo(tmp_path, monkeypatch):
+    monkeypatch.setattr("services.image_preprocessing.CACHE_DIR", tmp_path / "cache")
+    path = tmp_path / "photo.png"
+    Image.new("RGB", (400, 300), (120, 130, 140)).save(path)
+    return str(path)
+
+
+async def test_text_and_image_verification_through_fake_api(photo):
+    fake = FakeOpenAI(queue_time=0.02, run_time=0.03)
+    with use_fake(fake):
+        result = await gpt_services.text_and_image_verification("Здаю квартиру", [photo])
+
+    assert result.is_ok is True
+    assert fake.stats()["runs"] == 1
+    assert fake.stats()["files"] == 1
+
+
+async def test_fake_api_can_reject_content():
+    fake = FakeOpenAI(responder=lambda assistant_id, text: {"is_ok": "спам" not in text, "reason_details": "спам"})
+    with use_fake(fake):
+        rejected = await gpt_services.text_and_image_verification("Це спам")
+        approved = await gpt_services.text_and_image_verification("Нормальний текст")
+
+    assert rejected.is_ok is False and rejected.reason_details == "спам"
+    assert approved.is_ok is True
+
+
+async def test_injected_run_failure_raises_run_error():
+    fake = FakeOpenAI(run_failure_rate=1)
+    with use_fake(fake):
+        with pytest.raises(gpt_services.GptRunError) as exc_info:
+            await gpt_services.text_and_image_verification("Здаю квартиру")
+
+    assert exc_info.value.status == "failed"
+    assert exc_info.value.details == "injected failure"
+
+
+async def test_injected_http_errors_are_retried_by_client(monkeypatch):
+    monkeypatch.setattr("openai._base_client.INITIAL_RETRY_DELAY", 0.01)
+    fake = FakeOpenAI(error_rate=0.3, seed=1)
+    with use_fake(fake, max_retries=10):
+        for _ in range(3):
+            assert (await gpt_services.text_and_image_verification("Здаю квартиру")).is_ok
+
+    assert fake.requests > 3 * 4
+
+
+async def test_slow_run_is_cancelled_after_deadline(monkeypatch):
+    monkeypatch.setattr(gpt_services.config, "GPT_RUN_TIMEOUT", 0.05)
+    fake = FakeOpenAI(run_time=10)
+    with use_fake(fake):
+        with pytest.raises(gpt_services.GptRunTimeoutError):
+            await gpt_services.text_and_image_verification("Здаю квартиру")
+
+    assert [run["final_status"] for run in fake.runs.values()] == ["cancelled"]
+
+
+@pytest.fixture
+def chat_backend(monkeypatch):
+    monkeypatch.setattr(gpt_services.config, "GPT_BACKEND", "chat")
+    monkeypatch.setattr(gpt_services, "_assistants", {})
+
+
+async def test_chat_backend_makes_single_request_per_check(chat_backend, photo):
+    fake = FakeOpenAI()
+    with use_fake(fake):
+        first = await gpt_services.text_and_image_verification("Здаю квартиру", [photo])
+        requests_after_first = fake.requests
+        second = await gpt_services.ownership_documents_verification(
+            "Іван", "Іваненко", "Іванович", "1990-01-01", photo, "Київ", "вул. Хрещатик"
+        )
+
+    assert first == gpt_services.TextVerificationGptResult(is_ok=True, reason_details="")
+    assert second.valid and second.belongs_to_user
+    # Крім одного запиту на перевірку, інструкції кожного асистента читаються один раз
+    assistant_ids = {gpt_services.config.MODERATOR_ASSISTANT_ID, gpt_services.config.OWNERSHIP_VERIFICATION_ASSISTANT_ID}
+    assert requests_after_first == 2
+    assert fake.completions == 2
+    assert fake.requests == 2 + len(assistant_ids)
+    assert fake.stats()["runs"] == 0 and fake.stats()["files"] == 0
+
+
+async def test_chat_backend_reuses_cached_assistant(chat_backend):
+    fake = FakeOpenAI(responder=lambda assistant_id, text: {"is_ok": "спам" not in text, "reason_details": assistant_id})
+    with use_fake(fake):
+        await gpt_services.text_and_image_verification("Нормальний текст")
+        result = await gpt_services.text_and_image_verification("Це спам")
+
+    assert result.is_ok is False
+    assert result.reason_details == gpt_services.config.MODERATOR_ASSISTANT_ID
+    assert fake.requests == 3
+
+
+async def test_chat_backend_raises_on_refusal(chat_backend):
+    completion = MagicMock(id="chatcmpl-1", choices=[MagicMock(finish_reason="stop", message=MagicMock(refusal="I can't help"))])
+    with patch.object(gpt_services, "get_assistant", new=AsyncMock(return_value=MagicMock(model="gpt", instructions=""))), \
+         patch.object(gpt_services.client.chat.completions, "create", new=AsyncMock(return_value=completion)):
+        with pytest.raises(gpt_services.GptRunError) as exc_info:
+            await gpt_services.text_and_image_verification("Здаю квартиру")
+
+    assert exc_info.value.status == "refused"
@@ -12,6 +12,13 @@ from services.gpt_services import (
     TextVerificationGptResult
 )
 
+@pytest.fixture(autouse=True)
+def file_cache():
+    with patch.object(gpt_services.OpenAIFileService, "get_file_id", new=AsyncMock(return_value=None)) as mock_get, \
+         patch.object(gpt_services.OpenAIFileService, "remember", new=AsyncMock()) as mock_remember:
+        yield MagicMock(get_file_id=mock_get, remember=mock_remember)
+
+
 @pytest.mark.asyncio
 async def test_passport_documents_verification_success():
     fake_file_id = "file-123"
@@ -58,7 +65,9 @@ async def test_ownership_documents_verification_success():
          patch.object(gpt_services.client.beta.threads.messages, "list", new=AsyncMock(return_value=MagicMock(
              data=[MagicMock(role="assistant", content=[MagicMock(text=MagicMock(value=json.dumps(fake_response)))])]
          ))):
-        result = await ownership_documents_verification("Ivan", "Ivanov", "Ivanovich", "1990-01-01", "any_path.jpg")
+        result = await ownership_documents_verification(
+            "Ivan", "Ivanov", "Ivanovich", "1990-01-01", "any_path.jpg", "Київ", "вул. Хрещатик"
+        )
         assert result.valid is True
         assert result.belongs_to_user is True
 
@@ -74,3 +83,133 @@ async def test_text_verification_success():
         result = await text_and_image_verification("some clean input text")
         assert isinstance(result, TextVerificationGptResult)
         assert result.is_ok is True
+
+
+@pytest.mark.asyncio
+async def test_run_assistant_raises_on_failed_run():
+    with patch.object(gpt_services.client.beta.threads.runs, "create", new=AsyncMock(return_value=MagicMock(id="run-id", status="queued"))), \
+         patch.object(gpt_services.client.beta.threads.runs, "retrieve", new=AsyncMock(return_value=MagicMock(id="run-id", status="failed", last_error=MagicMock(message="rate limit")))), \
+         patch.object(gpt_services.asyncio, "sleep", new=AsyncMock()):
+        with pytest.raises(gpt_services.GptRunError) as exc_info:
+            await gpt_services.run_assistant("thread-id", "assistant-id")
+
+    assert exc_info.value.status == "failed"
+    assert exc_info.value.details == "rate limit"
+    assert gpt_services.metrics.snapshot()["gauges"]["gpt_runs_in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_run_assistant_cancels_run_after_deadline(monkeypatch):
+    monkeypatch.setattr(gpt_services.config, "GPT_RUN_TIMEOUT", 0.05)
+    monkeypatch.setattr(gpt_services.config, "GPT_RUN_POLL_INITIAL_DELAY", 0.01)
+    in_progress = MagicMock(id="run-id", status="in_progress")
+
+    with patch.object(gpt_services.client.beta.threads.runs, "create", new=AsyncMock(return_value=in_progress)), \
+         patch.object(gpt_services.client.beta.threads.runs, "retrieve", new=AsyncMock(return_value=in_progress)) as mock_retrieve, \
+         patch.object(gpt_services.client.beta.threads.runs, "cancel", new=AsyncMock()) as mock_cancel:
+        with pytest.raises(gpt_services.GptRunTimeoutError):
+            await gpt_services.run_assistant("thread-id", "assistant-id")
+
+    mock_cancel.assert_awaited_once_with(thread_id="thread-id", run_id="run-id")
+    assert mock_retrieve.await_count > 1
+
+
+@pytest.mark.asyncio
+async def test_upload_file_reuses_cached_file_id(file_cache):
+    file_cache.get_file_id.return_value = "file-cached"
+
+    with patch("builtins.open", mock_open(read_data=b"data")), \
+         patch.object(gpt_services.client.files, "create", new=AsyncMock()) as mock_create:
+        file_id = await gpt_services.upload_file("any_path.jpg")
+
+    assert file_id == "file-cached"
+    mock_create.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_cleanup_skips_files_that_fail_to_delete():
+    files = [MagicMock(id=1, file_id="file-bad"), MagicMock(id=2, file_id="file-gone"), MagicMock(id=3, file_id="file-ok")]
+    not_found = gpt_services.openai.NotFoundError("gone", response=MagicMock(status_code=404), body=None)
+    bad_request = gpt_services.openai.BadRequestError("bad", response=MagicMock(status_code=400), body=None)
+
+    with patch.object(gpt_services.OpenAIFileService, "select_expired", new=AsyncMock(side_effect=[files, []])) as mock_select, \
+         patch.object(gpt_services.OpenAIFileService, "delete", new=AsyncMock()) as mock_delete, \
+         patch.object(gpt_services.client.files, "delete", new=AsyncMock(side_effect=[bad_request, not_found, None])):
+        await gpt_services.cleanup_expired_files(batch_size=3)
+
+    # Видалені та вже відсутні в OpenAI файли прибираються з таблиці, решта батчу не блокується
+    assert mock_delete.await_args.args[0].right.value == [2, 3]
+    assert mock_select.await_args.kwargs == {"after_id": 3}
+
+
+@pytest.mark.asyncio
+async def test_text_verification_records_phases_polls_and_tokens(capsys):
+    gpt_services.metrics.reset()
+    queued = MagicMock(id="run-id", status="queued")
+    in_progress = MagicMock(id="run-id", status="in_progress")
+    completed = MagicMock(id="run-id", status="completed",
+                          usage=MagicMock(prompt_tokens=120, completion_tokens=30, total_tokens=150))
+
+    with patch.object(gpt_services.client.beta.threads, "create", new=AsyncMock(return_value=MagicMock(id="thread-id"))), \
+         patch.object(gpt_services.client.beta.threads.messages, "create", new=AsyncMock()), \
+         patch.object(gpt_services.client.beta.threads.runs, "create", new=AsyncMock(return_value=queued)), \
+         patch.object(gpt_services.client.beta.threads.runs, "retrieve", new=AsyncMock(side_effect=[queued, in_progress, completed])), \
+         patch.object(gpt_services.asyncio, "sleep", new=AsyncMock()), \
+         patch.object(gpt_services.client.beta.threads.messages, "list", new=AsyncMock(return_value=MagicMock(
+             data=[MagicMock(role="assistant", content=[MagicMock(text=MagicMock(value='{"is_ok": true}'))])]
+         ))):
+        await text_and_image_verification("Some text")
+
+    log = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert log["event"] == "gpt_call"
+    assert log["call"] == "text_and_image_verification"
+    assert log["result"] == "ok"
+    assert log["polls"] == 3
+    assert log["tokens"] == {"prompt_tokens": 120, "completion_tokens": 30, "total_tokens": 150}
+    assert set(log["phases"]) == {"thread_create", "message_create", "run_create", "run_queue", "run_poll", "messages_list"}
+
+    snapshot = gpt_services.metrics.snapshot()
+    assert snapshot["counters"]["gpt_tokens_total{call=text_and_image_verification,kind=total}"] == 150
+    assert snapshot["histograms"]["gpt_run_polls{call=text_and_image_verification}"]["max"] == 3
+    assert "gpt_phase_seconds{call=text_and_image_verification,phase=run_queue}" in snapshot["histograms"]
+
+
+@pytest.mark.asyncio
+async def test_failed_verification_records_failure_reason(capsys):
+    gpt_services.metrics.reset()
+    with patch.object(gpt_services.client.beta.threads, "create", new=AsyncMock(return_value=MagicMock(id="thread-id"))), \
+         patch.object(gpt_services.client.beta.threads.messages, "create", new=AsyncMock()), \
+         patch.object(gpt_services.client.beta.threads.runs, "create", new=AsyncMock(return_value=MagicMock(id="run-id", status="queued"))), \
+         patch.object(gpt_services.client.beta.threads.runs, "retrieve", new=AsyncMock(return_value=MagicMock(id="run-id", status="expired", usage=None))), \
+         patch.object(gpt_services.asyncio, "sleep", new=AsyncMock()):
+        with pytest.raises(gpt_services.GptRunError):
+            await text_and_image_verification("Some text")
+
+    log = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert log["result"] == "error"
+    assert log["run_status"] == "expired"
+    assert "GptRunError" in log["error"]
+    counters = gpt_services.metrics.snapshot()["counters"]
+    assert counters["gpt_call_failures_total{call=text_and_image_verification,reason=expired}"] == 1
+
+
+def test_structured_response_format_is_strict():
+    response_format = gpt_services.structured_response_format(gpt_services.OwnershipVerificationGptResult)
+
+    schema = response_format["json_schema"]["schema"]
+    assert response_format["json_schema"]["strict"] is True
+    assert schema["additionalProperties"] is False
+    assert schema["required"] == ["valid", "belongs_to_user", "error_details"]
+    assert all("default" not in field for field in schema["properties"].values())
+
+
+@pytest.mark.asyncio
+async def test_document_scans_are_encoded_at_document_resolution(monkeypatch):
+    monkeypatch.setattr(gpt_services, "_assistants", {"ownership-id": MagicMock(model="m", instructions="")})
+    monkeypatch.setattr(gpt_services.config, "OWNERSHIP_VERIFICATION_ASSISTANT_ID", "ownership-id")
+    check = gpt_services.ownership_documents_check("Іван", "Іваненко", "Іванович", "1990-01-01", "doc.jpg", "Київ", "Хрещатик")
+
+    with patch.object(gpt_services, "inline_file_content", return_value={"type": "image_url"}) as mock_inline:
+        await gpt_services.structured_request_body(check)
+
+    mock_inline.assert_called_once_with("doc.jpg", gpt_services.config.GPT_DOCUMENT_IMAGE_MAX_SIDE)
@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import health_app
+from services.startup import StartupState
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def state(monkeypatch):
+    state = StartupState()
+    monkeypatch.setattr("health_app.routes.startup_state", state)
+    return state
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(health_app.router)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def fake_engine(error=None):
+    connection = MagicMock()
+    connection.execute = AsyncMock(side_effect=error)
+    engine = MagicMock()
+    engine.connect.return_value.__aenter__ = AsyncMock(return_value=connection)
+    engine.connect.return_value.__aexit__ = AsyncMock(return_value=False)
+    return engine
+
+
+async def test_liveness_does_not_touch_dependencies(client):
+    with patch("health_app.routes.engine", new=fake_engine(ConnectionRefusedError())):
+        response = await client.get("/health/live")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+async def test_not_ready_until_startup_finishes(client, state):
+    with patch("health_app.routes.engine", new=fake_engine()):
+        response = await client.get("/health/ready")
+
+    assert response.status_code == 503
+    assert response.json()["status"] == "not_ready"
+
+
+async def test_ready_while_catch_up_jobs_run_in_background(client, state):
+    release = asyncio.Event()
+    state.run_in_background("worker_checking_listing_relevance", release.wait)
+    state.ready = True
+
+    with patch("health_app.routes.engine", new=fake_engine()):
+        response = await client.get("/health/ready")
+        assert response.status_code == 200
+        assert response.json()["startup_jobs"] == {"worker_checking_listing_relevance": "running"}
+
+        release.set()
+        await asyncio.sleep(0)
+        response = await client.get("/health/ready")
+        assert response.json()["startup_jobs"] == {"worker_checking_listing_relevance": "done"}
+
+    await state.stop()
+
+
+async def test_not_ready_without_database(client, state):
+    state.ready = True
+    with patch("health_app.routes.engine", new=fake_engine(ConnectionRefusedError())):
+        response = await client.get("/health/ready")
+
+    assert response.status_code == 503
+    assert response.json()["database"] == "error: ConnectionRefusedError"
+
+
+async def test_not_ready_when_database_hangs(client, state, monkeypatch):
+    monkeypatch.setattr("health_app.routes.config.HEALTH_CHECK_DB_TIMEOUT", 0.01)
+    state.ready = True
+
+    async def hang(*_):
+        await asyncio.sleep(10)
+
+    engine = fake_engine()
+    engine.connect.return_value.__aenter__ = AsyncMock(side_effect=hang)
+    with patch("health_app.routes.engine", new=engine):
+        response = await asyncio.wait_for(client.get("/health/ready"), 1)
+
+    assert response.status_code == 503
+    assert response.json()["database"] == "error: TimeoutError"
+
+
+async def test_failed_startup_job_is_reported():
+    state = StartupState()
+    state.run_in_background("enqueue_pending_reviews", AsyncMock(side_effect=RuntimeError("db down")))
+    await asyncio.sleep(0)
+    await state.stop()
+
+    assert state.jobs() == {"enqueue_pending_reviews": "failed"}
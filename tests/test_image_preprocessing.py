@@ -0,0 +1,82 @@
+import os
+
+from PIL import Image
+
+from services import image_preprocessing
+from services.image_preprocessing import prepare_image_for_gpt, cleanup_image_cache
+
+
+def test_prepare_image_downscales_and_strips_exif(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_preprocessing, "CACHE_DIR", tmp_path / "cache")
+    source = tmp_path / "photo.png"
+    exif = Image.Exif()
+    exif[0x010F] = "Camera"
+    Image.new("RGBA", (4000, 2000), (10, 20, 30, 255)).save(source, exif=exif)
+
+    prepared = prepare_image_for_gpt(source)
+
+    with Image.open(prepared) as image:
+        assert image.format == "JPEG"
+        assert max(image.size) == image_preprocessing.config.GPT_IMAGE_MAX_SIDE
+        assert not image.getexif()
+
+
+def test_prepare_image_uses_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_preprocessing, "CACHE_DIR", tmp_path / "cache")
+    source = tmp_path / "photo.jpg"
+    Image.new("RGB", (100, 100)).save(source)
+
+    first = prepare_image_for_gpt(source)
+    second = prepare_image_for_gpt(source)
+
+    assert first == second
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+
+def test_prepare_image_returns_original_for_non_image(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_preprocessing, "CACHE_DIR", tmp_path / "cache")
+    source = tmp_path / "document.pdf"
+    source.write_bytes(b"%PDF-1.4 not an image")
+
+    assert prepare_image_for_gpt(source) == str(source)
+
+
+def test_cleanup_removes_only_unused_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_preprocessing, "CACHE_DIR", tmp_path / "cache")
+    used, unused = tmp_path / "used.jpg", tmp_path / "unused.jpg"
+    Image.new("RGB", (100, 100)).save(used)
+    Image.new("RGB", (100, 100), (255, 0, 0)).save(unused)
+    used_path, unused_path = prepare_image_for_gpt(used), prepare_image_for_gpt(unused)
+    for path in (used_path, unused_path):
+        os.utime(path, (0, 0))
+
+    # Повторне використання оновлює час зміни, тож файл лишається в кеші
+    prepare_image_for_gpt(used)
+
+    assert cleanup_image_cache(max_age=3600) == 1
+    assert os.path.exists(used_path) and not os.path.exists(unused_path)
+
+
+def test_prepare_image_cache_depends_on_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_preprocessing, "CACHE_DIR", tmp_path / "cache")
+    source = tmp_path / "photo.png"
+    Image.new("RGB", (3000, 1500)).save(source)
+
+    first = prepare_image_for_gpt(source)
+    monkeypatch.setattr(image_preprocessing.config, "GPT_IMAGE_MAX_SIDE", 512)
+    second = prepare_image_for_gpt(source)
+
+    assert first != second
+    with Image.open(second) as image:
+        assert max(image.size) == 512
+
+
+def test_documents_keep_higher_resolution(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_preprocessing, "CACHE_DIR", tmp_path / "cache")
+    source = tmp_path / "document.png"
+    Image.new("RGB", (4000, 3000)).save(source)
+
+    prepared = prepare_image_for_gpt(source, image_preprocessing.config.GPT_DOCUMENT_IMAGE_MAX_SIDE)
+
+    with Image.open(prepared) as image:
+        assert max(image.size) == image_preprocessing.config.GPT_DOCUMENT_IMAGE_MAX_SIDE
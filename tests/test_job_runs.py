@@ -0,0 +1,41 @@
+import pytest
+
+from services.job_runs import track_job_run
+from services.metrics import metrics
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_run_is_recorded_with_counters(job_run_history):
+    metrics.reset()
+    async with track_job_run("test_job") as run:
+        run.seen = 5
+        run.processed = 4
+        run.failed = 1
+
+    record = job_run_history.await_args.kwargs
+    assert record["job"] == "test_job"
+    assert record["status"] == "ok"
+    assert (record["items_seen"], record["items_processed"], record["items_failed"]) == (5, 4, 1)
+    assert record["finished_at"] >= record["started_at"]
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["job_items_total{job=test_job,result=processed}"] == 4
+    assert snapshot["histograms"]["job_run_seconds{job=test_job}"]["count"] == 1
+
+
+async def test_failed_run_is_recorded_and_reraised(job_run_history):
+    with pytest.raises(RuntimeError):
+        async with track_job_run("test_job"):
+            raise RuntimeError("smtp down")
+
+    record = job_run_history.await_args.kwargs
+    assert record["status"] == "failed"
+    assert record["error"] == "RuntimeError: smtp down"
+
+
+async def test_empty_queue_runs_are_kept_out_of_history(job_run_history):
+    async with track_job_run("test_job", record_empty=False):
+        pass
+
+    job_run_history.assert_not_awaited()
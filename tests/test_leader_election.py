@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from services import leader_election
+from services.leader_election import LeaderElection, leader_only
+
+pytestmark = pytest.mark.asyncio
+
+
+def fake_connection(*fetchval_results):
+    connection = MagicMock()
+    connection.fetchval = AsyncMock(side_effect=list(fetchval_results))
+    connection.is_closed.return_value = False
+    connection.close = AsyncMock()
+    return connection
+
+
+async def run_checks(election: LeaderElection, count: int):
+    for _ in range(count):
+        try:
+            await election._check()
+        except Exception:
+            await election._disconnect()
+
+
+async def test_standby_becomes_leader_when_lock_is_free():
+    connection = fake_connection(False, False, True, 1)
+    election = LeaderElection(42, 0.01, 0.05)
+    with patch.object(leader_election, "pg_connect", new=AsyncMock(return_value=connection)) as mock_connect:
+        await run_checks(election, 2)
+        assert not election.is_leader
+
+        await run_checks(election, 2)
+        assert election.is_leader
+        assert election.leader_since is not None
+
+    mock_connect.assert_awaited_once()
+    connection.fetchval.assert_any_await("SELECT pg_try_advisory_lock($1)", 42)
+
+
+async def test_leader_steps_down_when_connection_is_lost():
+    lost = fake_connection(True, ConnectionResetError())
+    standby = fake_connection(False)
+    election = LeaderElection(42, 0.01, 0.05)
+    with patch.object(leader_election, "pg_connect", new=AsyncMock(side_effect=[lost, standby])):
+        await run_checks(election, 1)
+        assert election.is_leader
+
+        await run_checks(election, 1)
+        assert not election.is_leader
+        lost.close.assert_awaited_once()
+
+        await run_checks(election, 1)
+        assert not election.is_leader
+
+
+async def test_leader_steps_down_when_health_check_hangs():
+    async def fetchval(query, *_):
+        if query == "SELECT 1":
+            # Напіввідкрите з'єднання: на перевірку немає ні відповіді, ні помилки
+            await asyncio.sleep(10)
+        return True
+
+    half_open = fake_connection()
+    half_open.fetchval.side_effect = fetchval
+    election = LeaderElection(42, 0.01, 0.05)
+    with patch.object(leader_election, "pg_connect", new=AsyncMock(return_value=half_open)):
+        await run_checks(election, 1)
+        assert election.is_leader
+
+        await asyncio.wait_for(run_checks(election, 1), 1)
+
+    assert not election.is_leader
+    half_open.close.assert_awaited_once()
+
+
+async def test_leader_only_skips_job_on_standby(monkeypatch):
+    election = LeaderElection(42, 0.01, 0.05)
+    election._first_attempt.set()
+    monkeypatch.setattr(leader_election, "leader", election)
+    job = AsyncMock(__name__="job")
+
+    await leader_only(job)()
+    job.assert_not_awaited()
+
+    election.is_leader = True
+    await leader_only(job)()
+    job.assert_awaited_once()
+
+
+async def test_leader_only_waits_for_first_election(monkeypatch):
+    election = LeaderElection(42, 1, 0.05)
+    monkeypatch.setattr(leader_election, "leader", election)
+    job = AsyncMock(__name__="job")
+
+    async def elect():
+        await asyncio.sleep(0.01)
+        election.is_leader = True
+        election._first_attempt.set()
+
+    await asyncio.gather(leader_only(job)(), elect())
+    job.assert_awaited_once()
@@ -1,4 +1,7 @@
+import asyncio
+import smtplib
 import pytest
+import pytest_asyncio
 from unittest.mock import patch, MagicMock
 
 import pytest
@@ -7,7 +10,9 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from services import mailing
 from services.mailing import send_email, send_email_async
+from tests.fake_smtp import FakeSmtpServer
 
 
 def test_send_email_success():
@@ -24,3 +29,98 @@ async def test_send_email_async_success():
     with patch("services.mailing.send_email") as mock_send_email:
         await send_email_async("test@example.com", "Test", "Body")
         mock_send_email.assert_called_once_with("test@example.com", "Test", "Body")
+
+
+@pytest_asyncio.fixture
+async def smtp_server(monkeypatch):
+    server = await FakeSmtpServer().start()
+    monkeypatch.setattr(mailing.config, "EMAIL_SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setattr(mailing.config, "EMAIL_SMTP_PORT", server.port)
+    monkeypatch.setattr(mailing.config, "EMAIL_SMTP_STARTTLS", False)
+    yield server
+    await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_smtp_pool_reuses_authenticated_connections(smtp_server):
+    pool = mailing.SmtpPool(4)
+    await asyncio.gather(*(
+        pool.send(mailing.build_message(f"user{i}@example.com", "Тема", "Текст")) for i in range(200)
+    ))
+    await pool.close()
+
+    assert len(smtp_server.messages) == 200
+    assert smtp_server.connections <= 4
+    assert smtp_server.logins == smtp_server.connections
+    assert {msg["To"] for msg in smtp_server.messages} == {f"user{i}@example.com" for i in range(200)}
+
+
+@pytest.mark.asyncio
+async def test_smtp_pool_reconnects_after_server_closes_connection(smtp_server):
+    smtp_server.close_after = 3
+    pool = mailing.SmtpPool(1)
+    for i in range(7):
+        await pool.send(mailing.build_message(f"user{i}@example.com", "Тема", "Текст"))
+    await pool.close()
+
+    assert len(smtp_server.messages) == 7
+    assert smtp_server.connections == 3
+
+
+@pytest.mark.asyncio
+async def test_smtp_pool_rotates_connections(smtp_server, monkeypatch):
+    monkeypatch.setattr(mailing.config, "EMAIL_MAX_MESSAGES_PER_CONNECTION", 2)
+    pool = mailing.SmtpPool(1)
+    for i in range(5):
+        await pool.send(mailing.build_message(f"user{i}@example.com", "Тема", "Текст"))
+    await pool.close()
+
+    assert smtp_server.connections == 3
+
+
+
+@pytest.mark.asyncio
+async def test_smtp_pool_keeps_connection_after_refused_recipient(smtp_server):
+    smtp_server.refused_recipients = {"missing@example.com"}
+    pool = mailing.SmtpPool(1)
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        await pool.send(mailing.build_message("missing@example.com", "Тема", "Текст"))
+    await pool.send(mailing.build_message("user@example.com", "Тема", "Текст"))
+    await pool.close()
+
+    assert [msg["To"] for msg in smtp_server.messages] == ["user@example.com"]
+    assert smtp_server.connections == 1
+
+
+def fake_smtp_connection(*send_errors):
+    server = MagicMock()
+    server.send_message.side_effect = list(send_errors) or None
+    return mailing.SmtpConnection(server)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [ConnectionResetError, BrokenPipeError, smtplib.SMTPServerDisconnected])
+async def test_smtp_pool_reconnects_after_broken_idle_socket(error):
+    stale, fresh = fake_smtp_connection(error()), fake_smtp_connection()
+    pool = mailing.SmtpPool(1)
+    pool._idle.append(stale)
+    with patch.object(mailing.SmtpPool, "_connect", return_value=fresh):
+        await pool.send(mailing.build_message("user@example.com", "Тема", "Текст"))
+
+    stale.server.close.assert_called_once()
+    fresh.server.send_message.assert_called_once()
+    assert pool._idle == [fresh]
+
+
+@pytest.mark.asyncio
+async def test_smtp_pool_closes_new_connection_when_resend_fails():
+    stale = fake_smtp_connection(smtplib.SMTPServerDisconnected())
+    fresh = fake_smtp_connection(ConnectionResetError())
+    pool = mailing.SmtpPool(1)
+    pool._idle.append(stale)
+    with patch.object(mailing.SmtpPool, "_connect", return_value=fresh), pytest.raises(ConnectionResetError):
+        await pool.send(mailing.build_message("user@example.com", "Тема", "Текст"))
+
+    stale.server.close.assert_called_once()
+    fresh.server.close.assert_called_once()
+    assert pool._idle == []
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from services import pg_notifications
+from services.pg_notifications import WorkerWakeup, PgListener
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_wakeups_during_run_are_coalesced():
+    release = asyncio.Event()
+    calls = []
+
+    async def worker():
+        calls.append(1)
+        await release.wait()
+        return False
+
+    wakeup = WorkerWakeup("test", worker)
+    wakeup.start()
+    wakeup.wake()
+    await asyncio.sleep(0)
+    for _ in range(5):
+        wakeup.wake()
+    release.set()
+    await asyncio.sleep(0.01)
+    await wakeup.stop()
+
+    assert len(calls) == 2
+
+
+async def test_worker_is_rerun_while_queue_is_not_empty():
+    worker = AsyncMock(side_effect=[True, True, False])
+    wakeup = WorkerWakeup("test", worker)
+    wakeup.start()
+    wakeup.wake()
+    await asyncio.sleep(0.01)
+    await wakeup.stop()
+
+    assert worker.await_count == 3
+
+
+async def test_worker_failure_does_not_stop_wakeups():
+    worker = AsyncMock(side_effect=[RuntimeError("db down"), False])
+    wakeup = WorkerWakeup("test", worker)
+    wakeup.start()
+    wakeup.wake()
+    await asyncio.sleep(0.01)
+    wakeup.wake()
+    await asyncio.sleep(0.01)
+    await wakeup.stop()
+
+    assert worker.await_count == 2
+
+
+def fake_connection():
+    connection = MagicMock()
+    connection.add_listener = AsyncMock()
+    connection.close = AsyncMock()
+    connection.is_closed.return_value = False
+    return connection
+
+
+async def test_listener_reconnects_and_catches_up():
+    connections = [fake_connection(), fake_connection()]
+    callback = MagicMock()
+
+    with patch.object(PgListener, "connect", new=AsyncMock(side_effect=connections)), \
+         patch.object(pg_notifications, "backoff_delay", return_value=0):
+        listener = PgListener("moderation_jobs", callback)
+        listener.start()
+        await asyncio.sleep(0.01)
+
+        channel, on_notification = connections[0].add_listener.await_args.args
+        assert channel == "moderation_jobs"
+        on_notification(None, 1, channel, "42")
+
+        # З'єднання обірвалось: слухач підключається знову і ще раз будить воркер
+        terminated = connections[0].add_termination_listener.call_args.args[0]
+        terminated(connections[0])
+        await asyncio.sleep(0.01)
+        await listener.stop()
+
+    connections[0].close.assert_awaited_once()
+    connections[1].add_listener.assert_awaited_once()
+    assert [call.args[0] for call in callback.call_args_list] == [None, "42", None]
+
+
+async def test_listener_reconnects_when_health_check_fails(monkeypatch):
+    monkeypatch.setattr(pg_notifications.config, "PG_LISTENER_HEALTH_CHECK_INTERVAL", 0.01)
+    connections = [fake_connection(), fake_connection()]
+    # Сокет не знає про обрив: termination listener не спрацьовує, відповіді на SELECT 1 немає
+    connections[0].fetchval = AsyncMock(side_effect=asyncio.TimeoutError)
+    connections[1].fetchval = AsyncMock(return_value=1)
+    callback = MagicMock()
+
+    with patch.object(PgListener, "connect", new=AsyncMock(side_effect=connections)), \
+         patch.object(pg_notifications, "backoff_delay", return_value=0):
+        listener = PgListener("moderation_jobs", callback)
+        listener.start()
+        await asyncio.sleep(0.05)
+        await listener.stop()
+
+    connections[0].close.assert_awaited_once()
+    connections[1].fetchval.assert_awaited_with("SELECT 1", timeout=pg_notifications.config.PG_LISTENER_HEALTH_CHECK_TIMEOUT)
+    assert [call.args[0] for call in callback.call_args_list] == [None, None]
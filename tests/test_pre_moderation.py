@@ -0,0 +1,105 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from PIL import Image
+
+from services import pre_moderation
+
+
+def make_image(path, size=(640, 480)):
+    # Градієнт з перешкодами, щоб dHash мав і нульові, і одиничні біти
+    image = Image.radial_gradient("L").resize(size).convert("RGB")
+    image.paste((255, 0, 0), (0, 0, size[0] // 3, size[1] // 3))
+    image.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("text", ["", "квартира"])
+def test_check_text_rejects_short_listing_text(text):
+    verdict = pre_moderation.check_text(text, min_length=10)
+    assert verdict is not None
+    assert not verdict.is_ok
+    assert "короткий" in verdict.reason
+    assert verdict.stage == "local"
+
+
+def test_check_text_configured_spam_pattern():
+    with patch.object(pre_moderation, "SPAM_PATTERNS", [pre_moderation.re.compile(r"t\.me/", pre_moderation.re.IGNORECASE)]):
+        verdict = pre_moderation.check_text("Пишіть у T.me/agent")
+    assert verdict is not None and "спам" in verdict.reason
+
+
+@pytest.mark.parametrize("text", [
+    "Супер!",
+    "Все добре",
+    "Здаю квартиру, деталі на www.example.com",
+    "Здаю квартиру https://example.com",
+    "Чудова квартира!!!!!!!!!!!!",
+    "Опис\n----------\nДеталі",
+])
+def test_check_text_leaves_borderline_text_to_gpt(text):
+    # Короткі відгуки, посилання і роздільники бувають у нормальних текстах — їх оцінює GPT
+    assert pre_moderation.check_text(text) is None
+
+
+def test_check_text_blocklist():
+    with patch.object(pre_moderation, "BLOCKLIST", ["заборонене"]):
+        verdict = pre_moderation.check_text("Тут є ЗАБОРОНЕНЕ слово у тексті")
+    assert verdict is not None and "заборонені" in verdict.reason
+
+
+def test_check_text_undecided_for_normal_text():
+    assert pre_moderation.check_text("Здаю затишну двокімнатну квартиру біля метро") is None
+
+
+def test_check_image_resolution(tmp_path):
+    good = make_image(tmp_path / "good.png")
+    small = make_image(tmp_path / "small.png", size=(200, 150))
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+
+    assert pre_moderation.check_image_resolution([good]) is None
+    assert "роздільної" in pre_moderation.check_image_resolution([good, small]).reason
+    # Нерозпізнаний формат не відхиляється локально, а йде в GPT
+    assert pre_moderation.check_image_resolution([str(broken)]) is None
+    assert "роздільної" in pre_moderation.check_image_resolution([str(broken), small]).reason
+
+
+def test_dhash_survives_resize_and_reencoding(tmp_path):
+    original = make_image(tmp_path / "original.png", size=(1200, 900))
+    resized = tmp_path / "resized.jpg"
+    with Image.open(original) as image:
+        image.resize((600, 450)).save(resized, quality=70)
+
+    original_hash = pre_moderation.image_dhash(original)
+    resized_hash = pre_moderation.image_dhash(resized)
+    assert -(1 << 63) <= original_hash < (1 << 63)
+    assert bin((original_hash ^ resized_hash) & ((1 << 64) - 1)).count("1") <= 4
+
+
+@pytest.mark.asyncio
+async def test_pre_moderate_rejects_previously_rejected_images(tmp_path):
+    image = make_image(tmp_path / "photo.png")
+    with patch("services.pre_moderation.RejectedImageService.has_similar", new=AsyncMock(return_value=True)) as mock_similar:
+        verdict = await pre_moderation.pre_moderate("Здаю затишну двокімнатну квартиру біля метро", [image])
+
+    assert not verdict.is_ok and verdict.stage == "local"
+    image_hashes, _, since = mock_similar.await_args.args
+    assert image_hashes == [pre_moderation.image_dhash(image)]
+    # Старі хеші відхилених фото вже не блокують оголошення
+    assert since < pre_moderation.datetime_now() - pre_moderation.datetime.timedelta(days=1)
+
+
+@pytest.mark.asyncio
+async def test_pre_moderate_undecided_goes_to_gpt(tmp_path):
+    image = make_image(tmp_path / "photo.png")
+    with patch("services.pre_moderation.RejectedImageService.has_similar", new=AsyncMock(return_value=False)):
+        assert await pre_moderation.pre_moderate("Здаю затишну двокімнатну квартиру біля метро", [image]) is None
+
+
+@pytest.mark.asyncio
+async def test_admin_can_forget_rejected_images(tmp_path):
+    image = make_image(tmp_path / "photo.png")
+    with patch("services.pre_moderation.RejectedImageService.forget_similar", new=AsyncMock(return_value=1)) as mock_forget:
+        assert await pre_moderation.forget_rejected_images([image]) == 1
+
+    assert mock_forget.await_args.args == ([pre_moderation.image_dhash(image)], pre_moderation.config.PRE_MODERATION_IMAGE_HASH_DISTANCE)
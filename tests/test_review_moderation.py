@@ -0,0 +1,145 @@
+import asyncio
+import datetime
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.dialects import postgresql
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import review_app
+from auth_app import get_optional_user
+from review_app import services as review_services
+from review_app.schemes import PENDING_REVIEW_STATUS_ID, PUBLISHED_REVIEW_STATUS_ID, REJECTED_REVIEW_STATUS_ID
+from services.background_queue import BackgroundQueue
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def verdict_cache():
+    with patch("services.moderation_cache.ModerationVerdictService.select_fresh", new=AsyncMock(return_value=None)), \
+         patch("services.moderation_cache.ModerationVerdictService.remember", new=AsyncMock()):
+        yield
+
+
+@pytest.fixture
+def pending_review():
+    review = MagicMock(id=5, owner_id=7, description="Чудовий орендодавець", review_status_id=PENDING_REVIEW_STATUS_ID)
+    with patch("review_app.services.ReviewService.select_one", new=AsyncMock(return_value=review)):
+        yield review
+
+
+async def test_review_published_after_moderation(pending_review):
+    with patch("review_app.services.text_and_image_verification", new=AsyncMock(return_value=MagicMock(is_ok=True, reason_details=""))), \
+         patch("review_app.services.ReviewService.apply_moderation_result", new=AsyncMock(return_value=True)) as mock_apply, \
+         patch("review_app.services.ReviewService.count_total_tags_for_owner", new=AsyncMock(return_value=0)):
+        await review_services.moderate_review(pending_review.id)
+
+    mock_apply.assert_awaited_once_with(5, "Чудовий орендодавець", PUBLISHED_REVIEW_STATUS_ID, None)
+
+
+async def test_review_rejected_with_reason(pending_review):
+    with patch("review_app.services.text_and_image_verification", new=AsyncMock(return_value=MagicMock(is_ok=False, reason_details="образи"))), \
+         patch("review_app.services.ReviewService.apply_moderation_result", new=AsyncMock(return_value=True)) as mock_apply, \
+         patch("review_app.services.UserService.block_user", new=AsyncMock()) as mock_block:
+        await review_services.moderate_review(pending_review.id)
+
+    args = mock_apply.await_args.args
+    assert args[2] == REJECTED_REVIEW_STATUS_ID
+    assert "образи" in args[3]
+    mock_block.assert_not_awaited()
+
+
+async def test_short_review_is_judged_by_gpt(pending_review):
+    # Мінімальна довжина тексту оголошення до відгуків не застосовується
+    pending_review.description = "Супер!"
+    with patch("review_app.services.text_and_image_verification", new=AsyncMock(return_value=MagicMock(is_ok=True, reason_details=""))) as mock_verify, \
+         patch("review_app.services.ReviewService.apply_moderation_result", new=AsyncMock(return_value=True)) as mock_apply, \
+         patch("review_app.services.ReviewService.count_total_tags_for_owner", new=AsyncMock(return_value=0)):
+        await review_services.moderate_review(pending_review.id)
+
+    mock_verify.assert_awaited_once()
+    assert mock_apply.await_args.args[2] == PUBLISHED_REVIEW_STATUS_ID
+
+
+async def test_already_moderated_review_is_skipped(pending_review):
+    pending_review.review_status_id = PUBLISHED_REVIEW_STATUS_ID
+    with patch("review_app.services.text_and_image_verification", new=AsyncMock()) as mock_verify:
+        await review_services.moderate_review(pending_review.id)
+
+    mock_verify.assert_not_awaited()
+
+
+async def test_background_queue_retries_failed_items():
+    calls = []
+
+    async def handler(item):
+        calls.append(item)
+        if len(calls) == 1:
+            raise RuntimeError("GPT недоступний")
+
+    queue = BackgroundQueue("test", handler, concurrency=1, retry_base_delay=0.01)
+    queue.start()
+    queue.put(1)
+    for _ in range(100):
+        if len(calls) == 2:
+            break
+        await asyncio.sleep(0.01)
+    await queue.stop()
+
+    assert calls == [1, 1]
+
+
+async def test_background_queue_skips_items_already_waiting():
+    calls = []
+    release = asyncio.Event()
+
+    async def handler(item):
+        calls.append(item)
+        await release.wait()
+
+    queue = BackgroundQueue("test", handler, concurrency=1)
+    queue.put(1)
+    queue.put(1)
+    queue.start()
+    await asyncio.sleep(0.01)
+    # Елемент уже обробляється — повторне додавання означає нову перевірку після поточної
+    queue.put(1)
+    release.set()
+    await queue.join()
+    await queue.stop()
+
+    assert calls == [1, 1]
+
+
+@pytest.fixture
+def reviews_client():
+    app = FastAPI()
+    app.include_router(review_app.router)
+    current_user = MagicMock(id=7)
+    app.dependency_overrides[get_optional_user] = lambda: current_user
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    with patch("review_app.routes.ReviewService.execute", new=AsyncMock(return_value=[])) as execute:
+        yield client, current_user, execute
+
+
+@pytest.mark.parametrize("user_id, sees_unpublished", [(7, True), (8, False), (None, False)])
+async def test_only_author_sees_unpublished_reviews(reviews_client, user_id, sees_unpublished):
+    client, _, execute = reviews_client
+    await client.get("/reviews", params={"user_id": user_id} if user_id else {})
+
+    sql = str(execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert ("review.review_status_id = " in sql) != sees_unpublished
+
+
+async def test_unpublished_review_is_hidden_from_others(reviews_client):
+    client, current_user, execute = reviews_client
+    execute.return_value = [MagicMock(
+        id=5, user_id=7, owner_id=9, rating=4, description="Текст", review_status_id=REJECTED_REVIEW_STATUS_ID,
+        moderation_reason="образи", created_at=datetime.datetime.now(), tags=[]
+    )]
+
+    assert (await client.get("/reviews/5")).json()["moderation_reason"] == "образи"
+    current_user.id = 8
+    assert (await client.get("/reviews/5")).status_code == 404
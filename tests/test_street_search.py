@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy.exc import DBAPIError
+from unittest.mock import AsyncMock, patch
+
+from services.street_search import backfill_street_search_keys, search_streets, best_variant
+from utils import street_search_key, street_search_key_latin, search_key_variants
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.mark.parametrize("name, key", [
+    ("вул. Хрещатик", "хрещатик"),
+    ("Вул.Хрещатик", "хрещатик"),
+    ("пров.  Лабораторний ", "лабораторний"),
+    ("просп. Перемоги", "перемоги"),
+    ("вулиця Прорізна", "прорізна"),
+    ("Андріївський узвіз", "андріївський узвіз"),
+    # Скорочення без крапки і пробілу — частина назви, а не тип вулиці
+    ("Пляжна", "пляжна"),
+    ("вул. Кам’янецька", "кам'янецька"),
+    ("вул. 1-го Травня", "1-го травня"),
+])
+async def test_street_search_key_strips_type_and_case(name, key):
+    assert street_search_key(name) == key
+
+
+async def test_backfill_runs_in_batches_until_done(job_run_history):
+    with patch("services.street_search.StreetService.backfill_search_keys",
+               new=AsyncMock(side_effect=[3, 2, 0])) as backfill:
+        await backfill_street_search_keys()
+
+    assert backfill.await_count == 3
+    assert job_run_history.await_args.kwargs["items_processed"] == 5
+
+
+async def test_nothing_to_backfill_is_not_recorded(job_run_history):
+    with patch("services.street_search.StreetService.backfill_search_keys", new=AsyncMock(return_value=0)):
+        await backfill_street_search_keys()
+
+    job_run_history.assert_not_awaited()
+
+
+class QueryCanceled(Exception):
+    pgcode = "57014"
+
+
+async def test_short_queries_search_streets_by_prefix_only():
+    with patch("services.street_search.StreetService.search", new=AsyncMock(return_value=[])) as search:
+        await search_streets("вул. Хр", city_id=5)
+
+    search.assert_awaited_once_with(["хр", "[h"], 5, 100)
+
+
+async def test_fuzzy_street_search_falls_back_to_prefix_on_timeout():
+    timeout = DBAPIError("SELECT", {}, QueryCanceled())
+    street = object()
+    with patch("services.street_search.StreetService.search",
+               new=AsyncMock(side_effect=[timeout, [(street, 0)]])) as search:
+        assert await search_streets("хрищатик") == [street]
+
+    fuzzy_call, prefix_call = search.await_args_list
+    assert fuzzy_call.kwargs == {"fuzzy_threshold": 0.5, "timeout_ms": 200}
+    assert prefix_call.args == (["хрищатик", "[hbofnbr"], None, 100) and not prefix_call.kwargs
+
+
+async def test_other_database_errors_are_not_hidden():
+    error = DBAPIError("SELECT", {}, Exception("connection lost"))
+    with patch("services.street_search.StreetService.search", new=AsyncMock(side_effect=error)):
+        with pytest.raises(DBAPIError):
+            await search_streets("хрищатик")
+
+
+async def test_only_the_best_query_variant_is_returned():
+    exact, layout, fuzzy = object(), object(), object()
+
+    # Сам запит збігся: випадкові збіги варіанта в іншій розкладці відкидаються, нечіткі лишаються
+    assert best_variant([(exact, 0), (layout, 1), (fuzzy, 2)], 2) == [exact, fuzzy]
+    # Запит набрано не в тій розкладці: лише збіги виправленого варіанта
+    assert best_variant([(layout, 1), (fuzzy, 2)], 2) == [layout]
+    assert best_variant([(fuzzy, 2)], 2) == [fuzzy]
+    assert best_variant([], 2) == []
+
+
+@pytest.mark.parametrize("name, key", [
+    ("вул. Хрещатик", "khreshchatyk"),
+    ("вул. Кам'янецька", "kamianetska"),
+    ("просп. Юрія Гагаріна", "yuriia haharina"),
+    ("вул. Згурівська", "zghurivska"),
+])
+async def test_latin_street_search_key_uses_official_transliteration(name, key):
+    assert street_search_key_latin(name) == key
+
+
+@pytest.mark.parametrize("query, variants", [
+    ("вул. Хре", ["хре", "[ht"]),
+    ("dek/ [ht", ["dek/ [ht", "хре"]),
+    ("Khreshch", ["khreshch", "лркуірср"]),
+    ("Kam'ianets", ["kamianets", "лфьєшфтуеі"]),
+    # Латинська K і російська ъ в кириличному запиті
+    ("Kиъв", ["київ", "rb]d"]),
+])
+async def test_search_key_variants(query, variants):
+    assert search_key_variants(query, street_search_key) == variants
@@ -1,76 +1,45 @@
+import datetime
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch, ANY
+from listing_app.schemes import ACTIVE_STATUS_ID, ARCHIVED_STATUS_ID
 from services import worker_checking_listing_relevance
+from utils import naive_utc_now
 
 
 @pytest.mark.asyncio
 async def test_worker_checking_listing_relevance_success():
-    fake_listing = MagicMock()
-    fake_listing.name = "Test Listing"
-    fake_listing.owner_id = 1
-
-    fake_user = MagicMock()
-    fake_user.email = "test@example.com"
-
-    with patch("services.worker_checking_listing_relevance.ListingService.select", new=AsyncMock(return_value=[fake_listing])), \
-         patch("services.worker_checking_listing_relevance.UserService.select_one", new=AsyncMock(return_value=fake_user)), \
-         patch("services.worker_checking_listing_relevance.send_email_async", new=AsyncMock()) as mock_send_email, \
-         patch("services.worker_checking_listing_relevance.ListingService.save", new=AsyncMock()) as mock_save:
+    with patch("services.worker_checking_listing_relevance.ListingService.archive_stale",
+               new=AsyncMock(return_value=[(1, "Test Listing", "test@example.com")])) as mock_archive:
 
         await worker_checking_listing_relevance.worker_checking_listing_relevance()
 
-        mock_send_email.assert_awaited_once_with(
-            "test@example.com",
-            subject="EasyRent - повідомлення про архівацію оголошення",
-            body=ANY
+        mock_archive.assert_awaited_once_with(
+            ANY, ACTIVE_STATUS_ID, ARCHIVED_STATUS_ID, worker_checking_listing_relevance.archive_notification
         )
-        mock_save.assert_awaited_once()
-
-
-@pytest.mark.asyncio
-async def test_worker_checking_listing_relevance_no_listings():
-    with patch("services.worker_checking_listing_relevance.ListingService.select", new=AsyncMock(return_value=[])), \
-         patch("services.worker_checking_listing_relevance.send_email_async") as mock_send_email, \
-         patch("services.worker_checking_listing_relevance.ListingService.save") as mock_save:
-
-        await worker_checking_listing_relevance.worker_checking_listing_relevance()
-
-        mock_send_email.assert_not_called()
-        mock_save.assert_not_called()
 
 
 @pytest.mark.asyncio
-async def test_worker_checking_listing_relevance_user_not_found():
-    fake_listing = MagicMock()
-    fake_listing.name = "Test"
-    fake_listing.owner_id = 1
-
-    with patch("services.worker_checking_listing_relevance.ListingService.select", new=AsyncMock(return_value=[fake_listing])), \
-         patch("services.worker_checking_listing_relevance.UserService.select_one", new=AsyncMock(return_value=None)), \
-         patch("services.worker_checking_listing_relevance.send_email_async") as mock_send_email, \
-         patch("services.worker_checking_listing_relevance.ListingService.save") as mock_save:
+async def test_worker_checking_listing_relevance_archives_everything_older_than_cutoff():
+    with patch("services.worker_checking_listing_relevance.ListingService.archive_stale", new=AsyncMock(return_value=[])) as mock_archive:
 
         await worker_checking_listing_relevance.worker_checking_listing_relevance()
 
-        mock_send_email.assert_not_called()
-        mock_save.assert_not_called()
+    cutoff = mock_archive.await_args.args[0]
+    # listing.created_at зберігається як UTC без часового поясу
+    assert cutoff.tzinfo is None
+    expected = naive_utc_now() - datetime.timedelta(days=worker_checking_listing_relevance.config.LISTING_RELEVANCE_DAYS)
+    assert abs((cutoff - expected).total_seconds()) < 5
 
 
-@pytest.mark.asyncio
-async def test_worker_checking_listing_relevance_multiple():
-    fake_listings = [MagicMock(name=f"Listing {i}", owner_id=i) for i in range(3)]
-    fake_user = MagicMock()
-    fake_user.email = "multi@example.com"
-
-    with patch("services.worker_checking_listing_relevance.ListingService.select", new=AsyncMock(return_value=fake_listings)), \
-         patch("services.worker_checking_listing_relevance.UserService.select_one", new=AsyncMock(return_value=fake_user)), \
-         patch("services.worker_checking_listing_relevance.send_email_async", new=AsyncMock()) as mock_send_email, \
-         patch("services.worker_checking_listing_relevance.ListingService.save", new=AsyncMock()) as mock_save:
-
-        await worker_checking_listing_relevance.worker_checking_listing_relevance()
+def test_archive_notification_is_deduplicated_per_listing_and_day():
+    email = worker_checking_listing_relevance.archive_notification(7, "Test Listing", "test@example.com")
 
-        assert mock_send_email.await_count == 3
-        assert mock_save.await_count == 3
+    assert email["to_email"] == "test@example.com"
+    assert email["subject"] == "EasyRent - повідомлення про архівацію оголошення"
+    assert "Test Listing" in email["body"]
+    assert email["dedupe_key"] == f"listing_archived:7:{datetime.date.today().isoformat()}"
+    assert worker_checking_listing_relevance.archive_notification(7, "Інша назва", "x@example.com")["dedupe_key"] == email["dedupe_key"]
 
 
 def test_start_scheduler_adds_job(monkeypatch):
@@ -1,11 +1,24 @@
+import asyncio
+import datetime
+import re
+
 import pytest
+from sqlalchemy.dialects import postgresql
 from unittest.mock import AsyncMock, MagicMock, patch
-from services import worker_moderate_listings
-from listing_app.schemes import ACTIVE_STATUS_ID, DISCARD_STATUS_ID
+from services import moderation_cache, worker_moderate_listings
+from listing_app.schemes import ACTIVE_STATUS_ID, DISCARD_STATUS_ID, MODERATION_STATUS_ID
 
 pytestmark = pytest.mark.asyncio
 
 
+@pytest.fixture(autouse=True)
+def verdict_cache():
+    with patch("services.moderation_cache.file_sha256", new=lambda path: f"hash:{path}"), \
+         patch("services.moderation_cache.ModerationVerdictService.select_fresh", new=AsyncMock(return_value=None)) as mock_select, \
+         patch("services.moderation_cache.ModerationVerdictService.remember", new=AsyncMock()) as mock_remember:
+        yield MagicMock(select_fresh=mock_select, remember=mock_remember)
+
+
 @pytest.fixture
 def fake_listing():
     listing = MagicMock()
@@ -14,6 +27,7 @@ def fake_listing():
     listing.description = "Nice flat"
     listing.document_ownership_path = "/fake/path.jpg"
     listing.owner_id = 123
+    listing.listing_status_id = MODERATION_STATUS_ID
     return listing
 
 
@@ -27,44 +41,252 @@ def fake_user():
     return user
 
 
-async def test_skip_listing_with_missing_fields():
-    listing = MagicMock(name=None, description="desc", document_ownership_path=None)
-    with patch("services.worker_moderate_listings.ListingService.select", new=AsyncMock(return_value=[listing])), \
-         patch("services.worker_moderate_listings.UserService.select_one", new=AsyncMock()):
+@pytest.fixture
+def fake_job():
+    job = MagicMock()
+    job.id = 10
+    job.listing_id = 1
+    job.attempts = 1
+    job.version = 1
+    job.priority = 0
+    job.queued_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=30)
+    return job
+
+
+@pytest.fixture
+def listing_context(fake_listing, fake_user):
+    fake_listing.owner = fake_user
+    fake_listing.city = MagicMock(name_ukr="Київ")
+    fake_listing.street = MagicMock(name_ukr="вул. Хрещатик")
+    fake_listing.images = []
+    with patch("services.worker_moderate_listings.ListingService.select_for_moderation", new=AsyncMock(return_value={1: fake_listing})):
+        yield
+
+
+@pytest.fixture
+def job_queue(fake_job):
+    with patch("services.worker_moderate_listings.ModerationJobService.enqueue_pending_listings", new=AsyncMock()), \
+         patch("services.worker_moderate_listings.ModerationJobService.claim", new=AsyncMock(return_value=[fake_job])), \
+         patch("services.worker_moderate_listings.ModerationJobService.complete", new=AsyncMock()) as mock_complete, \
+         patch("services.worker_moderate_listings.ModerationJobService.fail", new=AsyncMock()) as mock_fail:
+        yield MagicMock(complete=mock_complete, fail=mock_fail)
+
+
+async def test_skip_listing_with_missing_fields(job_queue, fake_job):
+    listing = MagicMock(name=None, description="desc", document_ownership_path=None,
+                        listing_status_id=MODERATION_STATUS_ID)
+    with patch("services.worker_moderate_listings.ListingService.select_for_moderation", new=AsyncMock(return_value={1: listing})), \
+         patch("services.worker_moderate_listings.text_and_image_verification", new=AsyncMock()) as mock_text:
+        await worker_moderate_listings.worker_moderate_listings()
+
+    mock_text.assert_not_awaited()
+    job_queue.complete.assert_awaited_once_with(fake_job, None)
+
+
+async def test_listing_discarded_due_to_text_verification(listing_context, job_queue, fake_job):
+    with patch("services.worker_moderate_listings.text_and_image_verification", new=AsyncMock(return_value=MagicMock(is_ok=False, reason_details="bad text"))), \
+         patch("services.worker_moderate_listings.ownership_documents_verification", new=AsyncMock()):
+
         await worker_moderate_listings.worker_moderate_listings()
 
+    listing_values = job_queue.complete.await_args.args[1]
+    assert listing_values["listing_status_id"] == DISCARD_STATUS_ID
+    assert "bad text" in listing_values["discard_reason"]
+
 
-async def test_listing_discarded_due_to_text_verification(fake_listing, fake_user):
-    with patch("services.worker_moderate_listings.ListingService.select", new=AsyncMock(return_value=[fake_listing])), \
-         patch("services.worker_moderate_listings.UserService.select_one", new=AsyncMock(return_value=fake_user)), \
-         patch("services.worker_moderate_listings.text_verification", new=AsyncMock(return_value=MagicMock(is_ok=False, reason_details="bad text"))), \
-         patch("services.worker_moderate_listings.ownership_documents_verification"), \
-         patch("services.worker_moderate_listings.ListingService.save", new=AsyncMock()) as mock_save:
+@pytest.mark.parametrize("images_rejected", [True, False])
+async def test_only_rejected_images_are_blacklisted(listing_context, job_queue, fake_listing, images_rejected):
+    fake_listing.images = [MagicMock(image_url="photo.jpg")]
+    result = MagicMock(is_ok=False, reason_details="bad", images_rejected=images_rejected)
+    with patch("services.worker_moderate_listings.text_and_image_verification", new=AsyncMock(return_value=result)), \
+         patch("services.worker_moderate_listings.ownership_documents_verification", new=AsyncMock()), \
+         patch("services.worker_moderate_listings.pre_moderate", new=AsyncMock(return_value=None)), \
+         patch("services.worker_moderate_listings.remember_rejected_images", new=AsyncMock()) as mock_remember:
 
         await worker_moderate_listings.worker_moderate_listings()
-        assert fake_listing.listing_status_id == DISCARD_STATUS_ID
-        mock_save.assert_awaited_once()
+
+    assert mock_remember.await_count == images_rejected
 
 
-async def test_listing_discarded_due_to_document_verification(fake_listing, fake_user):
-    with patch("services.worker_moderate_listings.ListingService.select", new=AsyncMock(return_value=[fake_listing])), \
-         patch("services.worker_moderate_listings.UserService.select_one", new=AsyncMock(return_value=fake_user)), \
-         patch("services.worker_moderate_listings.text_verification", new=AsyncMock(return_value=MagicMock(is_ok=True))), \
-         patch("services.worker_moderate_listings.ownership_documents_verification", new=AsyncMock(return_value=MagicMock(valid=False, belongs_to_user=False, error_details="not valid"))), \
-         patch("services.worker_moderate_listings.ListingService.save", new=AsyncMock()) as mock_save:
+async def test_listing_discarded_due_to_document_verification(listing_context, job_queue, fake_job):
+    with patch("services.worker_moderate_listings.text_and_image_verification", new=AsyncMock(return_value=MagicMock(is_ok=True))), \
+         patch("services.worker_moderate_listings.ownership_documents_verification", new=AsyncMock(return_value=MagicMock(valid=False, belongs_to_user=False, error_details="not valid"))):
 
         await worker_moderate_listings.worker_moderate_listings()
-        assert fake_listing.listing_status_id == DISCARD_STATUS_ID
-        mock_save.assert_awaited_once()
 
+    listing_values = job_queue.complete.await_args.args[1]
+    assert listing_values["listing_status_id"] == DISCARD_STATUS_ID
+    assert "not valid" in listing_values["discard_reason"]
 
-async def test_listing_passes_all_checks(fake_listing, fake_user):
-    with patch("services.worker_moderate_listings.ListingService.select", new=AsyncMock(return_value=[fake_listing])), \
-         patch("services.worker_moderate_listings.UserService.select_one", new=AsyncMock(return_value=fake_user)), \
-         patch("services.worker_moderate_listings.text_verification", new=AsyncMock(return_value=MagicMock(is_ok=True))), \
-         patch("services.worker_moderate_listings.ownership_documents_verification", new=AsyncMock(return_value=MagicMock(valid=True, belongs_to_user=True, error_details=""))), \
-         patch("services.worker_moderate_listings.ListingService.save", new=AsyncMock()) as mock_save:
+
+async def test_listing_passes_all_checks(listing_context, job_queue, fake_job):
+    with patch("services.worker_moderate_listings.text_and_image_verification", new=AsyncMock(return_value=MagicMock(is_ok=True))), \
+         patch("services.worker_moderate_listings.ownership_documents_verification", new=AsyncMock(return_value=MagicMock(valid=True, belongs_to_user=True, error_details=""))):
 
         await worker_moderate_listings.worker_moderate_listings()
-        assert fake_listing.listing_status_id == ACTIVE_STATUS_ID
-        mock_save.assert_awaited()
+
+    job_queue.complete.assert_awaited_once_with(fake_job, {"listing_status_id": ACTIVE_STATUS_ID})
+
+
+async def test_unchanged_listing_is_reapproved_from_cache(listing_context, job_queue, fake_job, verdict_cache):
+    verdict_cache.select_fresh.return_value = MagicMock(is_ok=True, reason="")
+    with patch("services.worker_moderate_listings.text_and_image_verification", new=AsyncMock()) as mock_text, \
+         patch("services.worker_moderate_listings.ownership_documents_verification", new=AsyncMock()) as mock_ownership:
+
+        await worker_moderate_listings.worker_moderate_listings()
+
+    mock_text.assert_not_awaited()
+    mock_ownership.assert_not_awaited()
+    verdict_cache.remember.assert_not_awaited()
+    job_queue.complete.assert_awaited_once_with(fake_job, {"listing_status_id": ACTIVE_STATUS_ID})
+
+
+async def test_verdicts_are_remembered(listing_context, job_queue, verdict_cache):
+    with patch("services.worker_moderate_listings.text_and_image_verification", new=AsyncMock(return_value=MagicMock(is_ok=True, reason_details=""))), \
+         patch("services.worker_moderate_listings.ownership_documents_verification", new=AsyncMock(return_value=MagicMock(valid=False, belongs_to_user=True, error_details="blurry"))):
+
+        await worker_moderate_listings.worker_moderate_listings()
+
+    remembered = {call.args[0]: call.args[2:] for call in verdict_cache.remember.await_args_list}
+    assert remembered == {"content": (True, "", "gpt"), "ownership": (False, "blurry", "gpt")}
+    # Відмова зберігається коротше, ніж схвалення
+    ttls = {call.args[0]: call.kwargs["ttl"] for call in verdict_cache.remember.await_args_list}
+    assert ttls["ownership"] < ttls["content"]
+
+
+async def test_fingerprint_changes_with_checker(monkeypatch):
+    fingerprint = await worker_moderate_listings.content_fingerprint("Квартира", "Опис", [])
+    assert await worker_moderate_listings.content_fingerprint("Квартира", "Опис", []) == fingerprint
+
+    monkeypatch.setattr(worker_moderate_listings.config, "MODERATION_VERDICT_VERSION", 2)
+    assert await worker_moderate_listings.content_fingerprint("Квартира", "Опис", []) != fingerprint
+    monkeypatch.setattr(worker_moderate_listings.config, "MODERATOR_ASSISTANT_ID", "asst_new")
+    assert await worker_moderate_listings.content_fingerprint("Квартира", "Опис", []) != fingerprint
+
+
+async def test_spam_listing_is_rejected_locally_without_gpt(listing_context, job_queue, fake_listing, verdict_cache):
+    fake_listing.description = "Пишіть у телеграм t.me/cheap_flats"
+    with patch("services.pre_moderation.SPAM_PATTERNS", [re.compile(r"t\.me/")]), \
+         patch("services.worker_moderate_listings.text_and_image_verification", new=AsyncMock()) as mock_text, \
+         patch("services.worker_moderate_listings.ownership_documents_verification", new=AsyncMock(return_value=MagicMock(valid=True, belongs_to_user=True, error_details=""))):
+
+        await worker_moderate_listings.worker_moderate_listings()
+
+    mock_text.assert_not_awaited()
+    listing_values = job_queue.complete.await_args.args[1]
+    assert listing_values["listing_status_id"] == DISCARD_STATUS_ID
+    remembered = {call.args[0]: call.args[2:] for call in verdict_cache.remember.await_args_list}
+    assert remembered["content"][2] == "local"
+
+
+async def test_content_and_ownership_checks_run_concurrently(listing_context, job_queue):
+    started = []
+    both_started = asyncio.Event()
+
+    async def check(name, result):
+        started.append(name)
+        if len(started) == 2:
+            both_started.set()
+        await asyncio.wait_for(both_started.wait(), timeout=1)
+        return result
+
+    with patch("services.worker_moderate_listings.text_and_image_verification", new=lambda *args: check("content", MagicMock(is_ok=True))), \
+         patch("services.worker_moderate_listings.ownership_documents_verification", new=lambda *args: check("ownership", MagicMock(valid=True, belongs_to_user=True, error_details=""))):
+
+        await worker_moderate_listings.worker_moderate_listings()
+
+    assert sorted(started) == ["content", "ownership"]
+    job_queue.complete.assert_awaited_once()
+
+
+async def test_failed_verification_is_retried(listing_context, job_queue, fake_job):
+    with patch("services.worker_moderate_listings.text_and_image_verification", new=AsyncMock(side_effect=RuntimeError("api down"))), \
+         patch("services.worker_moderate_listings.ownership_documents_verification", new=AsyncMock()):
+
+        await worker_moderate_listings.worker_moderate_listings()
+
+    job_queue.complete.assert_not_awaited()
+    job_queue.fail.assert_awaited_once()
+    assert "api down" in job_queue.fail.await_args.args[1]
+
+
+async def test_job_over_attempt_limit_goes_to_dead_letter(listing_context, job_queue, fake_job):
+    fake_job.attempts = worker_moderate_listings.config.MODERATION_MAX_ATTEMPTS + 1
+    with patch("services.worker_moderate_listings.moderate_listing", new=AsyncMock()) as mock_moderate:
+        await worker_moderate_listings.worker_moderate_listings()
+
+    mock_moderate.assert_not_awaited()
+    job_queue.fail.assert_awaited_once()
+
+
+async def test_queue_and_decision_time_are_observed_per_priority(listing_context, job_queue, fake_job):
+    worker_moderate_listings.metrics.reset()
+    fake_job.priority = 2
+    with patch("services.worker_moderate_listings.moderate_listing", new=AsyncMock(return_value=None)):
+        await worker_moderate_listings.worker_moderate_listings()
+
+    histograms = worker_moderate_listings.metrics.snapshot()["histograms"]
+    assert histograms['moderation_queue_seconds{priority=2}']["p50"] >= 30
+    assert histograms['moderation_decision_seconds{priority=2}']["count"] == 1
+
+
+async def test_new_listings_of_verified_owners_go_first():
+    priority_for = worker_moderate_listings.ModerationJobService.priority_for
+    assert priority_for(is_new=True, owner_verified=True) < priority_for(is_new=True, owner_verified=False)
+    assert priority_for(is_new=True, owner_verified=False) < priority_for(is_new=False, owner_verified=True)
+    assert priority_for(is_new=False, owner_verified=True) < priority_for(is_new=False, owner_verified=False)
+
+
+async def test_worker_run_is_recorded(listing_context, job_queue, job_run_history):
+    with patch("services.worker_moderate_listings.moderate_listing", new=AsyncMock(side_effect=RuntimeError("gpt down"))):
+        await worker_moderate_listings.worker_moderate_listings()
+
+    record = job_run_history.await_args.kwargs
+    assert record["job"] == "worker_moderate_listings"
+    assert (record["items_seen"], record["items_processed"], record["items_failed"]) == (1, 0, 1)
+
+
+@pytest.fixture
+def executed_sql():
+    """SQL запитів ModerationJobService у діалекті Postgres, без підключення до бази."""
+    session = MagicMock(execute=AsyncMock(return_value=MagicMock()), commit=AsyncMock())
+    session.__aenter__.return_value = session
+    with patch.object(worker_moderate_listings.ModerationJobService, "session_maker", new=MagicMock(return_value=session)):
+        yield lambda: [
+            str(call.args[0].compile(dialect=postgresql.dialect())) for call in session.execute.await_args_list
+        ]
+
+
+async def test_worker_claims_only_what_it_checks_concurrently(listing_context, job_queue):
+    with patch("services.worker_moderate_listings.ModerationJobService.claim", new=AsyncMock(return_value=[])) as claim:
+        await worker_moderate_listings.worker_moderate_listings()
+
+    assert claim.await_args.args[0] == worker_moderate_listings.config.MODERATION_CONCURRENCY
+
+
+async def test_incomplete_listings_are_not_requeued_by_fallback_poll(executed_sql):
+    await worker_moderate_listings.ModerationJobService.enqueue_pending_listings(MODERATION_STATUS_ID)
+
+    [sql] = executed_sql()
+    for column in ("name", "description", "document_ownership_path"):
+        assert f"listing.{column} != %(" in sql
+
+
+async def test_expired_verdicts_are_not_reused():
+    verdict_service = moderation_cache.ModerationVerdictService
+    with patch.object(verdict_service, "execute", new=AsyncMock(return_value=[])) as execute:
+        assert await verdict_service.select_many([("content", "abc")]) == {}
+
+    sql = str(execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "moderation_verdict.expires_at > now()" in sql
+
+
+async def test_claim_rechecks_availability_of_locked_rows(executed_sql):
+    await worker_moderate_listings.ModerationJobService.claim(5, 60)
+
+    [sql] = executed_sql()
+    # Після FOR UPDATE рядок перевіряється заново, тож задачу, яку вже взяв інший воркер, не беремо вдруге
+    outer = sql[sql.index(") AS anon_1"):sql.index("FOR UPDATE OF moderation_job SKIP LOCKED")]
+    assert "moderation_job.status = %(" in outer
+    assert "moderation_job.available_at <= now()" in outer
+    assert "moderation_job.locked_until < now()" in outer
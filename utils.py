@@ -1,5 +1,6 @@
 from datetime import datetime, timezone
 import random
+import re
 import string
 
 import pytz
@@ -8,5 +9,111 @@ import pytz
 def datetime_now():
     return datetime.now(timezone.utc)
 
+
+def naive_utc_now():
+    # Для колонок DateTime без часового поясу (listing.created_at), де час зберігається в UTC
+    return datetime_now().replace(tzinfo=None)
+
 def random_string(N):
-    return ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(N))
\ No newline at end of file
+    return ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(N))
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Чи є etag серед значень заголовка If-None-Match (слабке порівняння, як вимагає RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def backoff_delay(attempt: int, base: float, max_delay: float) -> float:
+    return min(max_delay, base * 2 ** max(attempt - 1, 0))
+
+
+APOSTROPHES = str.maketrans({"’": "'", "ʼ": "'", "`": "'", "‘": "'"})
+# Тип вулиці на початку назви: скорочення з крапкою або пробілом після нього чи повне слово
+STREET_TYPE_PREFIX = re.compile(
+    r"^(?:(?:вул|пров|просп|бул|пл|туп|наб|дор)(?:\.\s*|\s+)"
+    r"|(?:вулиця|провулок|проспект|бульвар|площа|тупик|набережна|шосе|узвіз)\s+)"
+)
+
+
+def fold_search_text(text: str) -> str:
+    """Ключ пошуку без урахування регістру, варіантів апострофа та зайвих пробілів."""
+    return " ".join(text.translate(APOSTROPHES).casefold().split())
+
+
+def street_search_key(name: str) -> str:
+    """Назва вулиці без типу ("вул.", "пров." тощо) у вигляді ключа пошуку за префіксом."""
+    return STREET_TYPE_PREFIX.sub("", fold_search_text(name), count=1)
+
+
+# Офіційна транслітерація (постанова КМУ №55 від 27.01.2010); на початку слова — друге значення
+TRANSLITERATION = {
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e", "є": ("ie", "ye"), "ж": "zh",
+    "з": "z", "и": "y", "і": "i", "ї": ("i", "yi"), "й": ("i", "y"), "к": "k", "л": "l", "м": "m", "н": "n",
+    "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch",
+    "ш": "sh", "щ": "shch", "ь": "", "ю": ("iu", "yu"), "я": ("ia", "ya"), "'": "",
+}
+CYRILLIC_WORD = re.compile(r"[а-яґєії'’ʼ]+", re.IGNORECASE)
+
+# Той самий текст, набраний не в тій розкладці: латинська QWERTY ↔ українська ЙЦУКЕН
+LATIN_LAYOUT = "qwertyuiop[]asdfghjkl;'zxcvbnm,./`"
+UKRAINIAN_LAYOUT = "йцукенгшщзхїфівапролджєячсмитьбю.'"
+LATIN_TO_UKRAINIAN_LAYOUT = str.maketrans(LATIN_LAYOUT, UKRAINIAN_LAYOUT)
+# Крапка й апостроф у кириличному запиті найімовірніше справжні, тож лишаються як є;
+# російська розкладка відрізняється від української лише клавішами ы, э, ъ, ё
+UKRAINIAN_TO_LATIN_LAYOUT = str.maketrans(UKRAINIAN_LAYOUT[:-2] + "ыэъё", LATIN_LAYOUT[:-2] + "s']`")
+RUSSIAN_TO_UKRAINIAN_LAYOUT = str.maketrans("ыэъё", "ієї'")
+# Однаково написані латинські й кириличні літери, які легко змішати в одному слові
+LATIN_HOMOGLYPHS = "aceikopxyABCEHIKMOPTXY"
+CYRILLIC_HOMOGLYPHS = "асеікорхуАВСЕНІКМОРТХУ"
+HOMOGLYPHS_TO_CYRILLIC = str.maketrans(LATIN_HOMOGLYPHS, CYRILLIC_HOMOGLYPHS)
+HOMOGLYPHS_TO_LATIN = str.maketrans(CYRILLIC_HOMOGLYPHS, LATIN_HOMOGLYPHS)
+LATIN_LETTER = re.compile(r"[a-z]", re.IGNORECASE)
+CYRILLIC_LETTER = re.compile(r"[а-яґєії]", re.IGNORECASE)
+
+
+def _transliterate_word(match: re.Match) -> str:
+    word = match.group().lower().replace("зг", "зґ")
+    result = []
+    for index, letter in enumerate(word):
+        latin = TRANSLITERATION.get(letter, "")
+        if isinstance(latin, tuple):
+            latin = latin[1] if index == 0 else latin[0]
+        result.append(latin)
+    # "зг" передається як "zgh", щоб не сплутати з "ж"
+    return "".join(result).replace("zg", "zgh")
+
+
+def transliterate(text: str) -> str:
+    """Латиницею за офіційними правилами транслітерації, в нижньому регістрі: "Київ" → "kyiv"."""
+    return CYRILLIC_WORD.sub(_transliterate_word, text)
+
+
+def street_search_key_latin(name: str) -> str:
+    return transliterate(street_search_key(name))
+
+
+def is_latin(text: str) -> bool:
+    return bool(LATIN_LETTER.search(text)) and not CYRILLIC_LETTER.search(text)
+
+
+def search_key_variants(text: str, key=fold_search_text) -> list[str]:
+    """
+    Ключі пошуку для введеного користувачем запиту, від найімовірнішого:
+    сам запит (російську розкладку та змішані латинські й кириличні літери виправлено)
+    і той самий набір клавіш в іншій розкладці ("rb]d" → "київ", "лшум" → "kyiv").
+    """
+    text = text.translate(RUSSIAN_TO_UKRAINIAN_LAYOUT)
+    latin_count, cyrillic_count = len(LATIN_LETTER.findall(text)), len(CYRILLIC_LETTER.findall(text))
+    if latin_count and cyrillic_count:
+        text = text.translate(HOMOGLYPHS_TO_LATIN if latin_count > cyrillic_count else HOMOGLYPHS_TO_CYRILLIC)
+
+    primary = key(text)
+    layout = UKRAINIAN_TO_LATIN_LAYOUT if CYRILLIC_LETTER.search(primary) else LATIN_TO_UKRAINIAN_LAYOUT
+    variants = [primary, key(primary.translate(layout))]
+    # Латинські ключі будуються транслітерацією, яка апострофи пропускає
+    variants = [variant.replace("'", "") if is_latin(variant) else variant for variant in variants]
+    return list(dict.fromkeys(variant for variant in variants if variant))